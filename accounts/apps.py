@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_transaction_search(sender, using, **kwargs):
+    """SQLite table rebuilds drop triggers; put the search index back in step"""
+    from django.db import connections
+    from .search import ensure_search_index
+    ensure_search_index(connections[using])
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        post_migrate.connect(ensure_transaction_search, sender=self)
@@ -0,0 +1,140 @@
+"""
+Consolidated income and expenditure of a pastorate: every account of the
+pastorate and its churches over one date range.
+
+All totals come from a single query grouped by account and primary
+category.  Contra and intra transfers between two of the pastorate's own
+accounts move money inside it, so they are reported per account (to
+reconcile its opening and closing balance) but left out of the consolidated
+income and expenses.  Transfers to or from accounts of another pastorate
+count as income or expenses like any other entry.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, Q, Sum, Value, When
+
+from . import ledger, lookups
+from .models import Transaction
+
+CENT = Decimal('0.01')
+
+
+def _sum_when(condition):
+    return Sum(Case(
+        When(condition, then='amount'),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    ))
+
+
+def _amount(value):
+    return (value or Decimal('0')).quantize(CENT)
+
+
+def _ordered(categories):
+    """Category rows by name, uncategorised last"""
+    return [categories[key] for key in sorted(
+        categories, key=lambda key: (key is None, categories[key]['name'].lower())
+    )]
+
+
+def consolidated_report(pastorate, start_date, end_date):
+    """
+    Totals of ``pastorate`` between ``start_date`` and ``end_date``
+    (inclusive): a row per account with its opening and closing balance,
+    income and expenses by primary category, and the consolidated totals.
+    """
+    accounts = lookups.pastorate_accounts(pastorate)
+    account_ids = [account.pk for account in accounts]
+
+    internal = (
+        Q(transaction_type__in=ledger.TRANSFER_DEBIT_TYPES, to_account_id__in=account_ids)
+        | Q(transaction_type__in=ledger.TRANSFER_CREDIT_TYPES, from_account_id__in=account_ids)
+    )
+    rows = Transaction.objects.filter(
+        account_id__in=account_ids, date__range=[start_date, end_date]
+    ).values('account_id', 'primary_category_id', 'primary_category__name').annotate(
+        income=_sum_when(Q(transaction_type__in=Transaction.CREDIT_TYPES) & ~internal),
+        expenses=_sum_when(Q(transaction_type__in=Transaction.DEBIT_TYPES) & ~internal),
+        transfers_in=_sum_when(Q(transaction_type__in=ledger.TRANSFER_CREDIT_TYPES) & internal),
+        transfers_out=_sum_when(Q(transaction_type__in=ledger.TRANSFER_DEBIT_TYPES) & internal),
+    ).order_by()
+
+    opening = ledger.balances_before(account_ids, start_date)
+    closing = ledger.balances_as_of(account_ids, end_date)
+    zero = Decimal('0')
+    account_rows = {
+        account.pk: {
+            'account': account,
+            'opening': _amount(opening.get(account.pk)),
+            'income': zero,
+            'expenses': zero,
+            'transfers_in': zero,
+            'transfers_out': zero,
+            'closing': _amount(closing.get(account.pk)),
+        }
+        for account in accounts
+    }
+    income, expenses = {}, {}
+    for row in rows:
+        account_row = account_rows[row['account_id']]
+        for name in ('income', 'expenses', 'transfers_in', 'transfers_out'):
+            account_row[name] += _amount(row[name])
+        for categories, name, other in ((income, 'income', 'Other Income'), (expenses, 'expenses', 'Other Expenses')):
+            if row[name]:
+                category = categories.setdefault(row['primary_category_id'], {
+                    'name': row['primary_category__name'] or other,
+                    'total': zero,
+                })
+                category['total'] += _amount(row[name])
+
+    account_rows = list(account_rows.values())
+    total_income = sum((row['income'] for row in account_rows), zero)
+    total_expenses = sum((row['expenses'] for row in account_rows), zero)
+    return {
+        'accounts': account_rows,
+        'income_categories': _ordered(income),
+        'expense_categories': _ordered(expenses),
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'net': total_income - total_expenses,
+        # Each column balanced by the surplus or deficit
+        'balanced_total': max(total_income, total_expenses),
+        'transfers': sum((row['transfers_in'] for row in account_rows), zero),
+        'opening': sum((row['opening'] for row in account_rows), zero),
+        'closing': sum((row['closing'] for row in account_rows), zero),
+    }
+
+
+def account_label(account):
+    if account.level == 'church' and account.church_id:
+        return f"{account.church.church_name} - {account.name}"
+    return account.name
+
+
+def report_sections(report):
+    """The report as ``(title, header, rows)`` tables for the PDF and XLSX exports"""
+    account_rows = [
+        [account_label(row['account']), row['account'].account_type.name, row['opening'], row['income'],
+         row['expenses'], row['transfers_in'], row['transfers_out'], row['closing']]
+        for row in report['accounts']
+    ]
+    account_rows.append([
+        'Total', '', report['opening'], report['total_income'], report['total_expenses'],
+        report['transfers'], report['transfers'], report['closing'],
+    ])
+    income_rows = [[row['name'], row['total']] for row in report['income_categories']]
+    income_rows.append(['Total Income', report['total_income']])
+    expense_rows = [[row['name'], row['total']] for row in report['expense_categories']]
+    expense_rows.append(['Total Expenses', report['total_expenses']])
+    return [
+        ('Accounts', ['Account', 'Type', 'Opening', 'Income', 'Expenses', 'Transfers In', 'Transfers Out', 'Closing'],
+         account_rows),
+        ('Income', ['Category', 'Amount'], income_rows),
+        ('Expenses', ['Category', 'Amount'], expense_rows),
+        ('Summary', ['', 'Amount'], [
+            ['Total Income', report['total_income']],
+            ['Total Expenses', report['total_expenses']],
+            ['Surplus' if report['net'] >= 0 else 'Deficit', abs(report['net'])],
+        ]),
+    ]
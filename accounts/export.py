@@ -0,0 +1,165 @@
+"""
+Streaming CSV and XLSX exports.
+
+Rows are read with ``iterator(chunk_size=...)`` and written as they arrive, so
+memory stays flat however many transactions are exported.  CSV goes straight
+into a StreamingHttpResponse.  XLSX is written by xlsxwriter in
+``constant_memory`` mode, which flushes every row to a temporary file; the
+finished workbook is then streamed from disk in blocks.
+
+Summary reports, a few small tables each, are exported with
+``report_xlsx_response`` and ``report_pdf_response``.
+"""
+import csv
+import io
+import tempfile
+from decimal import Decimal
+
+import xlsxwriter
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from django.utils import timezone
+from django.utils.text import slugify
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+REPORT_FORMATS = ('pdf', 'xlsx')
+EXPORT_CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class Echo:
+    """File-like object whose write returns the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def export_format(request):
+    """The requested export format, CSV unless ?format=xlsx"""
+    value = request.GET.get('format', 'csv').lower()
+    return value if value in EXPORT_FORMATS else 'csv'
+
+
+def export_filename(prefix, extension):
+    return f"{slugify(prefix)}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+
+def csv_response(filename, header, rows):
+    """Stream ``header`` and then ``rows`` as a CSV download"""
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_response(filename, header, rows, sheet_name='Transactions'):
+    """Write ``header`` and ``rows`` to a constant-memory workbook and stream it"""
+    output = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+        'remove_timezone': True,
+    })
+    worksheet = workbook.add_worksheet(sheet_name[:31])
+    worksheet.write_row(0, 0, header, workbook.add_format({'bold': True}))
+    worksheet.freeze_panes(1, 0)
+    for index, row in enumerate(rows, start=1):
+        worksheet.write_row(index, 0, row)
+    workbook.close()
+
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def export_response(request, prefix, header, rows, sheet_name='Transactions'):
+    """CSV or XLSX download of ``rows`` in the format the request asks for"""
+    if export_format(request) == 'xlsx':
+        return xlsx_response(export_filename(prefix, 'xlsx'), header, rows, sheet_name)
+    return csv_response(export_filename(prefix, 'csv'), header, rows)
+
+
+def report_format(request):
+    """``pdf`` or ``xlsx`` if the request asks for a report download, else None"""
+    value = request.GET.get('format', '').lower()
+    return value if value in REPORT_FORMATS else None
+
+
+def report_xlsx_response(filename, title, subtitle, sections):
+    """
+    One worksheet holding each ``(title, header, rows)`` section in turn
+    under the report title.
+    """
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    worksheet = workbook.add_worksheet(title[:31])
+    bold = workbook.add_format({'bold': True})
+    heading = workbook.add_format({'bold': True, 'font_size': 13})
+    money = workbook.add_format({'num_format': '#,##0.00'})
+
+    worksheet.write(0, 0, title, heading)
+    worksheet.write(1, 0, subtitle)
+    row_index = 3
+    widths = {}
+    for section_title, header, rows in sections:
+        worksheet.write(row_index, 0, section_title, heading)
+        worksheet.write_row(row_index + 1, 0, header, bold)
+        row_index += 2
+        for row in rows:
+            for column, value in enumerate(row):
+                if isinstance(value, Decimal):
+                    worksheet.write_number(row_index, column, float(value), money)
+                else:
+                    worksheet.write(row_index, column, value)
+                    widths[column] = max(widths.get(column, 0), len(str(value)))
+            row_index += 1
+        row_index += 1
+    for column, width in widths.items():
+        worksheet.set_column(column, column, min(max(width, 12), 50))
+    workbook.close()
+
+    response = HttpResponse(output.getvalue(), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def report_pdf_response(filename, title, subtitle, sections):
+    """A landscape A4 PDF with a table for each ``(title, header, rows)`` section"""
+    output = io.BytesIO()
+    document = SimpleDocTemplate(output, pagesize=landscape(A4), title=title,
+                                 leftMargin=12 * mm, rightMargin=12 * mm, topMargin=12 * mm, bottomMargin=12 * mm)
+    styles = getSampleStyleSheet()
+    story = [Paragraph(title, styles['Title']), Paragraph(subtitle, styles['Normal']), Spacer(1, 6 * mm)]
+    for section_title, header, rows in sections:
+        data = [header] + [
+            [f'{value:,.2f}' if isinstance(value, Decimal) else str(value) for value in row]
+            for row in rows
+        ]
+        table = Table(data, repeatRows=1, hAlign='LEFT')
+        style = [
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f3f5')),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#adb5bd')),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ]
+        # Right-align the amount columns
+        for column in range(len(header)):
+            if any(isinstance(row[column], Decimal) for row in rows):
+                style.append(('ALIGN', (column, 0), (column, -1), 'RIGHT'))
+        table.setStyle(TableStyle(style))
+        story += [Paragraph(section_title, styles['Heading3']), table, Spacer(1, 6 * mm)]
+    document.build(story)
+
+    response = HttpResponse(output.getvalue(), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,425 @@
+"""
+Import of bank statements and receipt books from CSV or XLSX files.
+
+The file is read row by row (csv.reader, or openpyxl in read-only mode), each
+row is mapped onto a Transaction through a column mapping and validated
+against the pastorate's accounts, categories and churches, which are loaded
+once up front, so validation runs a single query per batch (for reference
+numbers already used on the same account).  Valid rows are inserted in
+batches with ``bulk_create`` inside ``ledger.deferred()``; their balance
+deltas are summed per account and month and posted once, in the same
+database transaction, when the import commits.
+
+The same pass serves the preview (nothing is written) and the commit.
+"""
+import csv
+import os
+import re
+import tempfile
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from openpyxl import load_workbook
+
+from . import ledger, lookups
+from .models import Transaction
+
+IMPORT_EXTENSIONS = ('.csv', '.xlsx')
+IMPORT_BATCH_SIZE = 1000
+PREVIEW_ROWS = 20
+# Errors kept for display; the total is always counted
+MAX_REPORTED_ERRORS = 200
+
+# (field, label) of every column a file can map
+IMPORT_FIELDS = [
+    ('date', 'Date'),
+    ('amount', 'Amount'),
+    ('credit', 'Credit (deposit)'),
+    ('debit', 'Debit (withdrawal)'),
+    ('transaction_type', 'Type'),
+    ('account', 'Account'),
+    ('primary_category', 'Primary Category'),
+    ('secondary_category', 'Secondary Category'),
+    ('reference_number', 'Reference Number'),
+    ('receipt_number', 'Receipt Number'),
+    ('family_name', 'Family'),
+    ('member_name', 'Member'),
+    ('church', 'Church'),
+    ('description', 'Description'),
+]
+# Header names recognised for each field, compared without case or punctuation
+HEADER_ALIASES = {
+    'date': ['date', 'txndate', 'transactiondate', 'valuedate', 'postingdate'],
+    'amount': ['amount', 'amt', 'amountinr'],
+    'credit': ['credit', 'credits', 'deposit', 'deposits', 'cr', 'creditamount'],
+    'debit': ['debit', 'debits', 'withdrawal', 'withdrawals', 'dr', 'debitamount'],
+    'transaction_type': ['type', 'transactiontype'],
+    'account': ['account', 'accountnumber', 'accountname', 'accountno'],
+    'primary_category': ['primarycategory', 'category'],
+    'secondary_category': ['secondarycategory', 'subcategory'],
+    'reference_number': ['reference', 'referencenumber', 'referenceno', 'refno', 'ref', 'chequeno', 'chequenumber'],
+    'receipt_number': ['receiptnumber', 'receiptno', 'receipt'],
+    'family_name': ['family', 'familyname'],
+    'member_name': ['member', 'membername', 'name'],
+    'church': ['church', 'churchname'],
+    'description': ['description', 'narration', 'particulars', 'details', 'remarks'],
+}
+TEXT_FIELDS = ('reference_number', 'receipt_number', 'family_name', 'member_name', 'description')
+
+# Transfers are posted in pairs by their own forms and cannot be imported
+IMPORTABLE_TYPES = [code for code, _ in Transaction.TRANSACTION_TYPES
+                    if code not in ('contra', 'contra_credit', 'intra', 'intra_credit')]
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y', '%d-%b-%Y', '%d %b %Y', '%d-%m-%y', '%d/%m/%y')
+MAX_AMOUNT = Decimal('10') ** 10
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be read"""
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _normalise(value):
+    return re.sub(r'[^a-z0-9]', '', str(value or '').lower())
+
+
+def import_directory():
+    """Where uploads wait between preview and commit; never served publicly"""
+    return getattr(settings, 'TRANSACTION_IMPORT_DIR', os.path.join(tempfile.gettempdir(), 'ecclesia_imports'))
+
+
+def store_upload(upload):
+    """Save an uploaded file for the import and return its token"""
+    extension = os.path.splitext(upload.name)[1].lower()
+    if extension not in IMPORT_EXTENSIONS:
+        raise ImportFileError('Upload a .csv or .xlsx file.')
+    os.makedirs(import_directory(), exist_ok=True)
+    token = uuid.uuid4().hex + extension
+    with open(os.path.join(import_directory(), token), 'wb') as destination:
+        for chunk in upload.chunks():
+            destination.write(chunk)
+    return token
+
+
+def upload_path(token):
+    """Path of a stored upload; None for a token that is not one of ours"""
+    if not re.fullmatch(r'[0-9a-f]{32}\.(csv|xlsx)', token or ''):
+        return None
+    path = os.path.join(import_directory(), token)
+    return path if os.path.exists(path) else None
+
+
+def discard_upload(token):
+    path = upload_path(token)
+    if path:
+        os.remove(path)
+
+
+def read_rows(path):
+    """Yield each row of a CSV or XLSX file as a list of cell values, header first"""
+    if path.endswith('.xlsx'):
+        try:
+            workbook = load_workbook(path, read_only=True, data_only=True)
+        except Exception as e:
+            raise ImportFileError(f'Cannot open the workbook: {e}')
+        try:
+            for row in workbook.active.iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            try:
+                yield from csv.reader(f)
+            except (csv.Error, UnicodeDecodeError) as e:
+                raise ImportFileError(f'Cannot read the CSV file: {e}')
+
+
+def read_headers(path):
+    """The header row of the file"""
+    rows = read_rows(path)
+    try:
+        row = next(rows)
+    except StopIteration:
+        raise ImportFileError('The file is empty.')
+    finally:
+        rows.close()
+    return [str(value).strip() if value is not None else '' for value in row]
+
+
+def guess_mapping(headers):
+    """``{field: column index}`` for the headers that name a known field"""
+    mapping = {}
+    columns = [_normalise(header) for header in headers]
+    for field, aliases in HEADER_ALIASES.items():
+        for index, column in enumerate(columns):
+            if column in aliases and index not in mapping.values():
+                mapping[field] = index
+                break
+    return mapping
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f'"{text}" is not a date (use YYYY-MM-DD or DD-MM-YYYY)')
+
+
+def _parse_amount(value):
+    if isinstance(value, (int, float, Decimal)):
+        text = str(value)
+    else:
+        text = str(value).strip().replace(',', '').replace('₹', '').replace(' ', '')
+        if text.startswith('(') and text.endswith(')'):
+            text = '-' + text[1:-1]
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f'"{value}" is not an amount')
+    if not amount.is_finite() or abs(amount) >= MAX_AMOUNT:
+        raise ValueError(f'"{value}" is not a valid amount')
+    return amount.quantize(Decimal('0.01'))
+
+
+def _blank(value):
+    return value is None or str(value).strip() == ''
+
+
+class TransactionImporter:
+    """Turns mapped file rows into unsaved Transactions for one pastorate"""
+
+    def __init__(self, pastorate, user, mapping, default_account, credit_type='custom_credit', debit_type='custom_debit'):
+        self.pastorate = pastorate
+        self.user = user
+        self.mapping = mapping
+        self.default_account = default_account
+        self.credit_type = credit_type
+        self.debit_type = debit_type
+
+        accounts = lookups.pastorate_accounts(pastorate)
+        self.accounts = {}
+        for account in accounts:
+            self.accounts.setdefault(account.name.lower(), account)
+        for account in accounts:
+            self.accounts[account.account_number.lower()] = account
+        self.primaries = {}
+        for category in lookups.primary_categories(active_only=True):
+            self.primaries.setdefault((category.name.lower(), category.transaction_type), category)
+        self.secondaries = {}
+        for category in lookups.secondary_categories(active_only=True):
+            self.secondaries.setdefault(category.name.lower(), []).append(category)
+        self.churches = {church.church_name.lower(): church for church in pastorate.church_set.all()}
+        self.type_names = {}
+        for code, label in Transaction.TRANSACTION_TYPES:
+            if code in IMPORTABLE_TYPES:
+                self.type_names[_normalise(code)] = code
+                self.type_names[_normalise(label)] = code
+        self.max_lengths = {field: Transaction._meta.get_field(field).max_length for field in TEXT_FIELDS}
+
+    def _value(self, row, field):
+        index = self.mapping.get(field)
+        if index is None or index >= len(row):
+            return None
+        value = row[index]
+        return None if _blank(value) else value
+
+    def _amount(self, row):
+        """Signed amount: the amount column, or credit minus debit"""
+        if 'amount' in self.mapping:
+            value = self._value(row, 'amount')
+            return None if value is None else _parse_amount(value)
+        credit, debit = self._value(row, 'credit'), self._value(row, 'debit')
+        if credit is None and debit is None:
+            return None
+        return (_parse_amount(credit) if credit is not None else 0) - (_parse_amount(debit) if debit is not None else 0)
+
+    def build(self, row):
+        """A Transaction for ``row``; raises ValueError with a list of (column, message)"""
+        errors = []
+        values = {}
+
+        def check(field, parse):
+            try:
+                return parse()
+            except ValueError as e:
+                errors.append((field, str(e)))
+
+        day = check('date', lambda: _parse_date(self._value(row, 'date')) if self._value(row, 'date') is not None else None)
+        if day is None and not any(f == 'date' for f, _ in errors):
+            errors.append(('date', 'Date is required'))
+        amount = check('amount', lambda: self._amount(row))
+        if amount is None and not any(f == 'amount' for f, _ in errors):
+            errors.append(('amount', 'Amount is required'))
+        elif amount == 0:
+            errors.append(('amount', 'Amount is zero'))
+
+        transaction_type = None
+        type_value = self._value(row, 'transaction_type')
+        if type_value is not None:
+            transaction_type = self.type_names.get(_normalise(type_value))
+            if transaction_type is None:
+                errors.append(('transaction_type', f'Unknown or non-importable type "{type_value}"'))
+            elif amount is not None and amount < 0:
+                errors.append(('amount', 'Amount must be positive when the type is given'))
+        elif amount is not None:
+            transaction_type = self.credit_type if amount > 0 else self.debit_type
+        direction = 'credit' if transaction_type in Transaction.CREDIT_TYPES else 'debit'
+
+        account = self.default_account
+        account_value = self._value(row, 'account')
+        if account_value is not None:
+            account = self.accounts.get(str(account_value).strip().lower())
+            if account is None:
+                errors.append(('account', f'No account "{account_value}" in this pastorate'))
+        elif account is None:
+            errors.append(('account', 'Account is required'))
+
+        primary = secondary = None
+        primary_value = self._value(row, 'primary_category')
+        secondary_value = self._value(row, 'secondary_category')
+        if primary_value is not None and transaction_type:
+            primary = self.primaries.get((str(primary_value).strip().lower(), direction))
+            if primary is None:
+                errors.append(('primary_category', f'No active {direction} category "{primary_value}"'))
+        if secondary_value is not None and transaction_type:
+            candidates = [
+                category for category in self.secondaries.get(str(secondary_value).strip().lower(), [])
+                if (category.primary_category_id == primary.pk if primary
+                    else category.primary_category.transaction_type == direction)
+            ]
+            if len(candidates) == 1:
+                secondary = candidates[0]
+                primary = primary or secondary.primary_category
+            elif candidates:
+                errors.append(('secondary_category', f'"{secondary_value}" is ambiguous; give the primary category'))
+            elif primary_value is None or primary is not None:
+                errors.append(('secondary_category', f'No active {direction} subcategory "{secondary_value}"'))
+
+        church = None
+        church_value = self._value(row, 'church')
+        if church_value is not None:
+            church = self.churches.get(str(church_value).strip().lower())
+            if church is None:
+                errors.append(('church', f'No church "{church_value}" in this pastorate'))
+        elif transaction_type == 'offering':
+            errors.append(('church', 'Offerings need a church'))
+
+        for field in TEXT_FIELDS:
+            value = self._value(row, field)
+            if value is None:
+                continue
+            value = str(value).strip()
+            if self.max_lengths[field] and len(value) > self.max_lengths[field]:
+                errors.append((field, f'Longer than {self.max_lengths[field]} characters'))
+            values[field] = value
+
+        if errors:
+            raise ValueError(errors)
+        return Transaction(
+            account=account,
+            # bulk_create skips the pre_save receiver that sets this
+            pastorate_id=account.owning_pastorate_id(),
+            transaction_type=transaction_type,
+            amount=abs(amount),
+            date=day,
+            primary_category=primary,
+            secondary_category=secondary,
+            church=church,
+            created_by=self.user,
+            **values,
+        )
+
+    def batches(self, path):
+        """
+        Yield ``(transactions, errors)`` per batch of file rows; errors are
+        ``(line, column label, message)`` tuples.
+        """
+        labels = dict(IMPORT_FIELDS)
+        rows = read_rows(path)
+        next(rows, None)  # header
+        seen = set()
+        built, errors = [], []
+        for line, row in enumerate(rows, start=2):
+            if all(_blank(value) for value in row):
+                continue
+            try:
+                built.append((line, self.build(row)))
+            except ValueError as e:
+                errors.extend((line, labels.get(field, field), message) for field, message in e.args[0])
+            if len(built) >= IMPORT_BATCH_SIZE:
+                yield self._without_duplicates(built, errors, seen, labels)
+                built, errors = [], []
+        if built or errors:
+            yield self._without_duplicates(built, errors, seen, labels)
+
+    def _without_duplicates(self, built, errors, seen, labels):
+        """
+        The batch's transactions less those whose reference number is already
+        used on the same account, in the database or earlier in the file.
+        One query per batch.
+        """
+        references = {t.reference_number for _, t in built if t.reference_number}
+        existing = set(Transaction.objects.filter(
+            account_id__in={t.account_id for _, t in built}, reference_number__in=references,
+        ).values_list('account_id', 'reference_number')) if references else set()
+        transactions = []
+        for line, transaction in built:
+            key = (transaction.account_id, transaction.reference_number)
+            if transaction.reference_number and (key in existing or key in seen):
+                errors.append((line, labels['reference_number'],
+                               f'Reference "{transaction.reference_number}" already exists on this account'))
+                continue
+            seen.add(key)
+            transactions.append(transaction)
+        errors.sort(key=lambda error: error[0])
+        return transactions, errors
+
+    def preview(self, path):
+        """Validate the whole file without writing anything"""
+        summary = {'valid': 0, 'credits': Decimal('0'), 'debits': Decimal('0'),
+                   'error_count': 0, 'errors': [], 'error_lines': set(), 'rows': []}
+        for transactions, errors in self.batches(path):
+            summary['valid'] += len(transactions)
+            for transaction in transactions:
+                if transaction.transaction_type in Transaction.CREDIT_TYPES:
+                    summary['credits'] += transaction.amount
+                else:
+                    summary['debits'] += transaction.amount
+            room = PREVIEW_ROWS - len(summary['rows'])
+            summary['rows'].extend(transactions[:max(room, 0)])
+            summary['error_count'] += len(errors)
+            summary['error_lines'].update(line for line, _, _ in errors)
+            summary['errors'].extend(errors[:MAX_REPORTED_ERRORS - len(summary['errors'])])
+        summary['invalid'] = len(summary.pop('error_lines'))
+        return summary
+
+    def commit(self, path, skip_invalid=False):
+        """
+        Insert the file's transactions.  Returns ``(created, error_count)``;
+        with errors and not ``skip_invalid`` nothing is inserted.
+        """
+        created = error_count = 0
+        try:
+            with ledger.deferred():
+                for transactions, errors in self.batches(path):
+                    error_count += len(errors)
+                    if error_count and not skip_invalid:
+                        raise _Rollback
+                    Transaction.objects.bulk_create(transactions)
+                    ledger.record_created(transactions)
+                    created += len(transactions)
+        except _Rollback:
+            return 0, error_count
+        return created, error_count
@@ -0,0 +1,652 @@
+"""
+Ledger service: the single place that knows how transactions add up to
+account balances.  Signals, views and management commands all go through it.
+
+Every saved or deleted ``Transaction`` moves the balance of the account it is
+posted to by its signed amount (credits add, debits subtract).  By default the
+signals only apply that delta; the full re-aggregation of an account's history
+is kept for verification and repair, and computes any number of accounts in a
+single conditional-aggregation query.
+
+Operations that touch many rows at once should run inside ``deferred()`` so
+their deltas are summed and each affected account and month is updated once
+instead of once per row.
+Rows inserted with ``bulk_create`` bypass the signals and are passed to
+``record_created()`` instead.
+
+Monthly ``AccountBalanceSnapshot`` rows are kept in step with the same deltas,
+so the balance of any account at any date is one indexed snapshot lookup plus
+a sum over the part of a single month.
+
+``period_totals`` breaks a set of transactions down by month, quarter or
+fiscal year (regular and transfer credits and debits) in one GROUP BY query.
+
+``ledger_version()`` is a database counter moved by every change to the
+transactions, accounts, categories or account types and by the repair
+commands; cached reports key on it so no process serves them stale.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When, Window
+from django.db.models.functions import ExtractYear, TruncMonth, TruncQuarter
+from django.utils import timezone
+
+from . import lookups
+from .models import Account, AccountBalanceSnapshot, LedgerVersion, Transaction
+
+logger = logging.getLogger('ecclesia.ledger')
+
+
+_deferred = threading.local()
+
+# Buckets of the period analytics
+REGULAR_CREDIT_TYPES = ['receipt', 'offering', 'custom_credit']
+REGULAR_DEBIT_TYPES = ['bill', 'custom_debit', 'aqudence']
+TRANSFER_CREDIT_TYPES = ['contra_credit', 'intra_credit']
+TRANSFER_DEBIT_TYPES = ['contra', 'intra']
+
+PERIODS = ('month', 'quarter', 'fiscal_year')
+# Months per period
+PERIOD_MONTHS = {'month': 1, 'quarter': 3, 'fiscal_year': 12}
+
+
+def balance_mode():
+    """Return the configured balance maintenance mode ('delta' or 'recompute')"""
+    return getattr(settings, 'LEDGER_BALANCE_MODE', 'delta')
+
+
+def signed_amount(transaction_type, amount):
+    """Return the amount as it affects the account balance"""
+    amount = Decimal(str(amount or 0))
+    if transaction_type in Transaction.CREDIT_TYPES:
+        return amount
+    if transaction_type in Transaction.DEBIT_TYPES:
+        return -amount
+    return Decimal('0')
+
+
+def month_start(day):
+    """First day of the month containing ``day``"""
+    return day.replace(day=1)
+
+
+def ledger_state(instance):
+    """Snapshot the fields of a transaction that affect balances"""
+    # Views assign the posted date string; normalise it like the database will
+    day = Transaction._meta.get_field('date').to_python(instance.date)
+    return (instance.account_id, instance.transaction_type, instance.amount, day)
+
+
+def stored_ledger_state(pk):
+    """Read the balance-affecting fields of a transaction as currently stored"""
+    if pk is None:
+        return None
+    transactions = Transaction.objects.all()
+    if db_transaction.get_connection().in_atomic_block:
+        # Hold the row so a concurrent edit cannot reverse the same old state
+        transactions = transactions.select_for_update()
+    return transactions.filter(pk=pk).values_list(
+        'account_id', 'transaction_type', 'amount', 'date'
+    ).first()
+
+
+def transaction_deltas(old_state, new_state):
+    """
+    Work out how much each account balance moves when a transaction goes from
+    ``old_state`` to ``new_state``.  Either state may be None (create/delete).
+    Handles changes of amount, account and transaction type.
+    """
+    deltas = {}
+    if old_state:
+        account_id, transaction_type, amount = old_state[:3]
+        deltas[account_id] = deltas.get(account_id, Decimal('0')) - signed_amount(transaction_type, amount)
+    if new_state:
+        account_id, transaction_type, amount = new_state[:3]
+        deltas[account_id] = deltas.get(account_id, Decimal('0')) + signed_amount(transaction_type, amount)
+    return {account_id: delta for account_id, delta in deltas.items() if account_id and delta}
+
+
+def snapshot_deltas(old_state, new_state):
+    """
+    Work out how the monthly credit/debit totals move for a transaction
+    change.  Returns ``{(account_id, month): (credits, debits)}``.
+    """
+    deltas = {}
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if not state or not state[0] or not state[3]:
+            continue
+        account_id, transaction_type, amount, day = state
+        key = (account_id, month_start(day))
+        credits, debits = deltas.get(key, (Decimal('0'), Decimal('0')))
+        amount = Decimal(str(amount or 0)) * sign
+        if transaction_type in Transaction.CREDIT_TYPES:
+            credits += amount
+        elif transaction_type in Transaction.DEBIT_TYPES:
+            debits += amount
+        deltas[key] = (credits, debits)
+    return {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+
+
+def lock_accounts(account_ids=None):
+    """
+    Row-lock the given (default: all) accounts until the current atomic
+    block ends and return the ids that exist.  Locks are taken in primary
+    key order so concurrent writers cannot deadlock.
+    """
+    accounts = Account.objects.select_for_update()
+    if account_ids is not None:
+        accounts = accounts.filter(pk__in=list(account_ids))
+    return set(accounts.order_by('pk').values_list('pk', flat=True))
+
+
+def apply_deltas(deltas, month_deltas=None):
+    """
+    Atomically add each delta to its account balance, and each monthly delta
+    to the account's snapshots, under a row lock on the affected accounts.
+    """
+    month_deltas = month_deltas or {}
+    account_ids = set(deltas) | {account_id for account_id, month in month_deltas}
+    if not account_ids:
+        return
+    with db_transaction.atomic():
+        # Accounts deleted along with their transactions are skipped
+        account_ids = lock_accounts(account_ids)
+        now = timezone.now()
+        for account_id in sorted(account_ids & set(deltas)):
+            if deltas[account_id]:
+                Account.objects.filter(pk=account_id).update(
+                    balance=F('balance') + deltas[account_id],
+                    updated_at=now,
+                )
+        for (account_id, month), (credits, debits) in sorted(month_deltas.items()):
+            if account_id in account_ids and (credits or debits):
+                apply_snapshot_delta(account_id, month, credits, debits)
+
+
+def apply_snapshot_delta(account_id, month, credits, debits):
+    """Add credits/debits to one month and carry the net into later months"""
+    net = credits - debits
+    updated = AccountBalanceSnapshot.objects.filter(account_id=account_id, month=month).update(
+        credits=F('credits') + credits,
+        debits=F('debits') + debits,
+        closing=F('closing') + net,
+    )
+    if not updated:
+        opening = AccountBalanceSnapshot.objects.filter(
+            account_id=account_id, month__lt=month
+        ).order_by('-month').values_list('closing', flat=True).first() or Decimal('0')
+        AccountBalanceSnapshot.objects.create(
+            account_id=account_id,
+            month=month,
+            opening=opening,
+            credits=credits,
+            debits=debits,
+            closing=opening + net,
+        )
+    else:
+        # A month left without activity carries no information
+        AccountBalanceSnapshot.objects.filter(account_id=account_id, month=month, credits=0, debits=0).delete()
+    if net:
+        AccountBalanceSnapshot.objects.filter(account_id=account_id, month__gt=month).update(
+            opening=F('opening') + net,
+            closing=F('closing') + net,
+        )
+
+
+def _savepoint_depth():
+    # atomic(savepoint=False) blocks are listed as None; only real savepoints can roll back on their own
+    return sum(1 for sid in db_transaction.get_connection().savepoint_ids if sid)
+
+
+def _pending_batch():
+    """
+    The ``deferred()`` batch a change joins.  None outside a batch, and also
+    inside a savepoint opened within it: rolling that savepoint back would
+    undo the rows but not their collected deltas, so such changes are
+    applied at once, inside the savepoint, instead.
+    """
+    batch = getattr(_deferred, 'batch', None)
+    if batch is not None and _savepoint_depth() > batch['depth']:
+        return None
+    return batch
+
+
+def atomic():
+    """
+    ``atomic()`` for a single ledger change.  Inside a batch it joins the
+    batch's transaction without a savepoint, so a failed change fails the
+    whole batch instead of leaving its deltas behind.
+    """
+    return db_transaction.atomic(savepoint=_pending_batch() is None)
+
+
+def _collect(batch, old_state, new_state):
+    """Add one transaction change to ``batch``'s per-account and per-month deltas"""
+    for account_id, delta in transaction_deltas(old_state, new_state).items():
+        batch['deltas'][account_id] = batch['deltas'].get(account_id, Decimal('0')) + delta
+    for key, (credits, debits) in snapshot_deltas(old_state, new_state).items():
+        total_credits, total_debits = batch['month_deltas'].get(key, (Decimal('0'), Decimal('0')))
+        batch['month_deltas'][key] = (total_credits + credits, total_debits + debits)
+    batch['account_ids'].update(state[0] for state in (old_state, new_state) if state and state[0])
+
+
+def _apply_batch(batch):
+    if batch.get('expire'):
+        _bump_ledger_version()
+    if balance_mode() == 'recompute':
+        recalculate_accounts(batch['account_ids'])
+        return
+    apply_deltas(batch['deltas'], batch['month_deltas'])
+
+
+@contextmanager
+def deferred():
+    """
+    Run a block atomically with balance maintenance batched.  Transactions
+    saved or deleted inside it only add their deltas to the batch, summed
+    per account and per month; the totals are applied once, inside the same
+    atomic block, when the outermost ``deferred()`` exits.  Nested blocks
+    join the outer batch without a savepoint of their own; changes made in
+    any other savepoint inside the block are applied immediately.
+    """
+    outermost = getattr(_deferred, 'batch', None) is None
+    try:
+        with db_transaction.atomic(savepoint=outermost):
+            if outermost:
+                _deferred.batch = {'deltas': {}, 'month_deltas': {}, 'account_ids': set(),
+                                   'depth': _savepoint_depth()}
+            yield
+            if outermost:
+                batch = _deferred.batch
+                logger.debug('deferred balance change accounts=%s deltas=%s', batch['account_ids'], batch['deltas'])
+                _apply_batch(batch)
+    finally:
+        if outermost:
+            _deferred.batch = None
+
+
+def ledger_version():
+    """Counter of ledger changes, for the keys of cached reports"""
+    return LedgerVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def expire_reports():
+    """
+    Move the ledger version as part of the current database transaction, so
+    it commits (or rolls back) with the change.  Inside ``deferred()`` it
+    moves once, when the batch is applied.
+    """
+    batch = _pending_batch()
+    if batch is not None:
+        batch['expire'] = True
+        return
+    _bump_ledger_version()
+
+
+def _bump_ledger_version():
+    if not LedgerVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        LedgerVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+def record_change(old_state, new_state):
+    """Bring account balances in line with a single transaction change"""
+    expire_reports()
+    batch = _pending_batch()
+    if batch is not None:
+        _collect(batch, old_state, new_state)
+        return
+    if balance_mode() == 'recompute':
+        recalculate_accounts({state[0] for state in (old_state, new_state) if state and state[0]})
+        return
+    deltas = transaction_deltas(old_state, new_state)
+    logger.debug('balance change old=%s new=%s deltas=%s', old_state, new_state, deltas)
+    apply_deltas(deltas, snapshot_deltas(old_state, new_state))
+
+
+def record_created(transactions):
+    """
+    Bring balances in line with transactions inserted without signals, as
+    ``bulk_create`` does.  Their deltas are summed per account and month and
+    applied together, so each account is updated (and locked) once.
+    """
+    expire_reports()
+    states = [ledger_state(transaction) for transaction in transactions]
+    batch = _pending_batch()
+    if batch is not None:
+        for state in states:
+            _collect(batch, None, state)
+        return
+    batch = {'deltas': {}, 'month_deltas': {}, 'account_ids': set()}
+    for state in states:
+        _collect(batch, None, state)
+    logger.debug('bulk balance change rows=%s deltas=%s', len(states), batch['deltas'])
+    _apply_batch(batch)
+
+
+def recalculate_accounts(account_ids):
+    """Recompute balances and monthly snapshots of the given accounts"""
+    with db_transaction.atomic():
+        recalculate_balances(Account.objects.filter(pk__in=account_ids))
+        rebuild_snapshots(account_ids)
+        expire_reports()
+
+
+def _amount_when(transaction_types, negate=False):
+    amount = -F('amount') if negate else F('amount')
+    return When(transaction_type__in=transaction_types, then=amount)
+
+
+def signed_amount_expression():
+    """Database expression for a transaction's effect on its account balance"""
+    return Case(
+        _amount_when(Transaction.CREDIT_TYPES),
+        _amount_when(Transaction.DEBIT_TYPES, negate=True),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def credit_sum(transaction_types=None):
+    """Sum of amounts over the given (default: all credit) transaction types"""
+    return Sum(Case(
+        _amount_when(transaction_types or Transaction.CREDIT_TYPES),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    ))
+
+
+def debit_sum(transaction_types=None):
+    """Sum of amounts over the given (default: all debit) transaction types"""
+    return credit_sum(transaction_types or Transaction.DEBIT_TYPES)
+
+
+def ledger_totals(account_ids=None):
+    """
+    Credits, debits and balance per account, computed in one GROUP BY query.
+    Returns ``{account_id: {'credits', 'debits', 'balance'}}``; accounts
+    without transactions are reported with zero totals.
+    """
+    queryset = Transaction.objects.all()
+    if account_ids is not None:
+        account_ids = list(account_ids)
+        queryset = queryset.filter(account_id__in=account_ids)
+    rows = queryset.order_by().values('account_id').annotate(
+        credits=credit_sum(),
+        debits=debit_sum(),
+    )
+    zero = Decimal('0')
+    totals = {account_id: {'credits': zero, 'debits': zero, 'balance': zero} for account_id in account_ids or []}
+    for row in rows:
+        credits = row['credits'] or zero
+        debits = row['debits'] or zero
+        totals[row['account_id']] = {'credits': credits, 'debits': debits, 'balance': credits - debits}
+    return totals
+
+
+def compute_balances(account_ids=None):
+    """Return ``{account_id: balance}`` recomputed from the full history"""
+    return {account_id: total['balance'] for account_id, total in ledger_totals(account_ids).items()}
+
+
+def recalculate_balances(accounts):
+    """
+    Overwrite the stored balance of each account with its recomputed balance.
+    One aggregate query and one bulk update for the whole batch.
+    """
+    accounts = list(accounts)
+    if not accounts:
+        return accounts
+    # The totals are read under the account locks, so a delta applied
+    # concurrently lands either in them or on top of the written balance
+    with db_transaction.atomic():
+        lock_accounts(account.pk for account in accounts)
+        balances = compute_balances(account.pk for account in accounts)
+        now = timezone.now()
+        for account in accounts:
+            account.balance = balances[account.pk]
+            account.updated_at = now
+        Account.objects.bulk_update(accounts, ['balance', 'updated_at'])
+        expire_reports()
+    return accounts
+
+
+def compute_balance(account):
+    """Re-aggregate an account's full transaction history into a balance"""
+    return compute_balances([account.pk])[account.pk]
+
+
+def verify_balance(account):
+    """Return (stored, computed) balances for an account without writing"""
+    stored = Account.objects.filter(pk=account.pk).values_list('balance', flat=True).first()
+    return stored, compute_balance(account)
+
+
+def recalculate_balance(account):
+    """Overwrite an account's stored balance with the full recomputation"""
+    recalculate_balances([account])
+    return account.balance
+
+
+def rebuild_snapshots(account_ids=None):
+    """
+    Rebuild the monthly snapshots of the given (default: all) accounts from
+    one GROUP BY account, month query.  Returns the number of rows written.
+    """
+    transactions = Transaction.objects.all()
+    snapshots = AccountBalanceSnapshot.objects.all()
+    if account_ids is not None:
+        account_ids = list(account_ids)
+        transactions = transactions.filter(account_id__in=account_ids)
+        snapshots = snapshots.filter(account_id__in=account_ids)
+    with db_transaction.atomic():
+        # Read under the account locks so no concurrent delta is lost
+        lock_accounts(account_ids)
+        rows = transactions.order_by().annotate(month=TruncMonth('date')).values('account_id', 'month').annotate(
+            credits=credit_sum(),
+            debits=debit_sum(),
+        ).order_by('account_id', 'month')
+
+        new_snapshots = []
+        running = {}
+        for row in rows:
+            credits = row['credits'] or Decimal('0')
+            debits = row['debits'] or Decimal('0')
+            if not credits and not debits:
+                continue
+            opening = running.get(row['account_id'], Decimal('0'))
+            closing = opening + credits - debits
+            running[row['account_id']] = closing
+            new_snapshots.append(AccountBalanceSnapshot(
+                account_id=row['account_id'],
+                month=row['month'],
+                opening=opening,
+                credits=credits,
+                debits=debits,
+                closing=closing,
+            ))
+        snapshots.delete()
+        AccountBalanceSnapshot.objects.bulk_create(new_snapshots, batch_size=500)
+        expire_reports()
+    return len(new_snapshots)
+
+
+def balances_before(account_ids, day):
+    """
+    Return ``{account_id: balance}`` over all transactions dated before
+    ``day``: the closing of each account's last snapshot before that month
+    plus the part of the month up to ``day``.  Two queries for any number of
+    accounts.
+    """
+    account_ids = list(account_ids)
+    start = month_start(day)
+    last_closing = AccountBalanceSnapshot.objects.filter(
+        account=OuterRef('pk'), month__lt=start
+    ).order_by('-month').values('closing')[:1]
+    balances = {
+        account_id: closing or Decimal('0')
+        for account_id, closing in Account.objects.filter(pk__in=account_ids).annotate(
+            last_closing=Subquery(last_closing)
+        ).values_list('pk', 'last_closing')
+    }
+    if day > start:
+        partial = Transaction.objects.filter(
+            account_id__in=account_ids, date__gte=start, date__lt=day
+        ).order_by().values('account_id').annotate(total=Sum(signed_amount_expression()))
+        for row in partial:
+            balances[row['account_id']] += row['total'] or Decimal('0')
+    return balances
+
+
+def balance_before(account, day):
+    """Balance of an account over all transactions dated before ``day``"""
+    return balances_before([account.pk], day).get(account.pk, Decimal('0'))
+
+
+def balances_as_of(account_ids, day):
+    """Return ``{account_id: balance}`` including transactions dated ``day``"""
+    return balances_before(account_ids, day + timedelta(days=1))
+
+
+def running_balances(account, transactions):
+    """
+    Set ``running_balance`` on each of ``account``'s transactions (typically
+    one page of its ledger): the balance just after that entry in (date,
+    created_at, id) order.  A window sum covers only the date span of the
+    page and only the page's rows of it are fetched; everything before the
+    span comes from the monthly snapshots.
+    """
+    transactions = list(transactions)
+    page = [t for t in transactions if t.account_id == account.pk]
+    if not page:
+        return transactions
+    first, last = min(t.date for t in page), max(t.date for t in page)
+    opening = balance_before(account, first)
+    running = dict(
+        Transaction.objects.filter(account=account, date__range=[first, last]).annotate(
+            running=Window(
+                Sum(signed_amount_expression(), output_field=DecimalField(max_digits=14, decimal_places=2)),
+                order_by=[F('date').asc(), F('created_at').asc(), F('pk').asc()],
+            )
+        ).filter(
+            # Tied to the window by the OR, the page filter is applied to the
+            # windowed rows (QUALIFY) rather than before the sum.  The window
+            # sum is never NULL, so this is just ``pk IN page``.
+            Q(running__isnull=True) | Q(pk__in=[t.pk for t in page])
+        ).values_list('pk', 'running')
+    )
+    for t in page:
+        if t.pk in running:
+            t.running_balance = opening + running[t.pk]
+    return transactions
+
+
+def fiscal_year_start_month():
+    """Month (1-12) the fiscal year starts in"""
+    return getattr(settings, 'FISCAL_YEAR_START_MONTH', 1)
+
+
+def add_months(day, months):
+    """First day of the month ``months`` after the month of ``day``"""
+    index = day.year * 12 + day.month - 1 + months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def period_start(day, period):
+    """First day of the month, quarter or fiscal year containing ``day``"""
+    if period == 'month':
+        return month_start(day)
+    if period == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    start_month = fiscal_year_start_month()
+    year = day.year if day.month >= start_month else day.year - 1
+    return day.replace(year=year, month=start_month, day=1)
+
+
+def last_periods(period, count, today=None):
+    """``(start, end)`` dates spanning the last ``count`` periods up to today's"""
+    current = period_start(today or timezone.now().date(), period)
+    months = PERIOD_MONTHS[period]
+    start = add_months(current, -months * (count - 1))
+    end = add_months(current, months) - timedelta(days=1)
+    return start, end
+
+
+def _period_expression(period):
+    if period == 'month':
+        return TruncMonth('date')
+    if period == 'quarter':
+        return TruncQuarter('date')
+    # The year the fiscal year started in; mapped back to a date afterwards
+    start_month = fiscal_year_start_month()
+    if start_month == 1:
+        return ExtractYear('date')
+    return ExtractYear('date') - Case(
+        When(date__month__lt=start_month, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _empty_period(start, period):
+    zero = Decimal('0.00')
+    return {
+        'start_date': start,
+        'end_date': add_months(start, PERIOD_MONTHS[period]) - timedelta(days=1),
+        'regular_credits': zero,
+        'regular_debits': zero,
+        'contra_credits': zero,
+        'contra_debits': zero,
+        'total_credits': zero,
+        'total_debits': zero,
+        'net_change': zero,
+        'transaction_count': 0,
+    }
+
+
+def period_totals(transactions, period='month', start=None, end=None):
+    """
+    Regular and transfer credits and debits of ``transactions`` per month,
+    quarter or fiscal year, from one GROUP BY query with conditional sums.
+    Returns a list of dicts (start_date, end_date, regular_credits, regular_debits,
+    contra_credits, contra_debits, total_credits, total_debits, net_change,
+    transaction_count) oldest first.  Given ``start`` and ``end`` only that
+    range is read and every period in it is listed, empty ones as zeros.
+    """
+    if period not in PERIODS:
+        raise ValueError(f'Unknown period: {period}')
+    if start is not None:
+        transactions = transactions.filter(date__gte=start)
+    if end is not None:
+        transactions = transactions.filter(date__lte=end)
+    rows = transactions.order_by().annotate(period=_period_expression(period)).values('period').annotate(
+        regular_credits=credit_sum(REGULAR_CREDIT_TYPES),
+        regular_debits=debit_sum(REGULAR_DEBIT_TYPES),
+        contra_credits=credit_sum(TRANSFER_CREDIT_TYPES),
+        contra_debits=debit_sum(TRANSFER_DEBIT_TYPES),
+        transaction_count=Count('pk'),
+    )
+
+    periods = {}
+    if start is not None and end is not None:
+        day = period_start(start, period)
+        while day <= end:
+            periods[day] = _empty_period(day, period)
+            day = add_months(day, PERIOD_MONTHS[period])
+    for row in rows:
+        key = row['period']
+        if period == 'fiscal_year':
+            key = date(key, fiscal_year_start_month(), 1)
+        bucket = periods.setdefault(key, _empty_period(key, period))
+        for name in ('regular_credits', 'regular_debits', 'contra_credits', 'contra_debits'):
+            bucket[name] = (row[name] or Decimal('0')).quantize(Decimal('0.01'))
+        bucket['transaction_count'] = row['transaction_count']
+        bucket['total_credits'] = bucket['regular_credits'] + bucket['contra_credits']
+        bucket['total_debits'] = bucket['regular_debits'] + bucket['contra_debits']
+        bucket['net_change'] = bucket['total_credits'] - bucket['total_debits']
+    return [periods[key] for key in sorted(periods)]
@@ -0,0 +1,121 @@
+"""
+Cached dropdown data for the transaction forms and lists.
+
+Every add, edit and list page offers the pastorate's accounts and the credit
+or debit categories.  Those tables change rarely, so the rows are kept in the
+cache under versioned keys: a pastorate's accounts are stored against that
+pastorate's version, categories and account types against global versions.
+Receivers in models.py bump a version whenever one of the rows behind it is
+saved or deleted, which orphans the old entries instead of deleting them.
+
+The cached accounts defer ``balance``; reading it fetches the live value.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Q
+
+CACHE_PREFIX = 'accounts:lookups'
+# Versioned entries never go stale, the timeout only reclaims orphans
+CACHE_TIMEOUT = 60 * 60 * 24
+
+ACCOUNTS = 'accounts'
+CATEGORIES = 'categories'
+ACCOUNT_TYPES = 'account_types'
+
+
+def _version_key(scope, pastorate_id=None):
+    if pastorate_id is not None:
+        return f'{CACHE_PREFIX}:version:{scope}:{pastorate_id}'
+    return f'{CACHE_PREFIX}:version:{scope}'
+
+
+def _new_version():
+    # Start from the clock so a version evicted and recreated cannot revive
+    # entries cached under the old one
+    return time.time_ns()
+
+
+def get_version(scope, pastorate_id=None):
+    key = _version_key(scope, pastorate_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(scope, pastorate_id=None):
+    """Move ``scope`` (for one pastorate, if given) to a new version"""
+    key = _version_key(scope, pastorate_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def _cached(key, load):
+    rows = cache.get(key)
+    if rows is None:
+        rows = load()
+        cache.set(key, rows, CACHE_TIMEOUT)
+    return rows
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def pastorate_accounts(pastorate):
+    """Accounts of the pastorate and its churches, ordered by name"""
+    from .models import Account
+    pastorate_id = _pk(pastorate)
+    key = '{}:accounts:{}:{}:{}'.format(
+        CACHE_PREFIX, pastorate_id,
+        get_version(ACCOUNTS, pastorate_id), get_version(ACCOUNT_TYPES),
+    )
+    return _cached(key, lambda: list(
+        Account.objects.filter(Q(pastorate_id=pastorate_id) | Q(church__pastorate_id=pastorate_id))
+        .select_related('account_type', 'pastorate', 'church__pastorate')
+        .defer('balance')
+        .order_by('name')
+    ))
+
+
+def _categories():
+    from .models import PrimaryCategory, SecondaryCategory
+    key = f'{CACHE_PREFIX}:categories:{get_version(CATEGORIES)}'
+    return _cached(key, lambda: (
+        list(PrimaryCategory.objects.order_by('name', 'pk')),
+        list(SecondaryCategory.objects.select_related('primary_category').order_by('name', 'pk')),
+    ))
+
+
+def primary_categories(transaction_type=None, active_only=False):
+    """Primary categories by name, optionally only those of one transaction type"""
+    primaries, _ = _categories()
+    return [category for category in primaries
+            if (transaction_type is None or category.transaction_type == transaction_type)
+            and (category.is_active or not active_only)]
+
+
+def secondary_categories(transaction_type=None, include=None, active_only=False):
+    """
+    Secondary categories by name whose primary category has
+    ``transaction_type``, plus any belonging to the primary category
+    ``include`` (an edit form's current choice).
+    """
+    _, secondaries = _categories()
+    include_id = _pk(include)
+    return [category for category in secondaries
+            if (transaction_type is None
+                or category.primary_category.transaction_type == transaction_type
+                or (include_id is not None and category.primary_category_id == include_id))
+            and (category.is_active or not active_only)]
+
+
+def account_types():
+    """All account types ordered by name"""
+    from .models import AccountType
+    key = f'{CACHE_PREFIX}:account_types:{get_version(ACCOUNT_TYPES)}'
+    return _cached(key, lambda: list(AccountType.objects.order_by('name')))
@@ -1,89 +1,108 @@
 from django.core.management.base import BaseCommand
-from django.db.models import Q
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
 from accounts.models import Transaction
-from decimal import Decimal
 
-class Command(BaseCommand):
-    help = 'Check contra entries for potential issues'
 
-    def handle(self, *args, **options):
-        # Get all contra transactions
-        contra_transactions = Transaction.objects.filter(
-            Q(transaction_type='contra') | Q(transaction_type='contra_credit')
-        ).select_related(
-            'account',
-            'account__pastorate',
-            'account__church',
-            'to_account',
-            'from_account'
-        ).order_by('date', 'created_at')
+class Command(BaseCommand):
+    help = 'Check contra and intra entries for unpaired or mismatched legs'
 
-        self.stdout.write("Checking contra entries...")
-        
-        # Group transactions by reference number to check pairs
-        transaction_pairs = {}
-        for trans in contra_transactions:
-            if trans.reference_number not in transaction_pairs:
-                transaction_pairs[trans.reference_number] = []
-            transaction_pairs[trans.reference_number].append(trans)
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50,
+                            help='Most issues listed per check (all are counted)')
 
-        issues_found = False
-        
-        # Check each pair of transactions
-        for ref_num, transactions in transaction_pairs.items():
-            if len(transactions) != 2:
-                issues_found = True
-                self.stdout.write(self.style.ERROR(
-                    f"Issue: Reference {ref_num} has {len(transactions)} transactions instead of 2"
-                ))
-                continue
+    def handle(self, *args, **options):
+        self.limit = options['limit']
+        self.issues = 0
+        self.stdout.write("Checking contra and intra entries...")
 
-            debit = next((t for t in transactions if t.transaction_type == 'contra'), None)
-            credit = next((t for t in transactions if t.transaction_type == 'contra_credit'), None)
+        # Each check is one query; only the offending rows leave the database
+        self.check_unpaired()
+        self.check_pairs()
+        for debit_type, credit_type in Transaction.TRANSFER_PAIRS.items():
+            self.check_legs(debit_type, credit_type)
 
-            if not debit or not credit:
-                issues_found = True
-                self.stdout.write(self.style.ERROR(
-                    f"Issue: Reference {ref_num} missing debit or credit entry"
-                ))
-                continue
+        if not self.issues:
+            self.stdout.write(self.style.SUCCESS("No issues found in contra or intra entries"))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{self.issues} issues were found in contra and intra entries. Please review the errors above."
+            ))
 
-            # Check amounts match
-            if debit.amount != credit.amount:
-                issues_found = True
-                self.stdout.write(self.style.ERROR(
-                    f"Issue: Amount mismatch for reference {ref_num}"
-                    f"\nDebit amount: {debit.amount}"
-                    f"\nCredit amount: {credit.amount}"
-                ))
+    def report(self, title, rows, describe):
+        count = 0
+        for row in rows:
+            count += 1
+            if count <= self.limit:
+                self.stdout.write(self.style.ERROR(f"Issue: {describe(row)}"))
+        if count > self.limit:
+            self.stdout.write(self.style.ERROR(f"... {count - self.limit} more"))
+        if count:
+            self.stdout.write(f"{title}: {count}")
+        self.issues += count
 
-            # Check account relationships
-            if debit.account != credit.from_account:
-                issues_found = True
-                self.stdout.write(self.style.ERROR(
-                    f"Issue: Account mismatch for reference {ref_num}"
-                    f"\nDebit account: {debit.account}"
-                    f"\nCredit from_account: {credit.from_account}"
-                ))
+    def check_unpaired(self):
+        """Transfer legs that were never linked to another leg"""
+        types = list(Transaction.TRANSFER_PAIRS) + list(Transaction.TRANSFER_PAIRS.values())
+        rows = Transaction.objects.filter(
+            transaction_type__in=types, pair_id__isnull=True
+        ).order_by('date', 'pk').values_list('pk', 'transaction_type', 'reference_number', 'date').iterator()
+        self.report('Unpaired entries', rows, lambda row: (
+            f"{row[1]} entry {row[0]} (reference {row[2]}, {row[3]}) has no pair"
+        ))
 
-            if debit.to_account != credit.account:
-                issues_found = True
-                self.stdout.write(self.style.ERROR(
-                    f"Issue: Account mismatch for reference {ref_num}"
-                    f"\nDebit to_account: {debit.to_account}"
-                    f"\nCredit account: {credit.account}"
-                ))
+    def check_pairs(self):
+        """Pairs that are not exactly one debit leg and its matching credit leg"""
+        annotations = {}
+        valid = Q()
+        for debit_type, credit_type in Transaction.TRANSFER_PAIRS.items():
+            annotations[debit_type] = Count('pk', filter=Q(transaction_type=debit_type))
+            annotations[credit_type] = Count('pk', filter=Q(transaction_type=credit_type))
+            valid |= Q(**{debit_type: 1, credit_type: 1})
+        rows = Transaction.objects.filter(pair_id__isnull=False).values('pair_id').annotate(
+            legs=Count('pk'), **annotations
+        ).exclude(valid & Q(legs=2)).order_by('pair_id').iterator()
+        self.report('Incomplete pairs', rows, lambda row: (
+            f"Pair {row['pair_id']} has {row['legs']} entries: " + ', '.join(
+                f"{row[name]} {name}" for name in annotations if row[name]
+            )
+        ))
 
-            # Check dates match
-            if debit.date != credit.date:
-                issues_found = True
-                self.stdout.write(self.style.ERROR(
-                    f"Issue: Date mismatch for reference {ref_num}"
-                    f"\nDebit date: {debit.date}"
-                    f"\nCredit date: {credit.date}"
-                ))
+    def check_legs(self, debit_type, credit_type):
+        """Debit legs whose credit leg differs in amount, date or accounts"""
+        credit_legs = Transaction.objects.filter(pair_id=OuterRef('pair_id'), transaction_type=credit_type)
+        matching = credit_legs.filter(
+            amount=OuterRef('amount'),
+            date=OuterRef('date'),
+            account_id=OuterRef('to_account_id'),
+            from_account_id=OuterRef('account_id'),
+        )
+        rows = Transaction.objects.filter(
+            transaction_type=debit_type, pair_id__isnull=False
+        ).filter(
+            Exists(credit_legs), ~Exists(matching)
+        ).annotate(
+            credit_pk=Subquery(credit_legs.values('pk')[:1]),
+            credit_amount=Subquery(credit_legs.values('amount')[:1]),
+            credit_date=Subquery(credit_legs.values('date')[:1]),
+            credit_account=Subquery(credit_legs.values('account_id')[:1]),
+            credit_from_account=Subquery(credit_legs.values('from_account_id')[:1]),
+        ).order_by('date', 'pk').values(
+            'pk', 'reference_number', 'amount', 'date', 'account_id', 'to_account_id',
+            'credit_pk', 'credit_amount', 'credit_date', 'credit_account', 'credit_from_account',
+        ).iterator()
+        self.report(f'Mismatched {debit_type} entries', rows, lambda row: self.describe_mismatch(debit_type, row))
 
-        if not issues_found:
-            self.stdout.write(self.style.SUCCESS("No issues found in contra entries"))
-        else:
-            self.stdout.write(self.style.WARNING("Issues were found in contra entries. Please review the errors above.")) 
\ No newline at end of file
+    def describe_mismatch(self, debit_type, row):
+        problems = []
+        if row['amount'] != row['credit_amount']:
+            problems.append(f"amount {row['amount']} vs {row['credit_amount']}")
+        if row['date'] != row['credit_date']:
+            problems.append(f"date {row['date']} vs {row['credit_date']}")
+        if row['to_account_id'] != row['credit_account']:
+            problems.append(f"debit to_account {row['to_account_id']} vs credit account {row['credit_account']}")
+        if row['account_id'] != row['credit_from_account']:
+            problems.append(f"debit account {row['account_id']} vs credit from_account {row['credit_from_account']}")
+        return (
+            f"{debit_type} entry {row['pk']} and credit {row['credit_pk']} "
+            f"(reference {row['reference_number']}) differ: " + '; '.join(problems)
+        )
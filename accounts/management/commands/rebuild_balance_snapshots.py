@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from accounts.models import Account
+from accounts import ledger
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly account balance snapshots from transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pastorate', type=int, help='Only accounts of this pastorate and its churches')
+        parser.add_argument('--account', type=int, nargs='+', help='Only these account ids')
+
+    def handle(self, *args, **options):
+        account_ids = None
+        if options['pastorate']:
+            account_ids = Account.objects.filter(
+                Q(pastorate_id=options['pastorate']) | Q(church__pastorate_id=options['pastorate'])
+            ).values_list('pk', flat=True)
+        if options['account']:
+            account_ids = options['account']
+
+        count = ledger.rebuild_snapshots(account_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} monthly balance snapshots'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from accounts.search import install_search_index
+
+class Command(BaseCommand):
+    help = 'Recreates the transaction full-text search index and its triggers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild')
+
+    def handle(self, *args, **options):
+        if install_search_index(connections[options['database']]):
+            self.stdout.write(self.style.SUCCESS('Rebuilt the transaction search index'))
+        else:
+            self.stdout.write(self.style.WARNING('Full-text search is not available on this database; searches use LIKE'))
@@ -1,52 +1,84 @@
+from decimal import Decimal
 from django.core.management.base import BaseCommand
-from django.db import models
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 from accounts.models import Account, Transaction
+from accounts import ledger
 
 class Command(BaseCommand):
-    help = 'Recalculates all account balances'
+    help = 'Recalculates account balances from their transactions in one grouped query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pastorate', type=int, help='Only accounts of this pastorate and its churches')
+        parser.add_argument('--church', type=int, help='Only accounts of this church')
+        parser.add_argument('--account', type=int, nargs='+', help='Only these account ids')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without saving balances')
+        parser.add_argument('--verbose', action='store_true', help='List the transactions of every account')
 
     def handle(self, *args, **options):
-        accounts = Account.objects.all()
-        self.stdout.write('Starting balance recalculation...')
-        
-        for account in accounts:
-            self.stdout.write(f"\nCalculating for {account.name}:")
-            # Reset balance
-            account.balance = 0
-            
-            # Calculate credits (receipts, offerings, custom credits, contra credits)
-            credit_transactions = Transaction.objects.filter(
-                account=account,
-                transaction_type__in=['receipt', 'offering', 'custom_credit', 'contra_credit']
-            )
-            credits = credit_transactions.aggregate(total=models.Sum('amount'))['total'] or 0
-            
-            self.stdout.write("Credit transactions:")
-            for t in credit_transactions:
-                self.stdout.write(f"  {t.transaction_type}: +{t.amount} ({t.description})")
-            
-            # Calculate debits (bills, custom debits, aqudence, contra debits)
-            debit_transactions = Transaction.objects.filter(
-                account=account,
-                transaction_type__in=['bill', 'custom_debit', 'aqudence', 'contra']
-            )
-            debits = debit_transactions.aggregate(total=models.Sum('amount'))['total'] or 0
-            
-            self.stdout.write("Debit transactions:")
-            for t in debit_transactions:
-                self.stdout.write(f"  {t.transaction_type}: -{t.amount} ({t.description})")
-            
-            # Update balance
-            account.balance = credits - debits
-            account.save()
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'\nSummary for {account.name}:'
-                    f'\n  Credits: +{credits}'
-                    f'\n  Debits: -{debits}'
-                    f'\n  Final Balance: {account.balance}'
-                )
-            )
-        
-        self.stdout.write(self.style.SUCCESS('All account balances have been recalculated'))
\ No newline at end of file
+        accounts = Account.objects.order_by('pk')
+        scoped = False
+        if options['pastorate']:
+            accounts = accounts.filter(Q(pastorate_id=options['pastorate']) | Q(church__pastorate_id=options['pastorate']))
+            scoped = True
+        if options['church']:
+            accounts = accounts.filter(church_id=options['church'])
+            scoped = True
+        if options['account']:
+            accounts = accounts.filter(pk__in=options['account'])
+            scoped = True
+        with transaction.atomic():
+            if not options['dry_run']:
+                # Hold the accounts while their totals are read and written, so
+                # a balance delta applied concurrently is not overwritten
+                accounts = accounts.select_for_update(of=('self',))
+            accounts = list(accounts)
+            self.stdout.write(f'Recalculating {len(accounts)} account balances...')
+
+            # Credits and debits for every account in one GROUP BY query
+            totals = ledger.ledger_totals([account.pk for account in accounts] if scoped else None)
+            zero = {'credits': Decimal('0'), 'debits': Decimal('0'), 'balance': Decimal('0')}
+
+            drifted = []
+            for account in accounts:
+                total = totals.get(account.pk, zero)
+                if options['verbose']:
+                    self.write_transactions(account, total)
+                if total['balance'] != account.balance:
+                    drifted.append((account, account.balance, total['balance']))
+                    account.balance = total['balance']
+
+            for account, stored, computed in drifted:
+                self.stdout.write(self.style.WARNING(
+                    f'{account.name} ({account.account_number}): stored {stored}, '
+                    f'computed {computed}, drift {computed - stored}'
+                ))
+
+            if options['dry_run']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Dry run: {len(drifted)} of {len(accounts)} account balances would change'
+                ))
+                return
+
+            now = timezone.now()
+            changed = [account for account, stored, computed in drifted]
+            for account in changed:
+                account.updated_at = now
+            Account.objects.bulk_update(changed, ['balance', 'updated_at'], batch_size=500)
+            # Cached reports built from the drifted balances are dropped in every process
+            ledger.expire_reports()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recalculated {len(accounts)} account balances, {len(changed)} corrected'
+        ))
+
+    def write_transactions(self, account, total):
+        self.stdout.write(f"\n{account.name} ({account.account_number}):")
+        transactions = Transaction.objects.filter(account=account).order_by('date', 'created_at')
+        for t in transactions.iterator(chunk_size=2000):
+            sign = '+' if t.transaction_type in Transaction.CREDIT_TYPES else '-'
+            self.stdout.write(f"  {t.date} {t.transaction_type}: {sign}{t.amount} ({t.description})")
+        self.stdout.write(
+            f"  Credits: +{total['credits']}  Debits: -{total['debits']}  Balance: {total['balance']}"
+        )
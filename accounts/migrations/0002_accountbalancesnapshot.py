@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:29
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, Sum, Value, When
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+
+CREDIT_TYPES = ['receipt', 'offering', 'custom_credit', 'contra_credit', 'intra_credit']
+DEBIT_TYPES = ['bill', 'custom_debit', 'aqudence', 'contra', 'intra']
+
+
+def _sum(transaction_types):
+    return Sum(Case(
+        When(transaction_type__in=transaction_types, then='amount'),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    ))
+
+
+def build_snapshots(apps, schema_editor):
+    Transaction = apps.get_model('accounts', 'Transaction')
+    AccountBalanceSnapshot = apps.get_model('accounts', 'AccountBalanceSnapshot')
+    rows = Transaction.objects.order_by().annotate(month=TruncMonth('date')).values('account_id', 'month').annotate(
+        credits=_sum(CREDIT_TYPES),
+        debits=_sum(DEBIT_TYPES),
+    ).order_by('account_id', 'month')
+    snapshots = []
+    running = {}
+    for row in rows:
+        if not row['credits'] and not row['debits']:
+            continue
+        opening = running.get(row['account_id'], Decimal('0'))
+        closing = opening + (row['credits'] or 0) - (row['debits'] or 0)
+        running[row['account_id']] = closing
+        snapshots.append(AccountBalanceSnapshot(
+            account_id=row['account_id'],
+            month=row['month'],
+            opening=opening,
+            credits=row['credits'] or 0,
+            debits=row['debits'] or 0,
+            closing=closing,
+        ))
+    AccountBalanceSnapshot.objects.bulk_create(snapshots, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('opening', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('credits', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('debits', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('closing', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='accounts.account')),
+            ],
+            options={
+                'ordering': ['account', 'month'],
+                'unique_together': {('account', 'month')},
+            },
+        ),
+        migrations.RunPython(build_snapshots, migrations.RunPython.noop),
+    ]
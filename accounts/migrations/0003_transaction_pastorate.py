@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_pastorate(apps, schema_editor):
+    Account = apps.get_model('accounts', 'Account')
+    Transaction = apps.get_model('accounts', 'Transaction')
+    # One UPDATE per pastorate covering all of its accounts
+    account_ids = {}
+    for account_id, pastorate_id, church_pastorate_id in Account.objects.values_list(
+        'pk', 'pastorate_id', 'church__pastorate_id'
+    ):
+        account_ids.setdefault(pastorate_id or church_pastorate_id, []).append(account_id)
+    for pastorate_id, ids in account_ids.items():
+        if pastorate_id:
+            Transaction.objects.filter(account_id__in=ids).update(pastorate_id=pastorate_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('congregation', '0002_family_position_no'),
+        ('accounts', '0002_accountbalancesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='pastorate',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='congregation.pastorate'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['pastorate', 'transaction_type', 'date'], name='txn_pastorate_type_date'),
+        ),
+        migrations.RunPython(backfill_pastorate, migrations.RunPython.noop),
+    ]
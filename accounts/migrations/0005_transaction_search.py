@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from accounts.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from accounts.search import uninstall_search_index
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('congregation', '0002_family_position_no'),
+        ('accounts', '0004_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
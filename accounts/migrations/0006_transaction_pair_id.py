@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:57
+
+import uuid
+
+from django.db import migrations, models
+
+TRANSFER_PAIRS = {'contra': 'contra_credit', 'intra': 'intra_credit'}
+
+
+def backfill_pair_id(apps, schema_editor):
+    # Existing legs were only linked by reference, accounts, date and amount
+    Transaction = apps.get_model('accounts', 'Transaction')
+    for debit_type, credit_type in TRANSFER_PAIRS.items():
+        credits = {}
+        for pk, account_id, from_account_id, date, amount, reference in (
+            Transaction.objects.filter(transaction_type=credit_type).order_by('pk')
+            .values_list('pk', 'account_id', 'from_account_id', 'date', 'amount', 'reference_number')
+            .iterator()
+        ):
+            credits.setdefault((from_account_id, account_id, date, amount, reference), []).append(pk)
+
+        paired = []
+        for pk, account_id, to_account_id, date, amount, reference in (
+            Transaction.objects.filter(transaction_type=debit_type).order_by('pk')
+            .values_list('pk', 'account_id', 'to_account_id', 'date', 'amount', 'reference_number')
+            .iterator()
+        ):
+            candidates = credits.get((account_id, to_account_id, date, amount, reference))
+            if candidates:
+                pair_id = uuid.uuid4()
+                paired.append(Transaction(pk=pk, pair_id=pair_id))
+                paired.append(Transaction(pk=candidates.pop(0), pair_id=pair_id))
+        Transaction.objects.bulk_update(paired, ['pair_id'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_transaction_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='pair_id',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['pair_id'], name='txn_pair'),
+        ),
+        migrations.RunPython(backfill_pair_id, migrations.RunPython.noop),
+    ]
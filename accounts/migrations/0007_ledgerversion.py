@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+def create_counter(apps, schema_editor):
+    apps.get_model('accounts', 'LedgerVersion').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_transaction_pair_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.core.validators import MinValueValidator
 from congregation.models import Pastorate, Church
 from django.utils import timezone
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
@@ -59,6 +59,14 @@ class Account(models.Model):
             return f"{self.pastorate.pastorate_name} - {self.name}"
         return f"{self.church.church_name} - {self.name}"
 
+    def owning_pastorate_id(self):
+        """The pastorate this account belongs to, directly or through its church"""
+        if self.pastorate_id:
+            return self.pastorate_id
+        if self.church_id:
+            return self.church.pastorate_id
+        return None
+
 class PrimaryCategory(models.Model):
     """Primary transaction categories like Income, Expense"""
     name = models.CharField(max_length=100)
@@ -106,8 +114,15 @@ class Transaction(models.Model):
         ('intra', 'Intra Transfer (Debit)'),
         ('intra_credit', 'Intra Transfer (Credit)'),
     ]
+
+    # Transaction types that add to / subtract from the account balance
+    CREDIT_TYPES = ['receipt', 'offering', 'custom_credit', 'contra_credit', 'intra_credit']
+    DEBIT_TYPES = ['bill', 'custom_debit', 'aqudence', 'contra', 'intra']
+    # Debit leg type of each transfer and the type of its credit leg
+    TRANSFER_PAIRS = {'contra': 'contra_credit', 'intra': 'intra_credit'}
     
-    account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='transactions')
+    # Indexed through the composite indexes in Meta, which all lead with account
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='transactions', db_index=False)
     to_account = models.ForeignKey(Account, on_delete=models.PROTECT, null=True, blank=True, 
                                  related_name='incoming_transactions', help_text='For contra debit entries only')
     from_account = models.ForeignKey(Account, on_delete=models.PROTECT, null=True, blank=True,
@@ -129,11 +144,43 @@ class Transaction(models.Model):
     family_name = models.CharField(max_length=100, blank=True, null=True)
     member_name = models.CharField(max_length=100, blank=True, null=True)
     church = models.ForeignKey(Church, on_delete=models.PROTECT, null=True, blank=True)
+    # Copied from the account on save so pastorate-wide lists need no OR-join
+    pastorate = models.ForeignKey(Pastorate, on_delete=models.PROTECT, null=True, blank=True,
+                                  editable=False, related_name='transactions')
+    # Shared by the debit and credit legs of a contra or intra transfer
+    pair_id = models.UUIDField(null=True, blank=True, editable=False)
     
     created_by = models.ForeignKey(get_user_model(), on_delete=models.PROTECT, related_name='created_transactions', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Balance totals, per-type ledgers and monthly statistics of an account
+            models.Index(fields=['account', 'transaction_type', 'date'], name='txn_account_type_date'),
+            # Date ranges of an account: reports, running balances, snapshots
+            models.Index(fields=['account', 'date'], name='txn_account_date'),
+            # Pastorate-wide list views
+            models.Index(fields=['pastorate', 'transaction_type', 'date'], name='txn_pastorate_type_date'),
+            # Type-wide scans such as the contra/intra pair checks
+            models.Index(fields=['transaction_type', 'date'], name='txn_type_date'),
+            models.Index(fields=['reference_number'], name='txn_reference_number'),
+            # Both legs of a transfer
+            models.Index(fields=['pair_id'], name='txn_pair'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The pre_save read of the stored row, the write and the post_save
+        # balance delta must commit together or not at all
+        from . import ledger
+        with ledger.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        from . import ledger
+        with ledger.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         if self.transaction_type == 'receipt':
             return f"Receipt #{self.receipt_number}"
@@ -150,6 +197,32 @@ class Transaction(models.Model):
         else:
             return f"{self.get_transaction_type_display()} #{self.reference_number}"
 
+class AccountBalanceSnapshot(models.Model):
+    """Monthly ledger totals per account, maintained by the transaction signals"""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_snapshots')
+    month = models.DateField(help_text='First day of the month')
+    opening = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    credits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    debits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    closing = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('account', 'month')]
+        ordering = ['account', 'month']
+
+    def __str__(self):
+        return f"{self.account.name} - {self.month:%b %Y}"
+
+class LedgerVersion(models.Model):
+    """
+    Single-row counter moved by every change to the ledger.  Cached reports
+    key on it; it lives in the database so every process sees the same value.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Ledger version {self.version}"
+
 class TransactionHistory(models.Model):
     """Model to track changes in transactions"""
     transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='history')
@@ -251,110 +324,99 @@ def create_default_accounts(entity, level):
             level='church'
         )
 
+@receiver(post_save, sender=Account)
+def sync_account_transactions_pastorate(sender, instance, created, raw=False, **kwargs):
+    """Follow an account moved to another pastorate or church"""
+    if created or raw:
+        return
+    pastorate_id = instance.owning_pastorate_id()
+    Transaction.objects.filter(account=instance).exclude(pastorate_id=pastorate_id).update(pastorate_id=pastorate_id)
+
+@receiver(post_save, sender=Church)
+def sync_church_transactions_pastorate(sender, instance, created, raw=False, **kwargs):
+    """Follow a church moved to another pastorate"""
+    if created or raw:
+        return
+    Transaction.objects.filter(account__church=instance).exclude(
+        pastorate_id=instance.pastorate_id
+    ).update(pastorate_id=instance.pastorate_id)
+
+@receiver(pre_save, sender=Transaction)
+def set_transaction_pastorate(sender, instance, raw=False, **kwargs):
+    """Denormalise the account's pastorate onto the transaction"""
+    if not raw and instance.account_id:
+        instance.pastorate_id = instance.account.owning_pastorate_id()
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_ledger_state(sender, instance, raw=False, **kwargs):
+    """Keep the stored amount/account/type so the post_save delta can reverse it"""
+    from . import ledger
+    instance._ledger_previous = None if raw else ledger.stored_ledger_state(instance.pk)
+
 @receiver(post_save, sender=Transaction)
-def update_account_balances(sender, instance, created, **kwargs):
+def update_account_balances(sender, instance, created, raw=False, **kwargs):
     """Update account balances when a transaction is saved"""
-    # Get all transactions for the primary account
-    account = instance.account
-    account.balance = 0  # Reset balance
-    
-    # Calculate credits (receipts, offerings, custom credits, contra credits, intra credits)
-    credits = Transaction.objects.filter(
-        account=account,
-        transaction_type__in=['receipt', 'offering', 'custom_credit', 'contra_credit', 'intra_credit']
-    ).aggregate(total=models.Sum('amount'))['total'] or 0
-    
-    # Calculate debits (bills, custom debits, aqudence, contra debits, intra debits)
-    debits = Transaction.objects.filter(
-        account=account,
-        transaction_type__in=['bill', 'custom_debit', 'aqudence', 'contra', 'intra']
-    ).aggregate(total=models.Sum('amount'))['total'] or 0
-    
-    # Update balance
-    account.balance = credits - debits
-    print(f"\nUpdating balance for {account.name}:")
-    print(f"Credits (including contra/intra credits): {credits}")
-    print(f"Debits (including contra/intra debits): {debits}")
-    print(f"Final Balance: {account.balance}")
-    account.save()
-    
-    # If this is a contra/intra entry, also update the other account's balance
-    if instance.transaction_type in ['contra', 'intra'] and instance.to_account:
-        to_account = instance.to_account
-        to_account.balance = 0  # Reset balance
-        
-        # Calculate credits for receiving account
-        to_credits = Transaction.objects.filter(
-            account=to_account,
-            transaction_type__in=['receipt', 'offering', 'custom_credit', 'contra_credit', 'intra_credit']
-        ).aggregate(total=models.Sum('amount'))['total'] or 0
-        
-        # Calculate debits for receiving account
-        to_debits = Transaction.objects.filter(
-            account=to_account,
-            transaction_type__in=['bill', 'custom_debit', 'aqudence', 'contra', 'intra']
-        ).aggregate(total=models.Sum('amount'))['total'] or 0
-        
-        # Update receiving account balance
-        to_account.balance = to_credits - to_debits
-        print(f"\nUpdating balance for {to_account.name} (receiving account):")
-        print(f"Credits (including contra/intra credits): {to_credits}")
-        print(f"Debits (including contra/intra debits): {to_debits}")
-        print(f"Final Balance: {to_account.balance}")
-        to_account.save()
+    if raw:
+        return
+    from . import ledger
+    ledger.record_change(getattr(instance, '_ledger_previous', None), ledger.ledger_state(instance))
 
 @receiver(post_delete, sender=Transaction)
 def update_account_balances_on_delete(sender, instance, **kwargs):
     """Update account balances when a transaction is deleted"""
-    print(f"\n=== Updating balances after deleting transaction {instance.id} ===")
-    
-    # Update primary account balance
-    account = instance.account
-    account.balance = 0  # Reset balance
-    
-    # Calculate credits
-    credits = Transaction.objects.filter(
-        account=account,
-        transaction_type__in=['receipt', 'offering', 'custom_credit', 'contra_credit', 'intra_credit']
-    ).aggregate(total=models.Sum('amount'))['total'] or 0
-    
-    # Calculate debits
-    debits = Transaction.objects.filter(
-        account=account,
-        transaction_type__in=['bill', 'custom_debit', 'aqudence', 'contra', 'intra']
-    ).aggregate(total=models.Sum('amount'))['total'] or 0
-    
-    # Update balance
-    account.balance = credits - debits
-    print(f"\nUpdating balance for {account.name} after deletion:")
-    print(f"Credits: {credits}")
-    print(f"Debits: {debits}")
-    print(f"New Balance: {account.balance}")
-    account.save()
-    
-    # If this was a contra/intra entry, also update the other account's balance
-    if instance.transaction_type in ['contra', 'intra', 'contra_credit', 'intra_credit'] and instance.to_account:
-        to_account = instance.to_account
-        to_account.balance = 0  # Reset balance
-        
-        # Calculate credits for receiving account
-        to_credits = Transaction.objects.filter(
-            account=to_account,
-            transaction_type__in=['receipt', 'offering', 'custom_credit', 'contra_credit', 'intra_credit']
-        ).aggregate(total=models.Sum('amount'))['total'] or 0
-        
-        # Calculate debits for receiving account
-        to_debits = Transaction.objects.filter(
-            account=to_account,
-            transaction_type__in=['bill', 'custom_debit', 'aqudence', 'contra', 'intra']
-        ).aggregate(total=models.Sum('amount'))['total'] or 0
-        
-        # Update receiving account balance
-        to_account.balance = to_credits - to_debits
-        print(f"\nUpdating balance for {to_account.name} (receiving account) after deletion:")
-        print(f"Credits: {to_credits}")
-        print(f"Debits: {to_debits}")
-        print(f"New Balance: {to_account.balance}")
-        to_account.save()
-    
-    print("=== Balance updates complete ===\n")
+    from . import ledger
+    ledger.record_change(ledger.ledger_state(instance), None)
+
+@receiver(pre_save, sender=Account)
+@receiver(pre_save, sender=Church)
+def remember_lookup_pastorate(sender, instance, raw=False, **kwargs):
+    """Keep the stored pastorate so a move also refreshes the old pastorate's lookups"""
+    instance._lookup_previous_pastorate_id = None
+    if raw or not instance.pk:
+        return
+    if sender is Account:
+        previous = sender.objects.filter(pk=instance.pk).values_list('pastorate_id', 'church__pastorate_id').first()
+        instance._lookup_previous_pastorate_id = previous and (previous[0] or previous[1])
+    else:
+        instance._lookup_previous_pastorate_id = sender.objects.filter(
+            pk=instance.pk).values_list('pastorate_id', flat=True).first()
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=Church)
+@receiver(post_delete, sender=Church)
+@receiver(post_save, sender=Pastorate)
+def invalidate_pastorate_lookups(sender, instance, **kwargs):
+    """Refresh the cached account lists of the pastorates an account, church or pastorate touches"""
+    from . import lookups
+    if sender is Account:
+        try:
+            pastorate_ids = {instance.owning_pastorate_id()}
+        except Church.DoesNotExist:
+            pastorate_ids = set()
+    elif sender is Church:
+        pastorate_ids = {instance.pastorate_id}
+    else:
+        pastorate_ids = {instance.pk}
+    pastorate_ids.add(getattr(instance, '_lookup_previous_pastorate_id', None))
+    for pastorate_id in pastorate_ids - {None}:
+        lookups.invalidate(lookups.ACCOUNTS, pastorate_id)
+    # Reports group transactions by these accounts and churches
+    from . import ledger
+    ledger.expire_reports()
+
+@receiver(post_save, sender=PrimaryCategory)
+@receiver(post_delete, sender=PrimaryCategory)
+@receiver(post_save, sender=SecondaryCategory)
+@receiver(post_delete, sender=SecondaryCategory)
+def invalidate_category_lookups(sender, **kwargs):
+    from . import ledger, lookups
+    lookups.invalidate(lookups.CATEGORIES)
+    ledger.expire_reports()
+
+@receiver(post_save, sender=AccountType)
+@receiver(post_delete, sender=AccountType)
+def invalidate_account_type_lookups(sender, **kwargs):
+    from . import ledger, lookups
+    lookups.invalidate(lookups.ACCOUNT_TYPES)
+    ledger.expire_reports()
@@ -0,0 +1,140 @@
+"""
+Keyset ("seek") pagination for large transaction querysets.
+
+Instead of ``OFFSET`` the next page is selected with a WHERE clause on the
+last row's ordering values, so every page costs the same index range scan no
+matter how deep it is.  The position is carried in an opaque URL-safe cursor.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of the pages either side of it"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def _field_name(ordering_field):
+    name = ordering_field.lstrip('-')
+    return 'id' if name == 'pk' else name
+
+
+def encode_cursor(obj, ordering):
+    """Encode the ordering values of ``obj`` as an opaque cursor"""
+    values = []
+    for field in ordering:
+        value = getattr(obj, _field_name(field))
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(model, ordering, cursor):
+    """Decode a cursor back into typed ordering values; ValueError if invalid"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError('Invalid cursor')
+    try:
+        return [
+            model._meta.get_field(_field_name(field)).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except Exception as e:
+        raise ValueError(f'Invalid cursor: {e}')
+
+
+def keyset_filter(ordering, values):
+    """Q selecting the rows that come after ``values`` in ``ordering``"""
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = _field_name(field)
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def _reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else '-' + field for field in ordering]
+
+
+def _cursor_values(model, ordering, cursor):
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(model, ordering, cursor)
+    except ValueError:
+        return None
+
+
+def paginate_keyset(queryset, ordering, cursor=None, per_page=25, before=None):
+    """
+    Return the page of ``queryset`` that follows ``cursor`` in ``ordering``,
+    or the page that precedes ``before``.  The last ordering field must be
+    unique (normally '-id') to make the order total.  An invalid cursor
+    starts from the first page.
+    """
+    model = queryset.model
+    before_values = _cursor_values(model, ordering, before)
+    if before_values is not None:
+        # Walk backwards from ``before`` and flip the rows back into order
+        reverse = _reverse_ordering(ordering)
+        rows = list(queryset.order_by(*reverse).filter(keyset_filter(reverse, before_values))[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        if not rows:
+            return paginate_keyset(queryset, ordering, per_page=per_page)
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1], ordering),
+            previous_cursor=encode_cursor(rows[0], ordering) if has_previous else None,
+        )
+
+    queryset = queryset.order_by(*ordering)
+    values = _cursor_values(model, ordering, cursor)
+    if values is not None:
+        queryset = queryset.filter(keyset_filter(ordering, values))
+    rows = list(queryset[:per_page + 1])
+    next_cursor = encode_cursor(rows[per_page - 1], ordering) if len(rows) > per_page else None
+    rows = rows[:per_page]
+    previous_cursor = encode_cursor(rows[0], ordering) if values is not None and rows else None
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def approximate_count(queryset, limit=1000):
+    """
+    Count ``queryset`` but stop at ``limit`` rows, so the cost is bounded on
+    large tables.  Returns ``(count, exact)``; ``exact`` is False when there
+    are more than ``limit`` rows.
+    """
+    count = queryset.order_by()[:limit + 1].count()
+    return min(count, limit), count <= limit
@@ -0,0 +1,180 @@
+"""
+Full-text search over transactions.
+
+On SQLite an FTS5 table (trigram tokenizer) mirrors the searchable text of
+every transaction: its numbers, names, description, category names and
+church.  Triggers on the transaction, category and church tables keep it in
+step, so a search is an index lookup instead of ``LIKE '%x%'`` on each column.
+The trigram index matches substrings case-insensitively, exactly like the
+``icontains`` lookups it replaces; terms shorter than three characters and
+other databases fall back to ``icontains``.
+"""
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'accounts_transaction_search'
+SEARCH_COLUMNS = [
+    'receipt_number', 'reference_number', 'family_name', 'member_name', 'description', 'categories', 'church',
+]
+# The index column searched for each Transaction lookup
+FIELD_COLUMNS = {
+    'receipt_number': 'receipt_number',
+    'reference_number': 'reference_number',
+    'family_name': 'family_name',
+    'member_name': 'member_name',
+    'description': 'description',
+    'primary_category__name': 'categories',
+    'secondary_category__name': 'categories',
+    'church__church_name': 'church',
+}
+# Trigrams need at least three characters to use the index
+MIN_TERM_LENGTH = 3
+
+_ROW_VALUES = """
+    t.id, t.receipt_number, t.reference_number, t.family_name, t.member_name, t.description,
+    coalesce((SELECT name FROM accounts_primarycategory WHERE id = t.primary_category_id), '')
+        || ' ' || coalesce((SELECT name FROM accounts_secondarycategory WHERE id = t.secondary_category_id), ''),
+    (SELECT church_name FROM congregation_church WHERE id = t.church_id)
+"""
+_INSERT = f"INSERT INTO {SEARCH_TABLE}(rowid, {', '.join(SEARCH_COLUMNS)}) SELECT {_ROW_VALUES} FROM accounts_transaction t"
+
+TRIGGERS = {
+    'accounts_transaction_search_insert': f"""
+        AFTER INSERT ON accounts_transaction BEGIN
+            {_INSERT} WHERE t.id = new.id;
+        END""",
+    'accounts_transaction_search_update': f"""
+        AFTER UPDATE ON accounts_transaction BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+            {_INSERT} WHERE t.id = new.id;
+        END""",
+    'accounts_transaction_search_delete': f"""
+        AFTER DELETE ON accounts_transaction BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+        END""",
+    'accounts_primarycategory_search_update': f"""
+        AFTER UPDATE OF name ON accounts_primarycategory BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT id FROM accounts_transaction WHERE primary_category_id = new.id);
+            {_INSERT} WHERE t.primary_category_id = new.id;
+        END""",
+    'accounts_secondarycategory_search_update': f"""
+        AFTER UPDATE OF name ON accounts_secondarycategory BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT id FROM accounts_transaction WHERE secondary_category_id = new.id);
+            {_INSERT} WHERE t.secondary_category_id = new.id;
+        END""",
+    'congregation_church_search_update': f"""
+        AFTER UPDATE OF church_name ON congregation_church BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT id FROM accounts_transaction WHERE church_id = new.id);
+            {_INSERT} WHERE t.church_id = new.id;
+        END""",
+}
+
+# Per database: whether the index and its triggers are installed
+_available = {}
+
+
+def _database_key(connection):
+    return (connection.alias, connection.settings_dict['NAME'])
+
+
+def _installed_objects(cursor):
+    placeholders = ', '.join(['%s'] * len(TRIGGERS))
+    cursor.execute(
+        f"SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND name IN ({placeholders}))",
+        [SEARCH_TABLE, *TRIGGERS],
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def install_search_index(connection, rebuild=True):
+    """
+    Create the FTS5 table and any missing triggers, then (by default) reindex
+    every transaction.  Returns False where FTS5 is unavailable.
+    """
+    _available.pop(_database_key(connection), None)
+    if connection.vendor != 'sqlite':
+        return False
+    from django.db.utils import OperationalError
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                f"{', '.join(SEARCH_COLUMNS)}, tokenize='trigram case_sensitive 0')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5 or older than 3.34 (no trigram tokenizer)
+            return False
+        installed = _installed_objects(cursor)
+        for name, body in TRIGGERS.items():
+            if name not in installed:
+                cursor.execute(f'CREATE TRIGGER {name} {body}')
+        if rebuild:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(_INSERT)
+    return True
+
+
+def uninstall_search_index(connection):
+    """Drop the FTS5 table and its triggers"""
+    _available.pop(_database_key(connection), None)
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def ensure_search_index(connection):
+    """
+    Reinstall triggers dropped by a table rebuild (SQLite migrations recreate
+    altered tables) and reindex, if the index is installed but incomplete.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        installed = _installed_objects(cursor)
+    if SEARCH_TABLE not in installed or installed >= set(TRIGGERS):
+        return
+    install_search_index(connection)
+
+
+def search_available(using='default'):
+    """Whether searches on this database can use the FTS5 index"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    key = _database_key(connection)
+    if key not in _available:
+        with connection.cursor() as cursor:
+            installed = _installed_objects(cursor)
+        _available[key] = SEARCH_TABLE in installed and installed >= set(TRIGGERS)
+    return _available[key]
+
+
+def match_expression(term, columns):
+    """FTS5 query matching ``term`` as a substring of any of ``columns``"""
+    return '{%s}: "%s"' % (' '.join(columns), term.replace('"', '""'))
+
+
+def search_q(term, fields, using='default'):
+    """
+    Q matching transactions whose ``fields`` contain ``term``.  Fields the
+    index covers are searched through it; any others use ``icontains``.
+    """
+    term = term.strip()
+    indexed = [field for field in fields if field in FIELD_COLUMNS]
+    others = [field for field in fields if field not in FIELD_COLUMNS]
+    condition = Q()
+    if indexed and len(term) >= MIN_TERM_LENGTH and search_available(using):
+        columns = sorted({FIELD_COLUMNS[field] for field in indexed})
+        condition |= Q(pk__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+            [match_expression(term, columns)],
+        ))
+    else:
+        others = fields
+    for field in others:
+        condition |= Q(**{f'{field}__icontains': term})
+    return condition
@@ -1,3 +1,1105 @@
+import base64
+import csv
+import datetime
+import importlib
+import json
+import os
+import re
+import tempfile
+import uuid
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from openpyxl import load_workbook
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count, Q, Sum
+from django.http import StreamingHttpResponse
 from django.test import TestCase
+from django.urls import reverse
+
+from congregation.models import Pastorate, Church
+from . import export, importer, ledger, lookups, search
+from .consolidated import consolidated_report
+from .pagination import decode_cursor, encode_cursor, paginate_keyset
+from .views.accounts import REPORT_EXPENSE_TYPES, REPORT_INCOME_TYPES, _report_categories
+from .models import Account, AccountBalanceSnapshot, PrimaryCategory, SecondaryCategory, Transaction
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class TransactionQueryPlanTests(TestCase):
+    """The hot Transaction queries must be served by an index, never a full table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(username='planner')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Plan', pastorate_short_name='PL', user=user)
+        cls.church = Church.objects.create(church_name='Plan Church', abode='-', short_name='PC', pastorate=cls.pastorate)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+        cls.bank = Account.objects.get(account_number='BANK-%03d' % cls.pastorate.pk)
+        for day in range(1, 29):
+            Transaction.objects.create(account=cls.cash, transaction_type='receipt', amount=Decimal('10'),
+                                       date=datetime.date(2024, 2, day), reference_number=f'R{day}')
+            Transaction.objects.create(account=cls.bank, transaction_type='bill', amount=Decimal('5'),
+                                       date=datetime.date(2024, 2, day), reference_number=f'B{day}')
+
+    def assertNoFullScan(self, queryset):
+        """
+        Every read of the table must be an index SEARCH.  A SCAN, even one
+        "USING INDEX", walks the whole table (in index order) and fails.
+        """
+        plan = queryset.explain()
+        table = Transaction._meta.db_table
+        scans = [line for line in plan.splitlines() if re.search(rf'\bSCAN {table}\b', line)]
+        self.assertFalse(scans, f'Full scan of {table}:\n{plan}')
+        self.assertRegex(plan, rf'\bSEARCH {table} USING (COVERING )?INDEX\b', f'No index search of {table}:\n{plan}')
+
+    def test_ledger_totals(self):
+        queryset = Transaction.objects.filter(account_id__in=[self.cash.pk, self.bank.pk]).values('account_id').annotate(
+            credits=ledger.credit_sum(), debits=ledger.debit_sum(),
+        ).order_by()
+        self.assertNoFullScan(queryset)
+
+    def test_account_ledger_by_type(self):
+        queryset = Transaction.objects.filter(
+            account=self.cash, transaction_type__in=Transaction.CREDIT_TYPES,
+        ).order_by('-date', '-created_at', '-id')
+        self.assertNoFullScan(queryset)
+
+    def test_account_date_range(self):
+        queryset = Transaction.objects.filter(
+            account=self.cash, date__range=[datetime.date(2024, 2, 1), datetime.date(2024, 2, 10)],
+        ).order_by('date')
+        self.assertNoFullScan(queryset)
+
+    def test_pastorate_list(self):
+        queryset = Transaction.objects.filter(pastorate=self.pastorate, transaction_type='receipt').order_by('-date')
+        self.assertNoFullScan(queryset)
+
+    def test_contra_pairs(self):
+        queryset = Transaction.objects.filter(transaction_type__in=['contra', 'contra_credit']).order_by('date', 'created_at')
+        self.assertNoFullScan(queryset)
+
+    def test_transfer_pair(self):
+        self.assertNoFullScan(Transaction.objects.filter(pair_id=uuid.uuid4()).exclude(pk=1))
+        self.assertNoFullScan(
+            Transaction.objects.filter(pair_id__isnull=False).values('pair_id').annotate(legs=Count('pk')).order_by('pair_id')
+        )
+
+    def test_reference_number(self):
+        self.assertNoFullScan(Transaction.objects.filter(reference_number='R3'))
+
+    def test_full_scan_through_an_index_fails(self):
+        # Walks the whole table in txn_pair order: a scan, although it uses an index
+        with self.assertRaises(AssertionError):
+            self.assertNoFullScan(Transaction.objects.filter(amount__gt=1).order_by('pair_id'))
+        with self.assertRaises(AssertionError):
+            self.assertNoFullScan(Transaction.objects.filter(description='x'))
+
+
+class BalanceMaintenanceTests(TestCase):
+    """Stored balances and snapshots must follow every edit exactly as a full recalculation would"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(username='keeper')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Keep', pastorate_short_name='KP', user=user)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+        cls.bank = Account.objects.get(account_number='BANK-%03d' % cls.pastorate.pk)
+
+    def setUp(self):
+        self.receipt = Transaction.objects.create(account=self.cash, transaction_type='receipt',
+                                                  amount=Decimal('100.00'), date=datetime.date(2024, 3, 10))
+        Transaction.objects.create(account=self.cash, transaction_type='bill', amount=Decimal('30.00'),
+                                   date=datetime.date(2024, 4, 2))
+        Transaction.objects.create(account=self.bank, transaction_type='receipt', amount=Decimal('50.00'),
+                                   date=datetime.date(2024, 2, 20))
+
+    def snapshots(self):
+        return list(AccountBalanceSnapshot.objects.order_by('account_id', 'month').values_list(
+            'account_id', 'month', 'opening', 'credits', 'debits', 'closing'))
+
+    def assertMatchesRecalculation(self):
+        account_ids = [self.cash.pk, self.bank.pk]
+        stored = dict(Account.objects.filter(pk__in=account_ids).values_list('pk', 'balance'))
+        snapshots = self.snapshots()
+        ledger.recalculate_accounts(account_ids)
+        self.assertEqual(stored, dict(Account.objects.filter(pk__in=account_ids).values_list('pk', 'balance')))
+        self.assertEqual(snapshots, self.snapshots())
+
+    def test_create(self):
+        self.cash.refresh_from_db()
+        self.assertEqual(self.cash.balance, Decimal('70.00'))
+        self.assertMatchesRecalculation()
+
+    def test_edit_amount(self):
+        self.receipt.amount = Decimal('120.50')
+        self.receipt.save()
+        self.assertMatchesRecalculation()
+
+    def test_edit_account(self):
+        self.receipt.account = self.bank
+        self.receipt.save()
+        self.assertMatchesRecalculation()
+
+    def test_edit_type(self):
+        self.receipt.transaction_type = 'custom_debit'
+        self.receipt.save()
+        self.assertMatchesRecalculation()
+
+    def test_edit_date(self):
+        # Views assign the posted date as a string
+        self.receipt.date = '2024-05-01'
+        self.receipt.save()
+        self.assertMatchesRecalculation()
+
+    def test_delete(self):
+        self.receipt.delete()
+        self.assertMatchesRecalculation()
+
+    def test_failed_balance_update_rolls_back_the_save(self):
+        self.receipt.amount = Decimal('999.00')
+        with mock.patch.object(ledger, 'apply_deltas', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.receipt.save()
+        self.assertEqual(Transaction.objects.get(pk=self.receipt.pk).amount, Decimal('100.00'))
+        self.assertMatchesRecalculation()
+
+    def test_recalculate_balances_command(self):
+        Account.objects.filter(pk=self.cash.pk).update(balance=Decimal('1.00'))
+        out = StringIO()
+        call_command('recalculate_balances', '--dry-run', stdout=out)
+        self.assertIn('1 of', out.getvalue())
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('1.00'))
+        call_command('recalculate_balances', stdout=StringIO())
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('70.00'))
+        self.assertMatchesRecalculation()
+
+    def test_deferred_batch(self):
+        february = AccountBalanceSnapshot.objects.get(account=self.bank, month=datetime.date(2024, 2, 1))
+        with ledger.deferred():
+            debit = Transaction.objects.create(account=self.cash, to_account=self.bank, transaction_type='contra',
+                                               amount=Decimal('40.00'), date=datetime.date(2024, 6, 1))
+            Transaction.objects.create(account=self.bank, from_account=self.cash, transaction_type='contra_credit',
+                                       amount=Decimal('40.00'), date=datetime.date(2024, 6, 1))
+            debit.amount = Decimal('45.00')
+            debit.save()
+            # Nothing is applied before the batch ends
+            self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('70.00'))
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('25.00'))
+        # Months the batch did not touch are left alone, not rebuilt
+        self.assertEqual(AccountBalanceSnapshot.objects.get(pk=february.pk).closing, Decimal('50.00'))
+        self.assertMatchesRecalculation()
+
+    def test_deferred_batch_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with ledger.deferred():
+                Transaction.objects.create(account=self.cash, transaction_type='receipt',
+                                           amount=Decimal('5.00'), date=datetime.date(2024, 3, 1))
+                raise RuntimeError
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('70.00'))
+        self.assertMatchesRecalculation()
+
+    def test_deferred_batch_with_rolled_back_savepoint(self):
+        receipt_pk = self.receipt.pk
+        with ledger.deferred():
+            Transaction.objects.create(account=self.cash, transaction_type='receipt',
+                                       amount=Decimal('5.00'), date=datetime.date(2024, 3, 1))
+            try:
+                with db_transaction.atomic():
+                    Transaction.objects.create(account=self.cash, transaction_type='receipt',
+                                               amount=Decimal('500.00'), date=datetime.date(2024, 6, 1))
+                    self.receipt.delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # delete() cleared the instance's pk; the row itself was restored
+            receipt = Transaction.objects.get(pk=receipt_pk)
+            receipt.amount = Decimal('90.00')
+            receipt.save()
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('65.00'))
+        self.assertMatchesRecalculation()
+
+    def test_deferred_batch_with_deleted_account(self):
+        with ledger.deferred():
+            Transaction.objects.filter(account=self.cash).delete()
+            self.cash.delete()
+        self.assertFalse(AccountBalanceSnapshot.objects.filter(account_id=self.cash.pk).exists())
+        self.assertEqual(Account.objects.get(pk=self.bank.pk).balance, Decimal('50.00'))
+
+
+class OfferingBulkAddTests(TestCase):
+    """Bulk-created offerings must leave balances and snapshots as a plain ledger sum, or nothing at all"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='steward')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Bulk', pastorate_short_name='BU', user=cls.user)
+        cls.churches = [
+            Church.objects.create(church_name=f'Bulk Church {number}', abode='-', short_name=f'B{number}',
+                                  pastorate=cls.pastorate)
+            for number in range(3)
+        ]
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+        cls.primary = PrimaryCategory.objects.create(name='Offerings', transaction_type='credit')
+        cls.secondary = SecondaryCategory.objects.create(name='Sunday', primary_category=cls.primary)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        Transaction.objects.create(account=self.cash, transaction_type='receipt', amount=Decimal('10.00'),
+                                   date=datetime.date(2024, 6, 1))
+
+    def post(self, amounts, date='2024-03-03'):
+        data = {'date': date, 'account': self.cash.pk, 'primary_category': self.primary.pk,
+                'secondary_category': self.secondary.pk, 'description': 'Harvest'}
+        for church, amount in zip(self.churches, amounts):
+            data[f'amount_{church.pk}'] = amount
+            data[f'reference_{church.pk}'] = f'OFF-{church.pk}'
+        return self.client.post(reverse('accounts:offering_bulk_add', args=[self.pastorate.pk]), data)
+
+    def assertMatchesLedger(self):
+        total = Transaction.objects.filter(account=self.cash).aggregate(total=Sum(ledger.signed_amount_expression()))
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal(total['total']).quantize(Decimal('0.01')))
+        for day in (datetime.date(2024, 2, 29), datetime.date(2024, 3, 3), datetime.date(2024, 6, 30)):
+            expected = Transaction.objects.filter(account=self.cash, date__lte=day).aggregate(
+                total=Sum(ledger.signed_amount_expression()))['total'] or 0
+            self.assertEqual(ledger.balances_as_of([self.cash.pk], day)[self.cash.pk],
+                             Decimal(expected).quantize(Decimal('0.01')), f'as of {day}')
+
+    def test_bulk_add(self):
+        response = self.post(['120.50', '', '79.25'])
+        self.assertRedirects(response, reverse('accounts:offering_list', args=[self.pastorate.pk]),
+                             fetch_redirect_response=False)
+        offerings = Transaction.objects.filter(transaction_type='offering').order_by('church__church_name')
+        self.assertEqual([(o.church, o.amount, o.pastorate_id) for o in offerings],
+                         [(self.churches[0], Decimal('120.50'), self.pastorate.pk),
+                          (self.churches[2], Decimal('79.25'), self.pastorate.pk)])
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('209.75'))
+        self.assertMatchesLedger()
+
+    def test_invalid_row_adds_nothing(self):
+        response = self.post(['120.50', '-5', '79.25'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Transaction.objects.filter(transaction_type='offering').exists())
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('10.00'))
+        self.assertMatchesLedger()
+
+    def test_failed_balance_update_rolls_back_the_batch(self):
+        with mock.patch.object(ledger, 'apply_deltas', side_effect=RuntimeError('lock timeout')):
+            response = self.post(['120.50', '30.00', '79.25'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Transaction.objects.filter(transaction_type='offering').exists())
+        self.assertMatchesLedger()
+
+
+class SnapshotBalanceTests(TestCase):
+    """Balances read through the monthly snapshots must equal a plain sum over the ledger"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(username='snapper')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Snap', pastorate_short_name='SN', user=user)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+        cls.bank = Account.objects.get(account_number='BANK-%03d' % cls.pastorate.pk)
+
+    def setUp(self):
+        for month, amount in ((1, '100.00'), (3, '40.00'), (6, '25.50')):
+            Transaction.objects.create(account=self.cash, transaction_type='receipt', amount=Decimal(amount),
+                                       date=datetime.date(2024, month, 15))
+        Transaction.objects.create(account=self.cash, transaction_type='bill', amount=Decimal('30.00'),
+                                   date=datetime.date(2024, 3, 20))
+        Transaction.objects.create(account=self.bank, transaction_type='receipt', amount=Decimal('10.00'),
+                                   date=datetime.date(2024, 2, 1))
+
+    def assertBalancesMatchLedger(self, days):
+        account_ids = [self.cash.pk, self.bank.pk]
+        for day in days:
+            expected = {account_id: Decimal('0') for account_id in account_ids}
+            for row in Transaction.objects.filter(account_id__in=account_ids, date__lte=day).values(
+                    'account_id').annotate(total=Sum(ledger.signed_amount_expression())).order_by():
+                expected[row['account_id']] = row['total']
+            actual = ledger.balances_as_of(account_ids, day)
+            self.assertEqual(
+                {k: v.quantize(Decimal('0.01')) for k, v in actual.items()},
+                {k: Decimal(v).quantize(Decimal('0.01')) for k, v in expected.items()},
+                f'as of {day}',
+            )
+
+    def days(self, today=None):
+        days = [datetime.date(2023, 12, 31)]
+        for month in range(1, 13):
+            days += [datetime.date(2024, month, 1), datetime.date(2024, month, 15), datetime.date(2024, month, 20)]
+        return days + ([today] if today else [])
+
+    def test_back_dated_insert(self):
+        Transaction.objects.create(account=self.cash, transaction_type='bill', amount=Decimal('12.25'),
+                                   date=datetime.date(2023, 11, 5))
+        Transaction.objects.create(account=self.cash, transaction_type='receipt', amount=Decimal('7.00'),
+                                   date=datetime.date(2024, 2, 10))
+        self.assertBalancesMatchLedger(self.days() + [datetime.date(2023, 11, 5)])
+
+    def test_date_moved_across_month_boundary(self):
+        transaction = Transaction.objects.get(account=self.cash, transaction_type='bill')
+        transaction.date = datetime.date(2024, 5, 31)
+        transaction.save()
+        self.assertBalancesMatchLedger(self.days() + [datetime.date(2024, 5, 31)])
+        transaction.date = datetime.date(2024, 1, 1)
+        transaction.save()
+        self.assertBalancesMatchLedger(self.days())
+        # The emptied months are dropped rather than left with zero totals
+        self.assertFalse(AccountBalanceSnapshot.objects.filter(account=self.cash, credits=0, debits=0).exists())
+
+    def test_delete(self):
+        Transaction.objects.filter(account=self.cash, date__month=3).delete()
+        for transaction in Transaction.objects.filter(account=self.cash, date__month=1):
+            transaction.delete()
+        self.assertBalancesMatchLedger(self.days())
+
+    def test_current_month(self):
+        today = datetime.date.today()
+        Transaction.objects.create(account=self.bank, transaction_type='custom_debit', amount=Decimal('3.00'),
+                                   date=today)
+        Transaction.objects.create(account=self.cash, transaction_type='receipt', amount=Decimal('8.00'),
+                                   date=today.replace(day=1))
+        self.assertBalancesMatchLedger(self.days(today))
+        self.assertEqual(ledger.balances_as_of([self.bank.pk], today)[self.bank.pk],
+                         Account.objects.get(pk=self.bank.pk).balance)
+
+    def test_rebuild_matches_maintained_snapshots(self):
+        Transaction.objects.create(account=self.cash, transaction_type='bill', amount=Decimal('1.00'),
+                                   date=datetime.date(2022, 7, 7))
+        maintained = list(AccountBalanceSnapshot.objects.order_by('account_id', 'month').values_list(
+            'account_id', 'month', 'opening', 'credits', 'debits', 'closing'))
+        ledger.rebuild_snapshots([self.cash.pk, self.bank.pk])
+        self.assertEqual(maintained, list(AccountBalanceSnapshot.objects.order_by('account_id', 'month').values_list(
+            'account_id', 'month', 'opening', 'credits', 'debits', 'closing')))
+
+    def test_running_balances(self):
+        ledger_rows = list(Transaction.objects.filter(account=self.cash).order_by('date', 'created_at', 'pk'))
+        expected, balance = {}, Decimal('0')
+        for transaction in ledger_rows:
+            balance += ledger.signed_amount(transaction.transaction_type, transaction.amount)
+            expected[transaction.pk] = balance
+        # A page holding only the first and last entry still spans the whole ledger
+        page = ledger.running_balances(self.cash, [ledger_rows[-1], ledger_rows[0]])
+        self.assertEqual([t.running_balance for t in page], [expected[ledger_rows[-1].pk], expected[ledger_rows[0].pk]])
+
+    def test_running_balances_stay_exact_on_a_long_ledger(self):
+        # Cent amounts that binary floating point cannot represent exactly
+        rows = [
+            Transaction(account=self.bank, pastorate=self.pastorate,
+                        transaction_type='receipt' if number % 3 else 'bill',
+                        amount=Decimal(number % 997 + 1) / 100 + Decimal('0.07'),
+                        date=datetime.date(2023, 1, 1) + datetime.timedelta(days=number // 40))
+            for number in range(20000)
+        ]
+        Transaction.objects.bulk_create(rows)
+        ledger.record_created(rows)
+        ledger_rows = list(Transaction.objects.filter(account=self.bank).order_by('date', 'created_at', 'pk'))
+        expected, balance = {}, Decimal('0')
+        for transaction in ledger_rows:
+            balance += ledger.signed_amount(transaction.transaction_type, transaction.amount)
+            expected[transaction.pk] = balance
+        page = [ledger_rows[-1], ledger_rows[len(ledger_rows) // 2], ledger_rows[0]]
+        ledger.running_balances(self.bank, page)
+        self.assertEqual([t.running_balance for t in page], [expected[t.pk] for t in page])
+        self.assertEqual(page[0].running_balance, Account.objects.get(pk=self.bank.pk).balance)
+
+
+class KeysetPaginationTests(TestCase):
+    ordering = ['-date', '-created_at', '-id']
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(username='pager')
+        pastorate = Pastorate.objects.create(pastorate_name='Page', pastorate_short_name='PG', user=user)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % pastorate.pk)
+        # Several rows per date so the tie-breaking fields matter
+        for number in range(23):
+            Transaction.objects.create(account=cls.cash, transaction_type='receipt', amount=Decimal('1'),
+                                       date=datetime.date(2024, 1, 1 + number // 4), reference_number=f'K{number}')
+        cls.queryset = Transaction.objects.filter(account=cls.cash)
+        cls.expected = list(cls.queryset.order_by(*cls.ordering).values_list('pk', flat=True))
+
+    def test_round_trip(self):
+        transaction = self.queryset.first()
+        values = decode_cursor(Transaction, self.ordering, encode_cursor(transaction, self.ordering))
+        self.assertEqual(values, [transaction.date, transaction.created_at, transaction.pk])
+
+    def test_walk_forward_and_back(self):
+        pages, cursor = [], None
+        while True:
+            page = paginate_keyset(self.queryset, self.ordering, cursor=cursor, per_page=5)
+            pages.append([t.pk for t in page])
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual([pk for rows in pages for pk in rows], self.expected)
+        self.assertFalse(paginate_keyset(self.queryset, self.ordering, per_page=5).has_previous)
+
+        previous = paginate_keyset(self.queryset, self.ordering, before=page.previous_cursor, per_page=5)
+        self.assertEqual([t.pk for t in previous], pages[-2])
+        self.assertTrue(previous.has_previous)
+
+    def test_malformed_cursors(self):
+        def encode(value):
+            return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+        valid = json.loads(base64.urlsafe_b64decode(encode_cursor(self.queryset.first(), self.ordering)))
+        for cursor in ('not a cursor!', base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+                       base64.urlsafe_b64encode(b'{not json').decode(), encode({'date': '2024-01-01'}),
+                       encode(valid[:2]), encode(['2024-13-45', valid[1], valid[2]]),
+                       encode([valid[0], valid[1], 'abc'])):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(Transaction, self.ordering, cursor)
+                # The list falls back to the first page instead of failing
+                page = paginate_keyset(self.queryset, self.ordering, cursor=cursor, per_page=5)
+                self.assertEqual([t.pk for t in page], self.expected[:5])
+                page = paginate_keyset(self.queryset, self.ordering, before=cursor, per_page=5)
+                self.assertEqual([t.pk for t in page], self.expected[:5])
+
+    def test_tampered_cursor(self):
+        # A well-formed cursor with edited values just seeks from that position
+        cursor = base64.urlsafe_b64encode(json.dumps(['2024-01-03', '2100-01-01T00:00:00+00:00', 0]).encode()).decode()
+        page = paginate_keyset(self.queryset, self.ordering, cursor=cursor, per_page=50)
+        self.assertEqual([t.pk for t in page],
+                         list(self.queryset.filter(date__lte=datetime.date(2024, 1, 3)).order_by(*self.ordering)
+                              .values_list('pk', flat=True)))
+
+
+class TransactionImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='importer')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Import', pastorate_short_name='IM', user=cls.user)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+        cls.bank = Account.objects.get(account_number='BANK-%03d' % cls.pastorate.pk)
+
+    def setUp(self):
+        Transaction.objects.create(account=self.cash, transaction_type='receipt', amount=Decimal('10.00'),
+                                   date=datetime.date(2024, 1, 5), reference_number='CHQ-1')
+
+    def write_csv(self, lines):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as f:
+            f.write('\n'.join(['Date,Amount,Account,Reference,Narration', *lines]) + '\n')
+        self.addCleanup(os.remove, path)
+        return path
+
+    def importer_for(self, path):
+        mapping = importer.guess_mapping(importer.read_headers(path))
+        return importer.TransactionImporter(self.pastorate, self.user, mapping, self.cash)
+
+    def test_errors(self):
+        path = self.write_csv([
+            '2024-02-01,100.00,,CHQ-1,Already imported',
+            '2024-02-02,-25.50,,CHQ-2,Rent',
+            '2024-02-03,12.00,,CHQ-2,Same reference again',
+            f'2024-02-03,12.00,{self.bank.account_number},CHQ-1,Other account',
+            '31-02-2024,5.00,,CHQ-3,Bad date',
+            '03/02/2024,7.00,,,No reference',
+        ])
+        summary = self.importer_for(path).preview(path)
+        self.assertEqual(summary['valid'], 3)
+        self.assertEqual(summary['invalid'], 3)
+        self.assertEqual([(line, column) for line, column, _ in summary['errors']],
+                         [(2, 'Reference Number'), (4, 'Reference Number'), (6, 'Date')])
+        self.assertEqual((summary['credits'], summary['debits']), (Decimal('19.00'), Decimal('25.50')))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_commit_stops_on_errors(self):
+        path = self.write_csv(['2024-02-01,100.00,,CHQ-5,Fine', 'not a date,5.00,,CHQ-6,Bad'])
+        self.assertEqual(self.importer_for(path).commit(path), (0, 1))
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('10.00'))
+
+    def test_commit_skipping_invalid_rows(self):
+        path = self.write_csv([
+            '2024-02-01,100.00,,CHQ-5,Receipt',
+            '2024-03-15,-30.25,,CHQ-6,Bill',
+            f'2024-03-20,40.00,{self.bank.account_number},CHQ-1,Bank deposit',
+            '2024-03-21,-1.00,,CHQ-1,Duplicate',
+            'not a date,5.00,,CHQ-7,Bad',
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.importer_for(path).commit(path, skip_invalid=True), (3, 2))
+        balances = dict(Account.objects.filter(pk__in=[self.cash.pk, self.bank.pk]).values_list('pk', 'balance'))
+        self.assertEqual(balances, {self.cash.pk: Decimal('79.75'), self.bank.pk: Decimal('40.00')})
+        self.assertEqual(ledger.balances_as_of([self.cash.pk], datetime.date(2024, 2, 29))[self.cash.pk],
+                         Decimal('110.00'))
+        ledger.recalculate_accounts([self.cash.pk, self.bank.pk])
+        self.assertEqual(balances, dict(
+            Account.objects.filter(pk__in=[self.cash.pk, self.bank.pk]).values_list('pk', 'balance')))
+
+
+class TransferPairTests(TestCase):
+    """Contra and intra legs are linked only through pair_id"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='pairer')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Pair', pastorate_short_name='PR', user=cls.user)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+        cls.bank = Account.objects.get(account_number='BANK-%03d' % cls.pastorate.pk)
+
+    def legs(self, transaction_type='contra', amount='40.00', date=datetime.date(2024, 5, 6), reference='CT-1',
+             pair_id=None, credit_amount=None):
+        debit_type = transaction_type
+        credit_type = Transaction.TRANSFER_PAIRS[transaction_type]
+        debit = Transaction.objects.create(account=self.cash, to_account=self.bank, transaction_type=debit_type,
+                                           amount=Decimal(amount), date=date, reference_number=reference,
+                                           pair_id=pair_id)
+        credit = Transaction.objects.create(account=self.bank, from_account=self.cash, transaction_type=credit_type,
+                                            amount=Decimal(credit_amount or amount), date=date,
+                                            reference_number=reference, pair_id=pair_id)
+        return debit, credit
+
+    def pair(self, transaction):
+        return Transaction.objects.values_list('pair_id', flat=True).get(pk=transaction.pk)
+
+    def check(self):
+        out = StringIO()
+        call_command('check_contra_entries', stdout=out)
+        return out.getvalue()
+
+    def test_backfill_pairs_matching_legs(self):
+        migration = importlib.import_module('accounts.migrations.0006_transaction_pair_id')
+        contra = self.legs()
+        intra = self.legs('intra', reference='IT-1')
+        # Same day, amount and reference: each debit takes exactly one credit, in creation order
+        first = self.legs(amount='25.00', reference='CT-2')
+        second = self.legs(amount='25.00', reference='CT-2')
+        other_day = self.legs(reference='CT-3')
+        other_day[1].date = datetime.date(2024, 5, 7)
+        other_day[1].save()
+
+        migration.backfill_pair_id(django_apps, None)
+
+        for debit, credit in (contra, intra, first, second):
+            self.assertIsNotNone(self.pair(debit))
+            self.assertEqual(self.pair(debit), self.pair(credit))
+        self.assertNotEqual(self.pair(first[0]), self.pair(second[0]))
+        self.assertNotEqual(self.pair(contra[0]), self.pair(intra[0]))
+        self.assertIsNone(self.pair(other_day[0]))
+        self.assertIsNone(self.pair(other_day[1]))
+
+    def test_check_clean_pair(self):
+        self.legs(pair_id=uuid.uuid4())
+        self.assertIn('No issues found', self.check())
+
+    def test_check_reports_unpaired_and_mismatched_legs(self):
+        self.legs(pair_id=uuid.uuid4(), credit_amount='41.00')
+        self.legs('intra', reference='IT-1')
+        pair_id = uuid.uuid4()
+        self.legs(reference='CT-2', pair_id=pair_id)
+        Transaction.objects.create(account=self.bank, from_account=self.cash, transaction_type='contra_credit',
+                                   amount=Decimal('40.00'), date=datetime.date(2024, 5, 6),
+                                   reference_number='CT-2', pair_id=pair_id)
+
+        output = self.check()
+        self.assertIn('Unpaired entries: 2', output)
+        self.assertIn(f'Pair {pair_id} has 3 entries: 1 contra, 2 contra_credit', output)
+        self.assertIn('Incomplete pairs: 1', output)
+        self.assertRegex(output, r'differ: amount 40.00 vs 41(\.00)?\n')
+        self.assertIn('Mismatched contra entries: 1', output)
+        self.assertNotIn('Mismatched intra entries', output)
+        self.assertIn('4 issues were found', output)
+
+    def assertDeletesBothLegs(self, transaction_type):
+        self.client.force_login(self.user)
+        debit, credit = self.legs(transaction_type, pair_id=uuid.uuid4())
+        # Same accounts, date, amount and reference, but a different pair
+        twin = self.legs(transaction_type, pair_id=uuid.uuid4())
+        response = self.client.post(reverse(f'accounts:{transaction_type}_delete', args=[self.pastorate.pk, debit.pk]))
+        self.assertRedirects(response, reverse(f'accounts:{transaction_type}_list', args=[self.pastorate.pk]),
+                             fetch_redirect_response=False)
+        self.assertFalse(Transaction.objects.filter(pk__in=[debit.pk, credit.pk]).exists())
+        self.assertEqual(Transaction.objects.filter(pk__in=[leg.pk for leg in twin]).count(), 2)
+        self.cash.refresh_from_db()
+        self.bank.refresh_from_db()
+        self.assertEqual((self.cash.balance, self.bank.balance), (Decimal('-40.00'), Decimal('40.00')))
+
+    def test_contra_delete_removes_both_legs(self):
+        self.assertDeletesBothLegs('contra')
+
+    def test_intra_delete_removes_both_legs(self):
+        self.assertDeletesBothLegs('intra')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the FTS5 search index is SQLite specific')
+class TransactionSearchTests(TestCase):
+    """The FTS5 index must follow every change to the text it mirrors"""
+
+    FIELDS = ['description', 'primary_category__name', 'secondary_category__name', 'church__church_name']
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(username='seeker')
+        pastorate = Pastorate.objects.create(pastorate_name='Seek', pastorate_short_name='SK', user=user)
+        cls.church = Church.objects.create(church_name='Emmanuel', abode='-', short_name='EM', pastorate=pastorate)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % pastorate.pk)
+        cls.primary = PrimaryCategory.objects.create(name='Offerings', transaction_type='credit')
+        cls.secondary = SecondaryCategory.objects.create(name='Harvest', primary_category=cls.primary)
+
+    def setUp(self):
+        if not search.search_available():
+            self.skipTest('SQLite built without FTS5 trigram support')
+        self.receipt = Transaction.objects.create(
+            account=self.cash, transaction_type='receipt', amount=Decimal('15.00'), date=datetime.date(2024, 1, 7),
+            description='Choir robes', primary_category=self.primary, secondary_category=self.secondary,
+            church=self.church,
+        )
+
+    def found(self, term):
+        condition = search.search_q(term, self.FIELDS)
+        self.assertIn('MATCH', str(Transaction.objects.filter(condition).query))
+        return list(Transaction.objects.filter(condition).values_list('pk', flat=True))
+
+    def test_insert_update_and_delete(self):
+        self.assertEqual(self.found('ROBE'), [self.receipt.pk])
+        self.receipt.description = 'Pulpit lamp'
+        self.receipt.save()
+        self.assertEqual(self.found('robe'), [])
+        self.assertEqual(self.found('pit la'), [self.receipt.pk])
+        Transaction.objects.filter(pk=self.receipt.pk).delete()
+        self.assertEqual(self.found('pit la'), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {search.SEARCH_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_category_and_church_rename(self):
+        self.primary.name = 'Thanksgiving'
+        self.primary.save()
+        self.secondary.name = 'Festival'
+        self.secondary.save()
+        self.church.church_name = 'Bethel'
+        self.church.save()
+        self.assertEqual(self.found('offering'), [])
+        self.assertEqual(self.found('harvest'), [])
+        self.assertEqual(self.found('emmanuel'), [])
+        self.assertEqual(self.found('thanks'), [self.receipt.pk])
+        self.assertEqual(self.found('stiv'), [self.receipt.pk])
+        self.assertEqual(self.found('bethel'), [self.receipt.pk])
+
+    def test_short_terms_fall_back_to_icontains(self):
+        condition = search.search_q(' ro ', self.FIELDS)
+        self.assertEqual(condition, Q(description__icontains='ro') | Q(primary_category__name__icontains='ro')
+                         | Q(secondary_category__name__icontains='ro') | Q(church__church_name__icontains='ro'))
+        self.assertEqual(list(Transaction.objects.filter(condition).values_list('pk', flat=True)), [self.receipt.pk])
+
+    def test_post_migrate_restores_dropped_triggers(self):
+        # A SQLite table rebuild drops the triggers; edits made meanwhile are missed
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER accounts_transaction_search_update')
+        search._available.clear()
+        Transaction.objects.filter(pk=self.receipt.pk).update(description='Pulpit lamp')
+        self.assertFalse(search.search_available())
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db=connection.alias)
+
+        self.assertTrue(search.search_available())
+        self.assertEqual(self.found('pulpit'), [self.receipt.pk])
+        self.assertEqual(self.found('robe'), [])
+
+
+class LookupCacheTests(TestCase):
+    """Cached dropdown rows must be replaced as soon as a row behind them changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(username='looker')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Look', pastorate_short_name='LK', user=user)
+        cls.other = Pastorate.objects.create(pastorate_name='Other', pastorate_short_name='OT', user=user)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+        cls.primary = PrimaryCategory.objects.create(name='Offerings', transaction_type='credit')
+        SecondaryCategory.objects.create(name='Sunday', primary_category=cls.primary)
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, pastorate):
+        return [(account.name, account.account_type.name) for account in lookups.pastorate_accounts(pastorate)]
+
+    def test_second_call_is_served_from_the_cache(self):
+        lookups.pastorate_accounts(self.pastorate)
+        lookups.primary_categories()
+        with self.assertNumQueries(0):
+            lookups.pastorate_accounts(self.pastorate)
+            lookups.primary_categories('credit')
+            lookups.secondary_categories('credit')
+
+    def test_account_rename_and_add(self):
+        before = self.names(self.pastorate)
+        lookups.pastorate_accounts(self.other)
+        version = lookups.get_version(lookups.ACCOUNTS, self.pastorate.pk)
+        other_version = lookups.get_version(lookups.ACCOUNTS, self.other.pk)
+
+        self.cash.name = 'Petty Cash'
+        self.cash.save()
+        self.assertNotEqual(lookups.get_version(lookups.ACCOUNTS, self.pastorate.pk), version)
+        self.assertEqual(lookups.get_version(lookups.ACCOUNTS, self.other.pk), other_version)
+        self.assertIn(('Petty Cash', self.cash.account_type.name), self.names(self.pastorate))
+        self.assertEqual(len(self.names(self.pastorate)), len(before))
+
+        Account.objects.create(name='Building Fund', account_type=self.cash.account_type, account_number='BF-1',
+                                pastorate=self.pastorate, level='pastorate')
+        self.assertIn(('Building Fund', self.cash.account_type.name), self.names(self.pastorate))
+        with self.assertNumQueries(0):
+            lookups.pastorate_accounts(self.other)
+
+    def test_account_move_refreshes_both_pastorates(self):
+        self.names(self.pastorate)
+        self.names(self.other)
+        self.cash.pastorate = self.other
+        self.cash.save()
+        self.assertNotIn(self.cash.pk, [account.pk for account in lookups.pastorate_accounts(self.pastorate)])
+        self.assertIn(self.cash.pk, [account.pk for account in lookups.pastorate_accounts(self.other)])
+
+    def test_account_type_rename(self):
+        self.names(self.pastorate)
+        version = lookups.get_version(lookups.ACCOUNT_TYPES)
+        account_type = self.cash.account_type
+        account_type.name = 'Petty Cash Account'
+        account_type.save()
+        self.assertNotEqual(lookups.get_version(lookups.ACCOUNT_TYPES), version)
+        self.assertIn((self.cash.name, 'Petty Cash Account'), self.names(self.pastorate))
+        self.assertIn('Petty Cash Account', [row.name for row in lookups.account_types()])
+
+    def test_category_rename_and_add(self):
+        self.assertEqual([row.name for row in lookups.primary_categories('credit')], ['Offerings'])
+        version = lookups.get_version(lookups.CATEGORIES)
+
+        self.primary.name = 'Tithes'
+        self.primary.save()
+        self.assertNotEqual(lookups.get_version(lookups.CATEGORIES), version)
+        self.assertEqual([row.name for row in lookups.primary_categories('credit')], ['Tithes'])
+        self.assertEqual([row.primary_category.name for row in lookups.secondary_categories('credit')], ['Tithes'])
+
+        SecondaryCategory.objects.create(name='Harvest', primary_category=self.primary)
+        self.assertEqual([row.name for row in lookups.secondary_categories('credit')], ['Harvest', 'Sunday'])
+        PrimaryCategory.objects.create(name='Salaries', transaction_type='debit')
+        self.assertEqual([row.name for row in lookups.primary_categories('debit')], ['Salaries'])
+
+
+class TransactionExportTests(TestCase):
+    """Exports stream exactly the rows of the filtered list, oldest first"""
+
+    HEADER = ['Date', 'Receipt Number', 'Family', 'Member', 'Account', 'Primary Category', 'Secondary Category',
+              'Description', 'Amount']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='exporter')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Export', pastorate_short_name='EX', user=cls.user)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+        cls.primary = PrimaryCategory.objects.create(name='Offerings', transaction_type='credit')
+        for number, (day, family, amount) in enumerate([
+            (datetime.date(2024, 1, 5), 'Samuel', '12.50'),
+            (datetime.date(2024, 2, 9), 'Samuel', '30.00'),
+            (datetime.date(2024, 2, 3), 'Daniel', '7.25'),
+            (datetime.date(2024, 3, 1), 'Samuel', '1000.10'),
+            (datetime.date(2024, 2, 20), 'Samuelson', '5.00'),
+        ]):
+            Transaction.objects.create(account=cls.cash, transaction_type='receipt', amount=Decimal(amount), date=day,
+                                       receipt_number=f'R-{number}', family_name=family, member_name='Anna',
+                                       primary_category=cls.primary, description=f'Receipt {number}')
+        Transaction.objects.create(account=cls.cash, transaction_type='bill', amount=Decimal('3.00'),
+                                   date=datetime.date(2024, 2, 10), reference_number='B-1', description='Samuel')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.filters = {'search': 'samuel', 'start_date': '2024-02-01', 'end_date': '2024-03-31'}
+
+    def listed(self):
+        response = self.client.get(reverse('accounts:receipt_list', args=[self.pastorate.pk]), self.filters)
+        return [transaction.receipt_number for transaction in reversed(list(response.context['page']))]
+
+    def export(self, **params):
+        return self.client.get(reverse('accounts:receipt_export', args=[self.pastorate.pk]), {**self.filters, **params})
+
+    def test_csv_matches_the_filtered_list(self):
+        response = self.export()
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertRegex(response['Content-Disposition'], r'attachment; filename="ex_receipt_\d{8}_\d{6}\.csv"')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], self.HEADER)
+        self.assertEqual([row[1] for row in rows[1:]], self.listed())
+        self.assertEqual(rows[1:], [
+            ['2024-02-09', 'R-1', 'Samuel', 'Anna', self.cash.name, 'Offerings', '', 'Receipt 1', '30.00'],
+            ['2024-02-20', 'R-4', 'Samuelson', 'Anna', self.cash.name, 'Offerings', '', 'Receipt 4', '5.00'],
+            ['2024-03-01', 'R-3', 'Samuel', 'Anna', self.cash.name, 'Offerings', '', 'Receipt 3', '1000.10'],
+        ])
+
+    def test_xlsx_reads_back(self):
+        response = self.export(format='xlsx')
+        self.assertEqual(response['Content-Type'], export.XLSX_CONTENT_TYPE)
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook['Transactions'].iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), self.HEADER)
+        self.assertEqual([row[1] for row in rows[1:]], self.listed())
+        self.assertEqual(rows[1][0], datetime.datetime(2024, 2, 9))
+        self.assertEqual([Decimal(str(row[8])) for row in rows[1:]],
+                         [Decimal('30.00'), Decimal('5.00'), Decimal('1000.10')])
+        self.assertEqual(rows[1][5:8], ('Offerings', None, 'Receipt 1'))
+
+
+class PeriodTotalsTests(TestCase):
+    """Period arithmetic and the per-period totals behind the trend charts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='trender')
+        pastorate = Pastorate.objects.create(pastorate_name='Trend', pastorate_short_name='TR', user=cls.user)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % pastorate.pk)
+        cls.bank = Account.objects.get(account_number='BANK-%03d' % pastorate.pk)
+        for transaction_type, amount, day in [
+            ('receipt', '100.00', datetime.date(2023, 12, 31)),
+            ('receipt', '40.10', datetime.date(2024, 1, 1)),
+            ('bill', '15.05', datetime.date(2024, 3, 31)),
+            ('offering', '60.00', datetime.date(2024, 4, 1)),
+            ('custom_debit', '5.00', datetime.date(2024, 9, 30)),
+        ]:
+            Transaction.objects.create(account=cls.cash, transaction_type=transaction_type, amount=Decimal(amount),
+                                       date=day)
+        pair_id = uuid.uuid4()
+        Transaction.objects.create(account=cls.cash, to_account=cls.bank, transaction_type='contra',
+                                   amount=Decimal('20.00'), date=datetime.date(2024, 2, 14), pair_id=pair_id)
+        Transaction.objects.create(account=cls.bank, from_account=cls.cash, transaction_type='contra_credit',
+                                   amount=Decimal('20.00'), date=datetime.date(2024, 2, 14), pair_id=pair_id)
+
+    def totals(self, rows):
+        return [(row['start_date'], row['end_date'], row['total_credits'], row['total_debits'],
+                 row['contra_debits'], row['transaction_count']) for row in rows]
+
+    def test_add_months(self):
+        self.assertEqual(ledger.add_months(datetime.date(2024, 11, 30), 2), datetime.date(2025, 1, 1))
+        self.assertEqual(ledger.add_months(datetime.date(2024, 12, 31), 1), datetime.date(2025, 1, 1))
+        self.assertEqual(ledger.add_months(datetime.date(2024, 1, 31), -1), datetime.date(2023, 12, 1))
+        self.assertEqual(ledger.add_months(datetime.date(2024, 2, 29), -14), datetime.date(2022, 12, 1))
+        self.assertEqual(ledger.add_months(datetime.date(2024, 5, 5), 0), datetime.date(2024, 5, 1))
+
+    def test_period_start(self):
+        for day, quarter in [
+            (datetime.date(2024, 1, 1), datetime.date(2024, 1, 1)),
+            (datetime.date(2024, 3, 31), datetime.date(2024, 1, 1)),
+            (datetime.date(2024, 4, 1), datetime.date(2024, 4, 1)),
+            (datetime.date(2024, 8, 15), datetime.date(2024, 7, 1)),
+            (datetime.date(2024, 12, 31), datetime.date(2024, 10, 1)),
+        ]:
+            self.assertEqual(ledger.period_start(day, 'quarter'), quarter, day)
+        self.assertEqual(ledger.period_start(datetime.date(2024, 2, 29), 'month'), datetime.date(2024, 2, 1))
+        with self.settings(FISCAL_YEAR_START_MONTH=4):
+            self.assertEqual(ledger.period_start(datetime.date(2024, 3, 31), 'fiscal_year'), datetime.date(2023, 4, 1))
+            self.assertEqual(ledger.period_start(datetime.date(2024, 4, 1), 'fiscal_year'), datetime.date(2024, 4, 1))
+
+    def test_last_periods(self):
+        today = datetime.date(2024, 2, 10)
+        self.assertEqual(ledger.last_periods('month', 3, today), (datetime.date(2023, 12, 1), datetime.date(2024, 2, 29)))
+        self.assertEqual(ledger.last_periods('quarter', 4, today), (datetime.date(2023, 4, 1), datetime.date(2024, 3, 31)))
+        self.assertEqual(ledger.last_periods('month', 1, today), (datetime.date(2024, 2, 1), datetime.date(2024, 2, 29)))
+        with self.settings(FISCAL_YEAR_START_MONTH=4):
+            self.assertEqual(ledger.last_periods('fiscal_year', 2, today),
+                             (datetime.date(2022, 4, 1), datetime.date(2024, 3, 31)))
+
+    def test_period_totals_by_quarter(self):
+        rows = ledger.period_totals(Transaction.objects.filter(account=self.cash), 'quarter',
+                                    datetime.date(2023, 10, 1), datetime.date(2024, 12, 31))
+        self.assertEqual(self.totals(rows), [
+            (datetime.date(2023, 10, 1), datetime.date(2023, 12, 31), Decimal('100.00'), Decimal('0.00'),
+             Decimal('0.00'), 1),
+            (datetime.date(2024, 1, 1), datetime.date(2024, 3, 31), Decimal('40.10'), Decimal('35.05'),
+             Decimal('20.00'), 3),
+            (datetime.date(2024, 4, 1), datetime.date(2024, 6, 30), Decimal('60.00'), Decimal('0.00'),
+             Decimal('0.00'), 1),
+            (datetime.date(2024, 7, 1), datetime.date(2024, 9, 30), Decimal('0.00'), Decimal('5.00'),
+             Decimal('0.00'), 1),
+            (datetime.date(2024, 10, 1), datetime.date(2024, 12, 31), Decimal('0.00'), Decimal('0.00'),
+             Decimal('0.00'), 0),
+        ])
+        self.assertEqual(rows[1]['net_change'], Decimal('5.05'))
+
+    def test_period_totals_by_fiscal_year(self):
+        with self.settings(FISCAL_YEAR_START_MONTH=4):
+            rows = ledger.period_totals(Transaction.objects.all(), 'fiscal_year')
+        self.assertEqual(self.totals(rows), [
+            (datetime.date(2023, 4, 1), datetime.date(2024, 3, 31), Decimal('160.10'), Decimal('35.05'),
+             Decimal('20.00'), 5),
+            (datetime.date(2024, 4, 1), datetime.date(2025, 3, 31), Decimal('60.00'), Decimal('5.00'),
+             Decimal('0.00'), 2),
+        ])
+        self.assertEqual(rows[0]['contra_credits'], Decimal('20.00'))
+
+    def test_period_totals_rejects_unknown_period(self):
+        with self.assertRaises(ValueError):
+            ledger.period_totals(Transaction.objects.all(), 'week')
+
+    def test_account_trend(self):
+        self.client.force_login(self.user)
+        url = reverse('accounts:account_trend', args=[self.cash.pk])
+        now = datetime.datetime(2024, 5, 20, 12, tzinfo=datetime.timezone.utc)
+        with mock.patch.object(ledger.timezone, 'now', return_value=now):
+            response = self.client.get(url, {'period': 'quarter', 'periods': 3})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['period'], 'quarter')
+        self.assertEqual([(row['start_date'], row['total_credits'], row['total_debits'], row['transaction_count'])
+                          for row in data['periods']], [
+            ('2023-10-01', 100.0, 0.0, 1),
+            ('2024-01-01', 40.1, 35.05, 3),
+            ('2024-04-01', 60.0, 0.0, 1),
+        ])
+
+        with mock.patch.object(ledger.timezone, 'now', return_value=now):
+            response = self.client.get(url, {'periods': 1000})
+        self.assertEqual(len(response.json()['periods']), 120)
+        self.assertEqual(self.client.get(url, {'period': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'periods': 'many'}).status_code, 400)
+
+
+class AccountReportTests(TestCase):
+    """The account report's category sections must add up to the account's ledger"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='reporter')
+        pastorate = Pastorate.objects.create(pastorate_name='Report', pastorate_short_name='RP', user=cls.user)
+        church = Church.objects.create(church_name='Zion', abode='-', short_name='ZN', pastorate=pastorate)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % pastorate.pk)
+        cls.bank = Account.objects.get(account_number='BANK-%03d' % pastorate.pk)
+        offerings = PrimaryCategory.objects.create(name='offerings', transaction_type='credit')
+        donations = PrimaryCategory.objects.create(name='Donations', transaction_type='credit')
+        salaries = PrimaryCategory.objects.create(name='Salaries', transaction_type='debit')
+        for transaction_type, amount, day, category in [
+            ('receipt', '10.10', datetime.date(2024, 2, 28), offerings),
+            ('receipt', '100.00', datetime.date(2024, 3, 1), offerings),
+            ('offering', '33.33', datetime.date(2024, 3, 3), offerings),
+            ('custom_credit', '12.34', datetime.date(2024, 3, 9), donations),
+            ('receipt', '7.77', datetime.date(2024, 3, 15), None),
+            ('bill', '45.00', datetime.date(2024, 3, 20), salaries),
+            ('aqudence', '8.88', datetime.date(2024, 3, 21), None),
+            ('custom_debit', '1.11', datetime.date(2024, 3, 31), salaries),
+            ('bill', '99.99', datetime.date(2024, 4, 1), salaries),
+        ]:
+            Transaction.objects.create(account=cls.cash, transaction_type=transaction_type, amount=Decimal(amount),
+                                       date=day, primary_category=category,
+                                       church=church if transaction_type == 'offering' else None)
+        Transaction.objects.create(account=cls.bank, transaction_type='receipt', amount=Decimal('500.00'),
+                                   date=datetime.date(2024, 3, 5), primary_category=donations)
+        pair_id = uuid.uuid4()
+        Transaction.objects.create(account=cls.cash, to_account=cls.bank, transaction_type='contra',
+                                   amount=Decimal('20.00'), date=datetime.date(2024, 3, 10), pair_id=pair_id)
+        Transaction.objects.create(account=cls.bank, from_account=cls.cash, transaction_type='contra_credit',
+                                   amount=Decimal('20.00'), date=datetime.date(2024, 3, 10), pair_id=pair_id)
+
+    def ledger_sum(self, transaction_types):
+        return sum((t.amount for t in Transaction.objects.filter(
+            account=self.cash, date__range=[datetime.date(2024, 3, 1), datetime.date(2024, 3, 31)],
+            transaction_type__in=transaction_types,
+        )), Decimal('0.00'))
+
+    def test_category_totals_match_the_ledger(self):
+        transactions = Transaction.objects.filter(
+            account=self.cash, date__range=[datetime.date(2024, 3, 1), datetime.date(2024, 3, 31)],
+            transaction_type__in=REPORT_INCOME_TYPES + REPORT_EXPENSE_TYPES,
+        )
+        income, expenses = _report_categories(transactions, itemised=True)
+
+        self.assertEqual([(row['name'], row['total']) for row in income], [
+            ('Donations', Decimal('12.34')), ('offerings', Decimal('133.33')), ('Other Income', Decimal('7.77')),
+        ])
+        self.assertEqual([(row['name'], row['total']) for row in expenses], [
+            ('Salaries', Decimal('46.11')), ('Other Expenses', Decimal('28.88')),
+        ])
+        self.assertEqual(sum(row['total'] for row in income), self.ledger_sum(Transaction.CREDIT_TYPES))
+        self.assertEqual(sum(row['total'] for row in expenses), self.ledger_sum(Transaction.DEBIT_TYPES))
+        for row in income + expenses:
+            self.assertEqual(sum(item['amount'] for item in row['items']), row['total'], row['name'])
+
+    def test_report_view_balances(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('accounts:account_report', args=[self.cash.pk]),
+                                   {'start_date': '2024-03-01', 'end_date': '2024-03-31'})
+        context = response.context
+        self.assertEqual(context['opening_balance'], Decimal('10.10'))
+        self.assertEqual(context['total_income'], self.ledger_sum(Transaction.CREDIT_TYPES))
+        self.assertEqual(context['total_expenses'], self.ledger_sum(Transaction.DEBIT_TYPES))
+        self.assertEqual(context['opening_balance'] + context['net_balance'], context['closing_balance'])
+        self.assertEqual(context['closing_balance'], Decimal('88.55'))
+
+
+class ConsolidatedReportTests(TestCase):
+    """Transfers inside a pastorate move money between its accounts, never in or out of it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='consolidator')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Whole', pastorate_short_name='WH', user=cls.user)
+        other = Pastorate.objects.create(pastorate_name='Neighbour', pastorate_short_name='NB', user=cls.user)
+        church = Church.objects.create(church_name='Grace', abode='-', short_name='GR', pastorate=cls.pastorate)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+        cls.bank = Account.objects.get(account_number='BANK-%03d' % cls.pastorate.pk)
+        cls.church_cash = Account.objects.get(church=church, account_number__startswith='CASH-')
+        cls.outside = Account.objects.get(account_number='CASH-%03d' % other.pk)
+        offerings = PrimaryCategory.objects.create(name='Offerings', transaction_type='credit')
+        salaries = PrimaryCategory.objects.create(name='Salaries', transaction_type='debit')
+
+        def create(account, transaction_type, amount, day, **fields):
+            Transaction.objects.create(account=account, transaction_type=transaction_type, amount=Decimal(amount),
+                                       date=datetime.date(2024, 3, day), **fields)
+
+        def transfer(debit_type, source, target, amount, day):
+            pair_id = uuid.uuid4()
+            create(source, debit_type, amount, day, to_account=target, pair_id=pair_id)
+            create(target, Transaction.TRANSFER_PAIRS[debit_type], amount, day, from_account=source, pair_id=pair_id)
+
+        create(cls.cash, 'receipt', '50.00', 1)
+        create(cls.cash, 'receipt', '100.00', 5, primary_category=offerings)
+        create(cls.bank, 'bill', '30.00', 6, primary_category=salaries)
+        create(cls.church_cash, 'offering', '12.50', 7, primary_category=offerings, church=church)
+        transfer('contra', cls.cash, cls.bank, '40.00', 8)
+        transfer('intra', cls.cash, cls.church_cash, '15.00', 9)
+        transfer('contra', cls.cash, cls.outside, '25.00', 10)
+        transfer('contra', cls.outside, cls.bank, '10.00', 11)
+        create(cls.cash, 'receipt', '999.00', 31)
+
+    def test_internal_transfers_are_excluded(self):
+        report = consolidated_report(self.pastorate, datetime.date(2024, 3, 2), datetime.date(2024, 3, 30))
+
+        self.assertEqual(report['total_income'], Decimal('122.50'))
+        self.assertEqual(report['total_expenses'], Decimal('55.00'))
+        self.assertEqual(report['transfers'], Decimal('55.00'))
+        self.assertEqual([(row['name'], row['total']) for row in report['income_categories']],
+                         [('Offerings', Decimal('112.50')), ('Other Income', Decimal('10.00'))])
+        self.assertEqual([(row['name'], row['total']) for row in report['expense_categories']],
+                         [('Salaries', Decimal('30.00')), ('Other Expenses', Decimal('25.00'))])
+        self.assertNotIn(self.outside.pk, [row['account'].pk for row in report['accounts']])
+
+        rows = {row['account'].pk: row for row in report['accounts']}
+        self.assertEqual((rows[self.cash.pk]['opening'], rows[self.cash.pk]['closing']),
+                         (Decimal('50.00'), Decimal('70.00')))
+        for row in report['accounts']:
+            self.assertEqual(
+                row['opening'] + row['income'] - row['expenses'] + row['transfers_in'] - row['transfers_out'],
+                row['closing'], row['account'].account_number,
+            )
+        self.assertEqual(sum(row['transfers_out'] for row in report['accounts']), report['transfers'])
+        self.assertEqual(report['opening'] + report['net'], report['closing'])
 
-# Create your tests here.
+    def test_report_view(self):
+        self.client.force_login(self.user)
+        url = reverse('accounts:pastorate_report', args=[self.pastorate.pk])
+        response = self.client.get(url, {'start_date': '2024-03-02', 'end_date': '2024-03-30'})
+        self.assertEqual(response.context['report']['net'], Decimal('67.50'))
+        response = self.client.get(url, {'start_date': '2024-03-02', 'end_date': '2024-03-30', 'format': 'xlsx'})
+        rows = [row[:2] for row in load_workbook(BytesIO(response.content), read_only=True).active.iter_rows(
+            values_only=True)]
+        self.assertIn(('Total Income', 122.5), rows)
+        self.assertIn(('Surplus', 67.5), rows)
@@ -2,6 +2,6 @@ from . import transactions, categories, dashboard, pastorates, churches, account
 from .dashboard import dashboard
 from .pastorates import pastorate_list, pastorate_detail, pastorate_account_add
 from .churches import church_detail, church_account_add
-from .accounts import account_list, account_detail, account_edit, account_delete
+from .accounts import account_list, account_detail, account_transactions, account_edit, account_delete
 from .account_types import account_type_list, account_type_add, account_type_edit, account_type_delete
 from .history import transaction_history 
\ No newline at end of file
@@ -1,57 +1,60 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Q
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.utils import timezone
 from datetime import datetime, timedelta
+from decimal import Decimal
+import logging
 from ..models import Account, AccountType, Transaction, PrimaryCategory, SecondaryCategory
+from .. import ledger, lookups
+from ..pagination import paginate_keyset
+from ..export import export_response, EXPORT_CHUNK_SIZE
+from ..search import search_q
 
-@login_required
-def account_list(request):
-    accounts = Account.objects.select_related('pastorate', 'church', 'account_type').all()
-    return render(request, 'accounts/account/list.html', {'accounts': accounts})
+logger = logging.getLogger('ecclesia.reports')
 
-@login_required
-def account_detail(request, pk):
-    account = get_object_or_404(Account, pk=pk)
-    
-    # Recalculate account balance on every page load
-    # Calculate credits
-    credits = Transaction.objects.filter(
-        account=account,
-        transaction_type__in=['receipt', 'offering', 'custom_credit', 'contra_credit', 'intra_credit']
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Calculate debits
-    debits = Transaction.objects.filter(
-        account=account,
-        transaction_type__in=['bill', 'custom_debit', 'aqudence', 'contra', 'intra']
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Update balance
-    account.balance = credits - debits
-    account.save()
-    
-    print(f"\n=== Auto-recalculated balance for {account.name} ===")
-    print(f"Credits: {credits}")
-    print(f"Debits: {debits}")
-    print(f"Current Balance: {account.balance}")
-    
-    # Get all transactions for this account
+# Newest first; id makes the order total so keyset cursors never skip rows
+LEDGER_ORDERING = ['-date', '-created_at', '-id']
+LEDGER_PAGE_SIZE = 25
+
+# Trend endpoint: periods returned by default and at most
+TREND_PERIODS = 12
+TREND_MAX_PERIODS = 120
+
+# Transaction types on each side of the account report (intra transfers are
+# not part of it)
+REPORT_INCOME_TYPES = ['receipt', 'offering', 'custom_credit', 'contra_credit']
+REPORT_EXPENSE_TYPES = ['bill', 'aqudence', 'custom_debit', 'contra']
+
+# Ledger exports run oldest first so the balance column reads forwards
+LEDGER_EXPORT_ORDERING = ['date', 'created_at', 'id']
+LEDGER_EXPORT_COLUMNS = (
+    ('Date', 'date'),
+    ('Type', 'transaction_type'),
+    ('Receipt Number', 'receipt_number'),
+    ('Reference', 'reference_number'),
+    ('Family', 'family_name'),
+    ('Member', 'member_name'),
+    ('Church', 'church__church_name'),
+    ('Primary Category', 'primary_category__name'),
+    ('Secondary Category', 'secondary_category__name'),
+    ('From Account', 'from_account__name'),
+    ('To Account', 'to_account__name'),
+    ('Description', 'description'),
+)
+
+
+def _ledger_queryset(request, account):
+    """The account's ledger with the request's search and filters applied"""
     transactions = Transaction.objects.select_related(
-        'account',
-        'account__church',
-        'account__account_type',
         'to_account',
-        'to_account__church',
-        'to_account__account_type',
         'from_account',
-        'from_account__church',
-        'from_account__account_type',
         'church',
         'primary_category',
         'secondary_category',
-        'created_by'
     ).filter(
         # For sending account: show regular transactions and outgoing transfers (debit entries)
         (Q(account=account, transaction_type__in=['receipt', 'bill', 'aqudence', 'offering', 'custom_credit', 'custom_debit', 'contra']) |
@@ -59,19 +62,19 @@ def account_detail(request, pk):
         Q(account=account, transaction_type='intra', to_account__isnull=False) |
         # For receiving account: show only incoming transfers (credit entries)
         Q(account=account, transaction_type__in=['contra_credit', 'intra_credit'], from_account__isnull=False))
-    ).order_by('-date', '-created_at')
+    )
     
     # Apply filters
     search_query = request.GET.get('search', '')
     if search_query:
-        transactions = transactions.filter(
-            Q(description__icontains=search_query) |
-            Q(receipt_number__icontains=search_query) |
-            Q(reference_number__icontains=search_query) |
-            Q(family_name__icontains=search_query) |
-            Q(member_name__icontains=search_query) |
-            Q(church__church_name__icontains=search_query)
-        )
+        transactions = transactions.filter(search_q(search_query, [
+            'description',
+            'receipt_number',
+            'reference_number',
+            'family_name',
+            'member_name',
+            'church__church_name',
+        ]))
 
     # Category filters
     primary_category_id = request.GET.get('primary_category')
@@ -86,62 +89,98 @@ def account_detail(request, pk):
     if transaction_type:
         transactions = transactions.filter(transaction_type=transaction_type)
 
-    # Calculate monthly statistics
-    today = timezone.now().date()
-    start_of_month = today.replace(day=1)
-    end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-    
-    # Regular credits (money received)
-    regular_credits = transactions.filter(
-        account=account,
-        transaction_type__in=['receipt', 'offering', 'custom_credit'],
-        date__range=[start_of_month, end_of_month]
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Regular debits (money spent)
-    regular_debits = transactions.filter(
-        account=account,
-        transaction_type__in=['bill', 'custom_debit', 'aqudence'],
-        date__range=[start_of_month, end_of_month]
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Contra debits (money sent)
-    contra_debits = transactions.filter(
-        account=account,
-        transaction_type__in=['contra', 'intra'],
-        date__range=[start_of_month, end_of_month]
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    filters = {
+        'search': search_query,
+        'primary_category': primary_category_id,
+        'secondary_category': secondary_category_id,
+        'type': transaction_type,
+    }
+    return transactions, filters
+
+def _export_query(request):
+    """The request's ledger filters as a query string for the export links"""
+    query = request.GET.copy()
+    for param in ('cursor', 'verify', 'format'):
+        query.pop(param, None)
+    return query.urlencode()
+
+
+def _ledger_export_rows(account, transactions):
+    """
+    Yield the filtered ledger oldest first, each row ending with its credit,
+    debit and the account balance just after it.  The balance counts every
+    entry of the account, shown or not: a second cursor walks the whole
+    ledger in the same order and sums up to each exported row, so nothing is
+    held in memory.
+    """
+    fields = [field for _, field in LEDGER_EXPORT_COLUMNS]
+    type_names = dict(Transaction.TRANSACTION_TYPES)
+    rows = transactions.order_by(*LEDGER_EXPORT_ORDERING).annotate(
+        signed_amount=ledger.signed_amount_expression(),
+    ).values_list('pk', 'signed_amount', *fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    history = Transaction.objects.filter(account=account).order_by(*LEDGER_EXPORT_ORDERING).annotate(
+        signed_amount=ledger.signed_amount_expression(),
+    ).values_list('pk', 'signed_amount').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    cent = Decimal('0.01')
+    balance = Decimal('0')
+    for pk, amount, date, transaction_type, *values in rows:
+        for history_pk, history_amount in history:
+            balance += history_amount
+            if history_pk == pk:
+                break
+        amount = amount.quantize(cent)
+        yield (
+            date, type_names.get(transaction_type, transaction_type), *values,
+            amount if amount > 0 else None,
+            -amount if amount < 0 else None,
+            balance.quantize(cent),
+        )
+
+@login_required
+def account_list(request):
+    accounts = Account.objects.select_related('pastorate', 'church', 'account_type').all()
+    return render(request, 'accounts/account/list.html', {'accounts': accounts})
+
+@login_required
+def account_detail(request, pk):
+    account = get_object_or_404(Account, pk=pk)
     
-    # Contra credits (money received)
-    contra_credits = transactions.filter(
-        account=account,
-        transaction_type__in=['contra_credit', 'intra_credit'],
-        date__range=[start_of_month, end_of_month]
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    # The stored balance is maintained by the ledger signals; reading it never
+    # writes.  ?verify=1 recomputes it from history and reports any drift.
+    balance_check = None
+    if request.GET.get('verify'):
+        stored, computed = ledger.verify_balance(account)
+        balance_check = {
+            'stored': stored,
+            'computed': computed,
+            'drift': computed - stored,
+            'ok': computed == stored,
+        }
     
-    # Calculate totals
-    total_credits = regular_credits + contra_credits
-    total_debits = regular_debits + contra_debits
-    net_change = total_credits - total_debits
+    transactions, filters = _ledger_queryset(request, account)
+
+    # This month's totals over the filtered ledger
+    today = timezone.now().date()
+    start_of_month, end_of_month = ledger.last_periods('month', 1, today)
+    monthly_stats = ledger.period_totals(transactions, 'month', start_of_month, end_of_month)[0]
     
+    # Only the first page is rendered; the rest is fetched by account_transactions
+    page = paginate_keyset(transactions, LEDGER_ORDERING, per_page=LEDGER_PAGE_SIZE)
+    transactions = ledger.running_balances(account, page.object_list)
+
     context = {
         'account': account,
+        'balance_check': balance_check,
         'transactions': transactions,
-        'monthly_stats': {
-            'regular_credits': regular_credits,
-            'regular_debits': regular_debits,
-            'contra_credits': contra_credits,
-            'contra_debits': contra_debits,
-            'total_credits': total_credits,
-            'total_debits': total_debits,
-            'net_change': net_change,
-            'start_date': start_of_month,
-            'end_date': end_of_month,
-        },
-        'search_query': search_query,
-        'selected_type': transaction_type,
-        'selected_primary_category': primary_category_id,
-        'selected_secondary_category': secondary_category_id,
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+        'export_query': _export_query(request),
+        'monthly_stats': monthly_stats,
+        'search_query': filters['search'],
+        'selected_type': filters['type'],
+        'selected_primary_category': filters['primary_category'],
+        'selected_secondary_category': filters['secondary_category'],
         'primary_categories': PrimaryCategory.objects.all(),
         'secondary_categories': SecondaryCategory.objects.all(),
         'transaction_types': [
@@ -159,6 +198,62 @@ def account_detail(request, pk):
     }
     return render(request, 'accounts/account/detail.html', context)
 
+@login_required
+def account_transactions(request, pk):
+    """Next page of the account ledger as rendered rows, for the Load more button"""
+    account = get_object_or_404(Account, pk=pk)
+    transactions, filters = _ledger_queryset(request, account)
+    page = paginate_keyset(transactions, LEDGER_ORDERING, request.GET.get('cursor'), per_page=LEDGER_PAGE_SIZE)
+    html = render_to_string('accounts/account/includes/ledger_rows.html', {
+        'account': account,
+        'transactions': ledger.running_balances(account, page.object_list),
+    }, request=request)
+    return JsonResponse({
+        'html': html,
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
+
+@login_required
+def account_export(request, pk):
+    """Stream the account's filtered ledger as CSV or XLSX, with running balances"""
+    account = get_object_or_404(Account, pk=pk)
+    transactions, filters = _ledger_queryset(request, account)
+    header = [label for label, _ in LEDGER_EXPORT_COLUMNS] + ['Credit', 'Debit', 'Balance']
+    return export_response(
+        request, f'{account.account_number}_ledger', header,
+        _ledger_export_rows(account, transactions), sheet_name='Ledger',
+    )
+
+@login_required
+def account_trend(request, pk):
+    """
+    Per-period totals of the account's filtered ledger for trend charts:
+    ?period=month|quarter|fiscal_year and ?periods=N (default 12), ending
+    with the current period.
+    """
+    account = get_object_or_404(Account, pk=pk)
+    period = request.GET.get('period', 'month')
+    if period not in ledger.PERIODS:
+        return JsonResponse({'error': f'Unknown period: {period}'}, status=400)
+    try:
+        count = int(request.GET.get('periods', TREND_PERIODS))
+    except ValueError:
+        return JsonResponse({'error': 'periods must be a number'}, status=400)
+    count = max(1, min(count, TREND_MAX_PERIODS))
+
+    transactions, filters = _ledger_queryset(request, account)
+    start, end = ledger.last_periods(period, count)
+    rows = ledger.period_totals(transactions, period, start, end)
+    return JsonResponse({
+        'account': account.pk,
+        'period': period,
+        'periods': [
+            {key: float(value) if isinstance(value, Decimal) else value for key, value in row.items()}
+            for row in rows
+        ],
+    })
+
 @login_required
 def account_edit(request, pk):
     account = get_object_or_404(Account, pk=pk)
@@ -179,7 +274,7 @@ def account_edit(request, pk):
         except Exception as e:
             messages.error(request, f'Error updating account: {str(e)}')
     
-    account_types = AccountType.objects.all().order_by('name')
+    account_types = lookups.account_types()
     context = {
         'account': account,
         'account_types': account_types,
@@ -214,6 +309,84 @@ def account_delete(request, pk):
     }
     return render(request, 'accounts/account/delete.html', context)
 
+def _report_description(trans):
+    """Detail line of a transaction in the itemised account report"""
+    if trans.transaction_type == 'receipt':
+        description = f"Receipt #{trans.receipt_number}"
+        if trans.member_name:
+            description += f" - {trans.member_name}"
+            if trans.family_name:
+                description += f" ({trans.family_name})"
+        elif trans.family_name:
+            description += f" - {trans.family_name}"
+    elif trans.transaction_type == 'offering':
+        description = "Church Offering"
+        if trans.church:
+            description += f" - {trans.church.church_name}"
+    elif trans.transaction_type == 'contra_credit':
+        description = f"Transfer from {trans.from_account.name}"
+    elif trans.transaction_type == 'bill':
+        description = f"Bill #{trans.reference_number}"
+        if trans.description:
+            description += f" - {trans.description}"
+    elif trans.transaction_type == 'aqudence':
+        description = f"Aqudence #{trans.aqudence_number}"
+        if trans.aqudence_ref:
+            description += f" - {trans.aqudence_ref}"
+    elif trans.transaction_type == 'contra':
+        description = f"Transfer to {trans.to_account.name}"
+    else:  # custom_credit / custom_debit
+        description = trans.description or trans.get_transaction_type_display()
+
+    if trans.secondary_category:
+        description += f" ({trans.secondary_category.name})"
+    return description
+
+
+def _report_categories(transactions, itemised=False):
+    """
+    Income and expense sections of the account report: lists of
+    ``{'name', 'total', 'items'}`` ordered by category name, uncategorised last.
+    """
+    cent = Decimal('0.01')
+    income, expenses = {}, {}
+    rows = transactions.values('primary_category_id', 'primary_category__name').annotate(
+        income=ledger.credit_sum(REPORT_INCOME_TYPES),
+        expenses=ledger.credit_sum(REPORT_EXPENSE_TYPES),
+        income_count=Count('pk', filter=Q(transaction_type__in=REPORT_INCOME_TYPES)),
+        expense_count=Count('pk', filter=Q(transaction_type__in=REPORT_EXPENSE_TYPES)),
+    ).order_by()
+    for row in rows:
+        if row['income_count']:
+            income[row['primary_category_id']] = {
+                'name': row['primary_category__name'] or 'Other Income',
+                'total': (row['income'] or Decimal('0')).quantize(cent),
+                'items': [],
+            }
+        if row['expense_count']:
+            expenses[row['primary_category_id']] = {
+                'name': row['primary_category__name'] or 'Other Expenses',
+                'total': (row['expenses'] or Decimal('0')).quantize(cent),
+                'items': [],
+            }
+
+    if itemised:
+        for trans in transactions.select_related(
+            'to_account', 'from_account', 'church', 'secondary_category'
+        ).order_by('date', 'id'):
+            side = income if trans.transaction_type in REPORT_INCOME_TYPES else expenses
+            side[trans.primary_category_id]['items'].append({
+                'description': _report_description(trans),
+                'amount': trans.amount,
+            })
+
+    def ordered(categories):
+        return [categories[key] for key in sorted(
+            categories, key=lambda key: (key is None, categories[key]['name'].lower())
+        )]
+    return ordered(income), ordered(expenses)
+
+
 @login_required
 def account_report(request, pk):
     account = get_object_or_404(Account.objects.select_related(
@@ -225,117 +398,45 @@ def account_report(request, pk):
         start_date = datetime.strptime(request.GET.get('start_date'), '%Y-%m-%d').date()
         end_date = datetime.strptime(request.GET.get('end_date'), '%Y-%m-%d').date()
     except (TypeError, ValueError):
+        logger.info('account report rejected account=%s start=%r end=%r',
+                    pk, request.GET.get('start_date'), request.GET.get('end_date'))
         messages.error(request, 'Invalid date range provided')
         return redirect('accounts:account_detail', pk=pk)
     
-    # Get all transactions within date range
+    # Opening balance from the monthly snapshots plus the partial month
+    opening_balance = ledger.balance_before(account, start_date)
+    closing_balance = ledger.balance_before(account, end_date + timedelta(days=1))
+
     transactions = Transaction.objects.filter(
         account=account,
-        date__range=[start_date, end_date]
-    ).select_related(
-        'account',
-        'to_account',
-        'from_account',
-        'church',
-        'primary_category',
-        'secondary_category'
-    ).order_by('date')
-
-    # Initialize categories
-    income_categories = {}
-    expense_categories = {}
-    
-    # Process income transactions
-    for trans in transactions.filter(transaction_type__in=['receipt', 'offering', 'custom_credit', 'contra_credit']):
-        category_name = "Other Income"
-        if trans.primary_category:
-            category_name = trans.primary_category.name
-        
-        if category_name not in income_categories:
-            income_categories[category_name] = []
-        
-        description = ""
-        if trans.transaction_type == 'receipt':
-            description = f"Receipt #{trans.receipt_number}"
-            if trans.member_name:
-                description += f" - {trans.member_name}"
-                if trans.family_name:
-                    description += f" ({trans.family_name})"
-            elif trans.family_name:
-                description += f" - {trans.family_name}"
-        elif trans.transaction_type == 'offering':
-            description = f"Church Offering"
-            if trans.church:
-                description += f" - {trans.church.church_name}"
-        elif trans.transaction_type == 'contra_credit':
-            description = f"Transfer from {trans.from_account.name}"
-        else:  # custom_credit
-            description = trans.description or "Custom Credit"
-        
-        if trans.secondary_category:
-            description += f" ({trans.secondary_category.name})"
-        
-        income_categories[category_name].append({
-            'description': description,
-            'amount': trans.amount
-        })
-    
-    # Process expense transactions
-    for trans in transactions.filter(transaction_type__in=['bill', 'aqudence', 'custom_debit', 'contra']):
-        category_name = "Other Expenses"
-        if trans.primary_category:
-            category_name = trans.primary_category.name
-        
-        if category_name not in expense_categories:
-            expense_categories[category_name] = []
-        
-        description = ""
-        if trans.transaction_type == 'bill':
-            description = f"Bill #{trans.reference_number}"
-            if trans.description:
-                description += f" - {trans.description}"
-        elif trans.transaction_type == 'aqudence':
-            description = f"Aqudence #{trans.aqudence_number}"
-            if trans.aqudence_ref:
-                description += f" - {trans.aqudence_ref}"
-        elif trans.transaction_type == 'contra':
-            description = f"Transfer to {trans.to_account.name}"
-        else:  # custom_debit
-            description = trans.description or "Custom Debit"
-        
-        if trans.secondary_category:
-            description += f" ({trans.secondary_category.name})"
-        
-        expense_categories[category_name].append({
-            'description': description,
-            'amount': trans.amount
-        })
-
-    # Calculate category totals
-    income_totals = {
-        category: sum(item['amount'] for item in items)
-        for category, items in income_categories.items()
-    }
-    expense_totals = {
-        category: sum(item['amount'] for item in items)
-        for category, items in expense_categories.items()
-    }
+        date__range=[start_date, end_date],
+        transaction_type__in=REPORT_INCOME_TYPES + REPORT_EXPENSE_TYPES,
+    )
+    # Category totals come from one grouped query; the individual lines are
+    # only loaded for the itemised report
+    itemised = request.GET.get('itemised') == '1'
+    income_categories, expense_categories = _report_categories(transactions, itemised)
 
-    # Calculate grand totals
-    total_income = sum(income_totals.values())
-    total_expenses = sum(expense_totals.values())
+    total_income = sum((category['total'] for category in income_categories), Decimal('0'))
+    total_expenses = sum((category['total'] for category in expense_categories), Decimal('0'))
     net_balance = total_income - total_expenses
+    logger.debug('account report account=%s start=%s end=%s income=%s expenses=%s',
+                 account.pk, start_date, end_date, total_income, total_expenses)
 
     context = {
         'account': account,
         'start_date': start_date,
         'end_date': end_date,
+        'itemised': itemised,
         'income_categories': income_categories,
         'expense_categories': expense_categories,
-        'income_totals': income_totals,
-        'expense_totals': expense_totals,
         'total_income': total_income,
         'total_expenses': total_expenses,
         'net_balance': net_balance,
+        # Each column is balanced by the net profit or net loss
+        'expense_side_total': total_expenses + max(net_balance, Decimal('0')),
+        'income_side_total': total_income + max(-net_balance, Decimal('0')),
+        'opening_balance': opening_balance,
+        'closing_balance': closing_balance,
     }
     return render(request, 'accounts/account/report.html', context) 
\ No newline at end of file
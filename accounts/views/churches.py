@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from congregation.models import Church
 from ..models import Account, AccountType
+from .. import lookups
 
 @login_required
 def church_detail(request, pk):
@@ -43,7 +44,7 @@ def church_account_add(request, church_id):
         except Exception as e:
             messages.error(request, f'Error creating account: {str(e)}')
     
-    account_types = AccountType.objects.all().order_by('name')
+    account_types = lookups.account_types()
     context = {
         'church': church,
         'account_types': account_types,
@@ -0,0 +1,187 @@
+"""
+Transaction import from CSV/XLSX files in three steps: upload (with the
+default account and types), preview with column mapping and per-row errors,
+then commit.  The upload waits in a private directory between the steps;
+the session only holds its token and the chosen options.
+"""
+import logging
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render, redirect, get_object_or_404
+
+from congregation.models import Pastorate
+from .. import importer, lookups
+from ..models import Transaction
+
+logger = logging.getLogger('ecclesia.ledger')
+
+SESSION_KEY = 'transaction_import'
+
+CREDIT_TYPE_CHOICES = [(code, label) for code, label in Transaction.TRANSACTION_TYPES
+                       if code in importer.IMPORTABLE_TYPES and code in Transaction.CREDIT_TYPES]
+DEBIT_TYPE_CHOICES = [(code, label) for code, label in Transaction.TRANSACTION_TYPES
+                      if code in importer.IMPORTABLE_TYPES and code in Transaction.DEBIT_TYPES]
+
+
+def _choice(value, choices, default):
+    return value if value in dict(choices) else default
+
+
+def _find_account(accounts, account_id):
+    return next((account for account in accounts if str(account.pk) == str(account_id)), None)
+
+
+def _import_state(request, pastorate):
+    """The pending import of this pastorate, if its upload still exists"""
+    state = request.session.get(SESSION_KEY)
+    if not state or state.get('pastorate') != pastorate.pk or not importer.upload_path(state.get('file')):
+        return None
+    return state
+
+
+def _importer(request, pastorate, state):
+    accounts = lookups.pastorate_accounts(pastorate)
+    return importer.TransactionImporter(
+        pastorate,
+        request.user,
+        dict(state['mapping']),
+        _find_account(accounts, state['account']),
+        credit_type=state['credit_type'],
+        debit_type=state['debit_type'],
+    )
+
+
+@login_required
+def transaction_import(request, pastorate_id):
+    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
+    accounts = lookups.pastorate_accounts(pastorate)
+
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        account = _find_account(accounts, request.POST.get('account'))
+        if not upload:
+            messages.error(request, 'Choose a CSV or XLSX file to import.')
+        elif account is None:
+            messages.error(request, 'Select the default account of this pastorate.')
+        else:
+            token = None
+            try:
+                token = importer.store_upload(upload)
+                headers = importer.read_headers(importer.upload_path(token))
+            except importer.ImportFileError as e:
+                importer.discard_upload(token)
+                messages.error(request, str(e))
+            else:
+                previous = request.session.get(SESSION_KEY)
+                if previous:
+                    importer.discard_upload(previous.get('file'))
+                request.session[SESSION_KEY] = {
+                    'pastorate': pastorate.pk,
+                    'file': token,
+                    'name': upload.name,
+                    'account': account.pk,
+                    'credit_type': _choice(request.POST.get('credit_type'), CREDIT_TYPE_CHOICES, 'custom_credit'),
+                    'debit_type': _choice(request.POST.get('debit_type'), DEBIT_TYPE_CHOICES, 'custom_debit'),
+                    'mapping': importer.guess_mapping(headers),
+                }
+                return redirect('accounts:transaction_import_preview', pastorate_id=pastorate.pk)
+
+    context = {
+        'pastorate': pastorate,
+        'accounts': accounts,
+        'credit_types': CREDIT_TYPE_CHOICES,
+        'debit_types': DEBIT_TYPE_CHOICES,
+        'fields': importer.IMPORT_FIELDS,
+    }
+    return render(request, 'accounts/transaction/import/upload.html', context)
+
+
+@login_required
+def transaction_import_preview(request, pastorate_id):
+    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
+    state = _import_state(request, pastorate)
+    if state is None:
+        messages.error(request, 'Upload a file to import first.')
+        return redirect('accounts:transaction_import', pastorate_id=pastorate.pk)
+    path = importer.upload_path(state['file'])
+    accounts = lookups.pastorate_accounts(pastorate)
+
+    try:
+        headers = importer.read_headers(path)
+        if request.method == 'POST':
+            # Remap the columns and options, then show the preview again
+            mapping = {}
+            for field, _ in importer.IMPORT_FIELDS:
+                value = request.POST.get(f'map_{field}', '')
+                if value.isdigit() and int(value) < len(headers):
+                    mapping[field] = int(value)
+            account = _find_account(accounts, request.POST.get('account'))
+            state.update({
+                'mapping': mapping,
+                'account': account.pk if account else state['account'],
+                'credit_type': _choice(request.POST.get('credit_type'), CREDIT_TYPE_CHOICES, state['credit_type']),
+                'debit_type': _choice(request.POST.get('debit_type'), DEBIT_TYPE_CHOICES, state['debit_type']),
+            })
+            request.session[SESSION_KEY] = state
+            return redirect('accounts:transaction_import_preview', pastorate_id=pastorate.pk)
+
+        summary = _importer(request, pastorate, state).preview(path)
+    except importer.ImportFileError as e:
+        messages.error(request, str(e))
+        return redirect('accounts:transaction_import', pastorate_id=pastorate.pk)
+
+    mapping = state['mapping']
+    context = {
+        'pastorate': pastorate,
+        'state': state,
+        'accounts': accounts,
+        'credit_types': CREDIT_TYPE_CHOICES,
+        'debit_types': DEBIT_TYPE_CHOICES,
+        'credit_codes': Transaction.CREDIT_TYPES,
+        'headers': list(enumerate(headers)),
+        'mapping': [(field, label, mapping.get(field)) for field, label in importer.IMPORT_FIELDS],
+        'missing_date': 'date' not in mapping,
+        'missing_amount': not ({'amount', 'credit', 'debit'} & set(mapping)),
+        'summary': summary,
+        'more_errors': summary['error_count'] - len(summary['errors']),
+    }
+    return render(request, 'accounts/transaction/import/preview.html', context)
+
+
+@login_required
+def transaction_import_commit(request, pastorate_id):
+    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
+    if request.method != 'POST':
+        return redirect('accounts:transaction_import_preview', pastorate_id=pastorate.pk)
+    state = _import_state(request, pastorate)
+    if state is None:
+        messages.error(request, 'Upload a file to import first.')
+        return redirect('accounts:transaction_import', pastorate_id=pastorate.pk)
+
+    try:
+        created, error_count = _importer(request, pastorate, state).commit(
+            importer.upload_path(state['file']),
+            skip_invalid=bool(request.POST.get('skip_invalid')),
+        )
+    except importer.ImportFileError as e:
+        messages.error(request, str(e))
+        return redirect('accounts:transaction_import_preview', pastorate_id=pastorate.pk)
+    except Exception as e:
+        logger.exception('transaction import failed pastorate=%s', pastorate.pk)
+        messages.error(request, f'Error importing transactions: {str(e)}')
+        return redirect('accounts:transaction_import_preview', pastorate_id=pastorate.pk)
+
+    if error_count and not created:
+        messages.error(request, 'The file has rows with errors. Correct them or choose to skip them.')
+        return redirect('accounts:transaction_import_preview', pastorate_id=pastorate.pk)
+
+    importer.discard_upload(state['file'])
+    del request.session[SESSION_KEY]
+    logger.info('transaction import pastorate=%s file=%s created=%s skipped_errors=%s',
+                pastorate.pk, state['name'], created, error_count)
+    message = f'{created} transactions imported from {state["name"]}.'
+    if error_count:
+        message += f' {error_count} errors were skipped.'
+    messages.success(request, message)
+    return redirect('accounts:pastorate_detail', pk=pastorate.pk)
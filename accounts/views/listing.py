@@ -0,0 +1,227 @@
+"""
+One list engine for every transaction type.
+
+Each ``*_list`` view is an entry in ``TRANSACTION_LISTS`` describing what
+differs between them: the type, template, related rows, search fields and
+which filters apply.  Pages are selected with keyset cursors on
+(date, created_at, id) over the (pastorate, transaction_type, date) index, so
+a deep page of a large receipt book costs the same as the first one.  The
+total is a bounded count; set ``'count': False`` on an entry to skip it.
+Exports stream the same filtered rows, oldest first, as CSV or XLSX.
+"""
+from django.db.models import Q
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+from ..models import Transaction
+from .. import lookups
+from ..export import export_response, EXPORT_CHUNK_SIZE
+from ..pagination import paginate_keyset, approximate_count
+from ..search import search_q
+from congregation.models import Pastorate, Church
+
+LIST_ORDERING = ['-date', '-created_at', '-id']
+LIST_PAGE_SIZE = 10
+# Lists are counted up to this many rows, then shown as "1000+"
+LIST_COUNT_LIMIT = 1000
+
+# Query parameters that move between pages rather than filter them
+PAGE_PARAMS = ('cursor', 'before', 'page')
+
+CATEGORY_SEARCH = ('primary_category__name', 'secondary_category__name')
+
+# Exports run oldest first, the order a year-end file is read in
+EXPORT_ORDERING = ['date', 'created_at', 'id']
+CATEGORY_COLUMNS = (
+    ('Primary Category', 'primary_category__name'),
+    ('Secondary Category', 'secondary_category__name'),
+)
+
+REFERENCE_COLUMNS = (
+    ('Date', 'date'), ('Reference', 'reference_number'), ('Account', 'account__name'),
+) + CATEGORY_COLUMNS + (('Description', 'description'), ('Amount', 'amount'))
+
+TRANSACTION_LISTS = {
+    'receipt': {
+        'template': 'accounts/transaction/receipts/list.html',
+        'context_name': 'receipts',
+        'select_related': ('account', 'created_by', 'primary_category', 'secondary_category'),
+        'search_fields': ('receipt_number', 'family_name', 'member_name', 'description') + CATEGORY_SEARCH,
+        'category_type': 'credit',
+        'export_columns': (
+            ('Date', 'date'), ('Receipt Number', 'receipt_number'), ('Family', 'family_name'),
+            ('Member', 'member_name'), ('Account', 'account__name'),
+        ) + CATEGORY_COLUMNS + (('Description', 'description'), ('Amount', 'amount')),
+    },
+    'bill': {
+        'template': 'accounts/transaction/bills/list.html',
+        'context_name': 'bills',
+        'select_related': ('account', 'created_by', 'primary_category', 'secondary_category'),
+        'search_fields': ('reference_number', 'description') + CATEGORY_SEARCH,
+        'category_type': 'debit',
+        'export_columns': REFERENCE_COLUMNS,
+    },
+    'aqudence': {
+        'template': 'accounts/transaction/aqudence/list.html',
+        'context_name': 'aqudences',
+        'select_related': ('account', 'created_by', 'primary_category', 'secondary_category'),
+        'search_fields': ('reference_number', 'description') + CATEGORY_SEARCH,
+        'category_type': 'debit',
+        'export_columns': REFERENCE_COLUMNS,
+    },
+    'offering': {
+        'template': 'accounts/transaction/offerings/list.html',
+        'context_name': 'offerings',
+        'select_related': ('account', 'church', 'created_by', 'primary_category', 'secondary_category'),
+        'search_fields': ('reference_number', 'description') + CATEGORY_SEARCH,
+        'category_type': 'credit',
+        'church_filter': True,
+        'export_columns': (
+            ('Date', 'date'), ('Reference', 'reference_number'), ('Church', 'church__church_name'),
+            ('Account', 'account__name'),
+        ) + CATEGORY_COLUMNS + (('Description', 'description'), ('Amount', 'amount')),
+    },
+    'custom_debit': {
+        'template': 'accounts/transaction/custom/debit/list.html',
+        'context_name': 'debits',
+        'select_related': ('account', 'created_by', 'primary_category', 'secondary_category'),
+        'search_fields': ('reference_number', 'description') + CATEGORY_SEARCH,
+        'category_type': 'debit',
+        'export_columns': REFERENCE_COLUMNS,
+    },
+    'custom_credit': {
+        'template': 'accounts/transaction/custom/credit/list.html',
+        'context_name': 'credits',
+        'select_related': ('account', 'created_by', 'primary_category', 'secondary_category'),
+        'search_fields': ('reference_number', 'description') + CATEGORY_SEARCH,
+        'category_type': 'credit',
+        'export_columns': REFERENCE_COLUMNS,
+    },
+    # Transfers list only their debit legs; the account filter matches either side
+    'contra': {
+        'template': 'accounts/transaction/contra/list.html',
+        'context_name': 'transactions',
+        'select_related': ('account__church', 'to_account__church', 'created_by'),
+        'search_fields': ('reference_number', 'description'),
+        'account_fields': ('account', 'to_account'),
+        'export_columns': (
+            ('Date', 'date'), ('Reference', 'reference_number'), ('From Account', 'account__name'),
+            ('To Account', 'to_account__name'), ('Description', 'description'), ('Amount', 'amount'),
+        ),
+    },
+    'intra': {
+        'template': 'accounts/transaction/intra/list.html',
+        'context_name': 'transactions',
+        'select_related': ('account__church', 'to_account__church', 'primary_category', 'secondary_category', 'created_by'),
+        'search_fields': ('reference_number', 'description'),
+        'account_fields': ('account', 'to_account'),
+        'export_columns': (
+            ('Date', 'date'), ('Reference', 'reference_number'), ('From Account', 'account__name'),
+            ('To Account', 'to_account__name'),
+        ) + CATEGORY_COLUMNS + (('Description', 'description'), ('Amount', 'amount')),
+    },
+}
+
+
+def _any_of(lookups, value):
+    condition = Q()
+    for lookup in lookups:
+        condition |= Q(**{lookup: value})
+    return condition
+
+
+def filter_transactions(request, pastorate, transaction_type):
+    """The pastorate's transactions of one type with the request's filters applied"""
+    config = TRANSACTION_LISTS[transaction_type]
+    transactions = Transaction.objects.filter(
+        pastorate=pastorate,
+        transaction_type=transaction_type,
+    ).select_related(*config['select_related'])
+
+    filters = {
+        'search_query': request.GET.get('search', ''),
+        'start_date': request.GET.get('start_date'),
+        'end_date': request.GET.get('end_date'),
+        'selected_account': request.GET.get('account'),
+    }
+
+    # Search functionality
+    if filters['search_query']:
+        transactions = transactions.filter(search_q(filters['search_query'], config['search_fields']))
+
+    # Date filter
+    if filters['start_date'] and filters['end_date']:
+        transactions = transactions.filter(date__range=[filters['start_date'], filters['end_date']])
+
+    # Account filter
+    if filters['selected_account']:
+        transactions = transactions.filter(_any_of(
+            [f'{field}_id' for field in config.get('account_fields', ('account',))], filters['selected_account']
+        ))
+
+    # Church filter
+    if config.get('church_filter'):
+        filters['selected_church'] = request.GET.get('church')
+        if filters['selected_church']:
+            transactions = transactions.filter(church_id=filters['selected_church'])
+
+    # Category filters
+    if config.get('category_type'):
+        filters['selected_primary_category'] = request.GET.get('primary_category')
+        filters['selected_secondary_category'] = request.GET.get('secondary_category')
+        if filters['selected_primary_category']:
+            transactions = transactions.filter(primary_category_id=filters['selected_primary_category'])
+        if filters['selected_secondary_category']:
+            transactions = transactions.filter(secondary_category_id=filters['selected_secondary_category'])
+
+    return transactions, filters
+
+
+def render_transaction_list(request, pastorate_id, transaction_type):
+    """Render the keyset-paginated list page of one transaction type"""
+    config = TRANSACTION_LISTS[transaction_type]
+    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
+    transactions, filters = filter_transactions(request, pastorate, transaction_type)
+
+    page = paginate_keyset(
+        transactions, LIST_ORDERING,
+        cursor=request.GET.get('cursor'),
+        before=request.GET.get('before'),
+        per_page=config.get('per_page', LIST_PAGE_SIZE),
+    )
+    total, total_exact = None, True
+    if config.get('count', True):
+        total, total_exact = approximate_count(transactions, LIST_COUNT_LIMIT)
+
+    # Filters carried over to the next/previous page links
+    page_query = request.GET.copy()
+    for param in PAGE_PARAMS:
+        page_query.pop(param, None)
+
+    context = {
+        'pastorate': pastorate,
+        config['context_name']: page,
+        'page': page,
+        'page_query': page_query.urlencode(),
+        'export_url': reverse(f'accounts:{transaction_type}_export', args=[pastorate.pk]),
+        'total_count': total,
+        'total_count_exact': total_exact,
+        'accounts': lookups.pastorate_accounts(pastorate),
+        **filters,
+    }
+    if config.get('category_type'):
+        context['primary_categories'] = lookups.primary_categories(config['category_type'])
+        context['secondary_categories'] = lookups.secondary_categories(config['category_type'])
+    if config.get('church_filter'):
+        context['churches'] = Church.objects.filter(pastorate=pastorate).order_by('church_name')
+    return render(request, config['template'], context)
+
+
+def export_transaction_list(request, pastorate_id, transaction_type):
+    """Stream the filtered transactions of one type as CSV or XLSX"""
+    config = TRANSACTION_LISTS[transaction_type]
+    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
+    transactions, _ = filter_transactions(request, pastorate, transaction_type)
+
+    labels, fields = zip(*config['export_columns'])
+    rows = transactions.order_by(*EXPORT_ORDERING).values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return export_response(request, f'{pastorate.pastorate_short_name}_{transaction_type}', labels, rows)
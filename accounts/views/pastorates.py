@@ -1,8 +1,16 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.utils import timezone
+from datetime import datetime
+import logging
 from congregation.models import Pastorate, Church
 from ..models import Account, AccountType
+from .. import ledger, lookups
+from ..consolidated import consolidated_report, report_sections
+from ..export import export_filename, report_format, report_pdf_response, report_xlsx_response
+
+logger = logging.getLogger('ecclesia.reports')
 
 @login_required
 def pastorate_list(request):
@@ -31,6 +39,44 @@ def pastorate_detail(request, pk):
     }
     return render(request, 'accounts/pastorate/pastorate_detail.html', context)
 
+@login_required
+def pastorate_report(request, pk):
+    """Consolidated income and expenditure of all accounts of a pastorate"""
+    pastorate = get_object_or_404(Pastorate, pk=pk)
+
+    # Default to the current fiscal year up to today
+    today = timezone.localdate()
+    try:
+        start_date = datetime.strptime(request.GET.get('start_date'), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.GET.get('end_date'), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        if 'start_date' in request.GET or 'end_date' in request.GET:
+            messages.error(request, 'Invalid date range provided')
+        start_date, end_date = ledger.period_start(today, 'fiscal_year'), today
+    if start_date > end_date:
+        messages.error(request, 'The start date must not be after the end date')
+        start_date, end_date = end_date, start_date
+
+    report = consolidated_report(pastorate, start_date, end_date)
+    logger.debug('pastorate report pastorate=%s start=%s end=%s income=%s expenses=%s',
+                 pastorate.pk, start_date, end_date, report['total_income'], report['total_expenses'])
+
+    export = report_format(request)
+    if export:
+        title = f"{pastorate.pastorate_name} - Consolidated Income and Expenditure"
+        subtitle = f"{start_date:%d/%m/%Y} to {end_date:%d/%m/%Y}"
+        filename = export_filename(f"{pastorate.pastorate_short_name} consolidated report", export)
+        respond = report_pdf_response if export == 'pdf' else report_xlsx_response
+        return respond(filename, title, subtitle, report_sections(report))
+
+    context = {
+        'pastorate': pastorate,
+        'start_date': start_date,
+        'end_date': end_date,
+        'report': report,
+    }
+    return render(request, 'accounts/pastorate/report.html', context)
+
 @login_required
 def pastorate_account_add(request, pastorate_id):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
@@ -56,7 +102,7 @@ def pastorate_account_add(request, pastorate_id):
         except Exception as e:
             messages.error(request, f'Error creating account: {str(e)}')
     
-    account_types = AccountType.objects.all().order_by('name')
+    account_types = lookups.account_types()
     context = {
         'pastorate': pastorate,
         'account_types': account_types,
@@ -1,110 +1,46 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from django.core.paginator import Paginator
 from django.utils import timezone
+from django.db import transaction as db_transaction
 from ..models import Transaction, Account, PrimaryCategory, SecondaryCategory
-from congregation.models import Pastorate, Church, Family, Member
-from decimal import Decimal
+from .. import ledger, lookups
+from .listing import render_transaction_list, export_transaction_list
+from congregation.models import Pastorate, Church
+from decimal import Decimal, InvalidOperation
 from django.http import Http404
+from django.core.exceptions import ValidationError
+import logging
+import uuid
+
+logger = logging.getLogger('ecclesia.ledger')
+
+
+def paired_entry(transaction, queryset=None):
+    """The other leg of a contra or intra transfer, found through its pair_id"""
+    if transaction.pair_id is None:
+        return None
+    queryset = Transaction.objects.all() if queryset is None else queryset
+    return queryset.filter(pair_id=transaction.pair_id).exclude(pk=transaction.pk).first()
 
 # Receipt Views
 @login_required
 def receipt_list(request, pastorate_id):
-    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
-    
-    # Get all receipt transactions for this pastorate and its churches
-    receipts = Transaction.objects.filter(
-        Q(account__pastorate=pastorate) | Q(account__church__pastorate=pastorate),
-        transaction_type='receipt'
-    ).select_related(
-        'account',
-        'created_by',
-        'primary_category',
-        'secondary_category'
-    ).order_by('-date')
-
-    # Print debug information
-    print("\nDEBUG - Receipt List:")
-    print(f"Pastorate: {pastorate.pastorate_name}")
-    print(f"Total receipts found: {receipts.count()}")
-    print("Receipt details:")
-    for receipt in receipts:
-        print(f"- {receipt.date}: {receipt.amount} ({receipt.account.name})")
-
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        receipts = receipts.filter(
-            Q(receipt_number__icontains=search_query) |
-            Q(family_name__icontains=search_query) |
-            Q(member_name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(primary_category__name__icontains=search_query) |
-            Q(secondary_category__name__icontains=search_query)
-        )
+    return render_transaction_list(request, pastorate_id, 'receipt')
 
-    # Date filter
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    if start_date and end_date:
-        receipts = receipts.filter(date__range=[start_date, end_date])
-
-    # Account filter
-    account_id = request.GET.get('account')
-    if account_id:
-        receipts = receipts.filter(account_id=account_id)
-
-    # Category filters
-    primary_category_id = request.GET.get('primary_category')
-    secondary_category_id = request.GET.get('secondary_category')
-    if primary_category_id:
-        receipts = receipts.filter(primary_category_id=primary_category_id)
-    if secondary_category_id:
-        receipts = receipts.filter(secondary_category_id=secondary_category_id)
-
-    # Pagination
-    paginator = Paginator(receipts, 10)  # Show 10 receipts per page
-    page = request.GET.get('page')
-    receipts = paginator.get_page(page)
-
-    # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
-
-    context = {
-        'pastorate': pastorate,
-        'receipts': receipts,
-        'accounts': accounts,
-        'primary_categories': PrimaryCategory.objects.filter(transaction_type='credit'),
-        'secondary_categories': SecondaryCategory.objects.filter(primary_category__transaction_type='credit'),
-        'search_query': search_query,
-        'start_date': start_date,
-        'end_date': end_date,
-        'selected_account': account_id,
-        'selected_primary_category': primary_category_id,
-        'selected_secondary_category': secondary_category_id,
-    }
-    return render(request, 'accounts/transaction/receipts/list.html', context)
+@login_required
+def receipt_export(request, pastorate_id):
+    return export_transaction_list(request, pastorate_id, 'receipt')
 
 @login_required
 def receipt_add(request, pastorate_id):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
-    
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='credit')
-    secondary_categories = SecondaryCategory.objects.filter(primary_category__transaction_type='credit')
+    accounts = lookups.pastorate_accounts(pastorate)
     
-    # Get all families from churches in this pastorate
-    families = Family.objects.filter(area__church__pastorate=pastorate).select_related('area', 'area__church')
-    # Get all members from these families
-    members = Member.objects.filter(family__area__church__pastorate=pastorate).select_related('family')
+    primary_categories = lookups.primary_categories('credit')
+    secondary_categories = lookups.secondary_categories('credit')
 
     if request.method == 'POST':
         try:
@@ -148,8 +84,6 @@ def receipt_add(request, pastorate_id):
         'accounts': accounts,
         'primary_categories': primary_categories,
         'secondary_categories': secondary_categories,
-        'families': families,
-        'members': members,
         'today': timezone.now()
     }
     return render(request, 'accounts/transaction/receipts/add.html', context)
@@ -188,21 +122,11 @@ def receipt_edit(request, pastorate_id, pk):
     )
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
-    
-    # Get all families from churches in this pastorate
-    families = Family.objects.filter(area__church__pastorate=pastorate).select_related('area', 'area__church', 'respect')
-    # Get all members from these families
-    members = Member.objects.filter(family__area__church__pastorate=pastorate).select_related('family', 'respect')
+    accounts = lookups.pastorate_accounts(pastorate)
     
     # Get categories
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='credit')
-    secondary_categories = SecondaryCategory.objects.filter(
-        Q(primary_category=transaction.primary_category) |
-        Q(primary_category__transaction_type='credit')
-    ).select_related('primary_category').distinct()
+    primary_categories = lookups.primary_categories('credit')
+    secondary_categories = lookups.secondary_categories('credit', include=transaction.primary_category_id)
 
     if request.method == 'POST':
         try:
@@ -242,8 +166,6 @@ def receipt_edit(request, pastorate_id, pk):
         'pastorate': pastorate,
         'transaction': transaction,
         'accounts': accounts,
-        'families': families,
-        'members': members,
         'primary_categories': primary_categories,
         'secondary_categories': secondary_categories,
     }
@@ -270,84 +192,21 @@ def receipt_delete(request, pastorate_id, pk):
 
 @login_required
 def bill_list(request, pastorate_id):
-    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
-    
-    # Get all bill transactions for this pastorate and its churches
-    bills = Transaction.objects.filter(
-        Q(account__pastorate=pastorate) | Q(account__church__pastorate=pastorate),
-        transaction_type='bill'
-    ).select_related(
-        'account',
-        'created_by',
-        'primary_category',
-        'secondary_category'
-    ).order_by('-date')
-
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        bills = bills.filter(
-            Q(reference_number__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(primary_category__name__icontains=search_query) |
-            Q(secondary_category__name__icontains=search_query)
-        )
-
-    # Date filter
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    if start_date and end_date:
-        bills = bills.filter(date__range=[start_date, end_date])
-
-    # Account filter
-    account_id = request.GET.get('account')
-    if account_id:
-        bills = bills.filter(account_id=account_id)
-
-    # Category filters
-    primary_category_id = request.GET.get('primary_category')
-    secondary_category_id = request.GET.get('secondary_category')
-    if primary_category_id:
-        bills = bills.filter(primary_category_id=primary_category_id)
-    if secondary_category_id:
-        bills = bills.filter(secondary_category_id=secondary_category_id)
-
-    # Pagination
-    paginator = Paginator(bills, 10)  # Show 10 bills per page
-    page = request.GET.get('page')
-    bills = paginator.get_page(page)
+    return render_transaction_list(request, pastorate_id, 'bill')
 
-    # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
-
-    context = {
-        'pastorate': pastorate,
-        'bills': bills,
-        'accounts': accounts,
-        'primary_categories': PrimaryCategory.objects.filter(transaction_type='debit'),
-        'secondary_categories': SecondaryCategory.objects.filter(primary_category__transaction_type='debit'),
-        'search_query': search_query,
-        'start_date': start_date,
-        'end_date': end_date,
-        'selected_account': account_id,
-        'selected_primary_category': primary_category_id,
-        'selected_secondary_category': secondary_category_id,
-    }
-    return render(request, 'accounts/transaction/bills/list.html', context)
+@login_required
+def bill_export(request, pastorate_id):
+    return export_transaction_list(request, pastorate_id, 'bill')
 
 @login_required
 def bill_add(request, pastorate_id):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
     
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='debit')
-    secondary_categories = SecondaryCategory.objects.filter(primary_category__transaction_type='debit')
+    primary_categories = lookups.primary_categories('debit')
+    secondary_categories = lookups.secondary_categories('debit')
 
     if request.method == 'POST':
         try:
@@ -424,17 +283,12 @@ def bill_edit(request, pastorate_id, pk):
     )
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
     
     # Get categories
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='debit')
+    primary_categories = lookups.primary_categories('debit')
     # Get all secondary categories for the current primary category and other debit categories
-    secondary_categories = SecondaryCategory.objects.filter(
-        Q(primary_category=transaction.primary_category) |
-        Q(primary_category__transaction_type='debit')
-    ).select_related('primary_category').distinct()
+    secondary_categories = lookups.secondary_categories('debit', include=transaction.primary_category_id)
 
     if request.method == 'POST':
         try:
@@ -497,92 +351,21 @@ def bill_delete(request, pastorate_id, pk):
 # Aqudence Views
 @login_required
 def aqudence_list(request, pastorate_id):
-    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
-    
-    # Get all aqudence transactions for this pastorate and its churches
-    aqudences = Transaction.objects.filter(
-        Q(account__pastorate=pastorate) | Q(account__church__pastorate=pastorate),
-        transaction_type='aqudence'
-    ).select_related(
-        'account',
-        'created_by',
-        'primary_category',
-        'secondary_category'
-    ).order_by('-date')
-
-    # Print debug information
-    print("\nDEBUG - Aqudence List:")
-    print(f"Pastorate: {pastorate.pastorate_name}")
-    print(f"Total aqudence entries found: {aqudences.count()}")
-    print("Aqudence details:")
-    for entry in aqudences:
-        print(f"- {entry.date}: {entry.amount} ({entry.account.name})")
-
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        aqudences = aqudences.filter(
-            Q(reference_number__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(primary_category__name__icontains=search_query) |
-            Q(secondary_category__name__icontains=search_query)
-        )
-
-    # Date filter
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    if start_date and end_date:
-        aqudences = aqudences.filter(date__range=[start_date, end_date])
-
-    # Account filter
-    account_id = request.GET.get('account')
-    if account_id:
-        aqudences = aqudences.filter(account_id=account_id)
-
-    # Category filters
-    primary_category_id = request.GET.get('primary_category')
-    secondary_category_id = request.GET.get('secondary_category')
-    if primary_category_id:
-        aqudences = aqudences.filter(primary_category_id=primary_category_id)
-    if secondary_category_id:
-        aqudences = aqudences.filter(secondary_category_id=secondary_category_id)
-
-    # Pagination
-    paginator = Paginator(aqudences, 10)  # Show 10 aqudence entries per page
-    page = request.GET.get('page')
-    aqudences = paginator.get_page(page)
+    return render_transaction_list(request, pastorate_id, 'aqudence')
 
-    # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
-
-    context = {
-        'pastorate': pastorate,
-        'aqudences': aqudences,
-        'accounts': accounts,
-        'primary_categories': PrimaryCategory.objects.filter(transaction_type='debit'),
-        'secondary_categories': SecondaryCategory.objects.filter(primary_category__transaction_type='debit'),
-        'search_query': search_query,
-        'start_date': start_date,
-        'end_date': end_date,
-        'selected_account': account_id,
-        'selected_primary_category': primary_category_id,
-        'selected_secondary_category': secondary_category_id,
-    }
-    return render(request, 'accounts/transaction/aqudence/list.html', context)
+@login_required
+def aqudence_export(request, pastorate_id):
+    return export_transaction_list(request, pastorate_id, 'aqudence')
 
 @login_required
 def aqudence_add(request, pastorate_id):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
     
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='debit')
-    secondary_categories = SecondaryCategory.objects.filter(primary_category__transaction_type='debit')
+    primary_categories = lookups.primary_categories('debit')
+    secondary_categories = lookups.secondary_categories('debit')
 
     if request.method == 'POST':
         try:
@@ -659,17 +442,12 @@ def aqudence_edit(request, pastorate_id, pk):
     )
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
     
     # Get categories
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='debit')
+    primary_categories = lookups.primary_categories('debit')
     # Get all secondary categories for the current primary category and other debit categories
-    secondary_categories = SecondaryCategory.objects.filter(
-        Q(primary_category=transaction.primary_category) |
-        Q(primary_category__transaction_type='debit')
-    ).select_related('primary_category').distinct()
+    secondary_categories = lookups.secondary_categories('debit', include=transaction.primary_category_id)
 
     if request.method == 'POST':
         try:
@@ -732,88 +510,24 @@ def aqudence_delete(request, pastorate_id, pk):
 # Offering Views
 @login_required
 def offering_list(request, pastorate_id):
-    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
-    
-    # Get all offering transactions for this pastorate and its churches
-    offerings = Transaction.objects.filter(
-        Q(account__pastorate=pastorate) | Q(account__church__pastorate=pastorate),
-        transaction_type='offering'
-    ).select_related(
-        'account',
-        'church',
-        'created_by',
-        'primary_category',
-        'secondary_category'
-    ).order_by('-date')
-
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        offerings = offerings.filter(
-            Q(reference_number__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(primary_category__name__icontains=search_query) |
-            Q(secondary_category__name__icontains=search_query)
-        )
+    return render_transaction_list(request, pastorate_id, 'offering')
 
-    # Date filter
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    if start_date and end_date:
-        offerings = offerings.filter(date__range=[start_date, end_date])
-
-    # Account filter
-    account_id = request.GET.get('account')
-    if account_id:
-        offerings = offerings.filter(account_id=account_id)
-
-    # Category filters
-    primary_category_id = request.GET.get('primary_category')
-    secondary_category_id = request.GET.get('secondary_category')
-    if primary_category_id:
-        offerings = offerings.filter(primary_category_id=primary_category_id)
-    if secondary_category_id:
-        offerings = offerings.filter(secondary_category_id=secondary_category_id)
-
-    # Pagination
-    paginator = Paginator(offerings, 10)  # Show 10 offerings per page
-    page = request.GET.get('page')
-    offerings = paginator.get_page(page)
-
-    # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
-
-    context = {
-        'pastorate': pastorate,
-        'offerings': offerings,
-        'accounts': accounts,
-        'primary_categories': PrimaryCategory.objects.filter(transaction_type='credit'),
-        'secondary_categories': SecondaryCategory.objects.filter(primary_category__transaction_type='credit'),
-        'search_query': search_query,
-        'start_date': start_date,
-        'end_date': end_date,
-        'selected_account': account_id,
-        'selected_primary_category': primary_category_id,
-        'selected_secondary_category': secondary_category_id,
-    }
-    return render(request, 'accounts/transaction/offerings/list.html', context)
+@login_required
+def offering_export(request, pastorate_id):
+    return export_transaction_list(request, pastorate_id, 'offering')
 
 @login_required
 def offering_add(request, pastorate_id):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
     
     # Get churches in this pastorate
     churches = Church.objects.filter(pastorate=pastorate).order_by('church_name')
     
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='credit')
-    secondary_categories = SecondaryCategory.objects.filter(primary_category__transaction_type='credit')
+    primary_categories = lookups.primary_categories('credit')
+    secondary_categories = lookups.secondary_categories('credit')
 
     if request.method == 'POST':
         try:
@@ -860,6 +574,108 @@ def offering_add(request, pastorate_id):
     }
     return render(request, 'accounts/transaction/offerings/add.html', context)
 
+@login_required
+def offering_bulk_add(request, pastorate_id):
+    """
+    Record one offering per church of the pastorate in a single submission.
+    Every row is validated first; the valid set is inserted with one
+    bulk_create and each account balance is then updated once.
+    """
+    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
+    churches = list(Church.objects.filter(pastorate=pastorate).order_by('church_name'))
+    accounts = lookups.pastorate_accounts(pastorate)
+    primary_categories = lookups.primary_categories('credit')
+    secondary_categories = lookups.secondary_categories('credit')
+
+    form = {'date': timezone.now().strftime('%Y-%m-%d')}
+    rows = [{'church': church, 'amount': '', 'reference_number': '', 'error': None} for church in churches]
+
+    if request.method == 'POST':
+        form = {
+            'date': request.POST.get('date', ''),
+            'account': request.POST.get('account', ''),
+            'primary_category': request.POST.get('primary_category', ''),
+            'secondary_category': request.POST.get('secondary_category', ''),
+            'description': request.POST.get('description', ''),
+        }
+        errors = []
+        account = next((a for a in accounts if str(a.pk) == form['account']), None)
+        primary_category = next((c for c in primary_categories if str(c.pk) == form['primary_category']), None)
+        secondary_category = next((c for c in secondary_categories if str(c.pk) == form['secondary_category']), None)
+        try:
+            date = Transaction._meta.get_field('date').to_python(form['date'])
+        except ValidationError:
+            date = None
+        if not date:
+            errors.append('Enter a valid date.')
+        if account is None:
+            errors.append('Select an account of this pastorate.')
+        if primary_category is None or secondary_category is None:
+            errors.append('Select a primary and secondary category.')
+        elif secondary_category.primary_category_id != primary_category.pk:
+            errors.append('Selected secondary category does not belong to the selected primary category.')
+
+        transactions = []
+        for row in rows:
+            church_id = row['church'].pk
+            row['amount'] = request.POST.get(f'amount_{church_id}', '').strip()
+            row['reference_number'] = request.POST.get(f'reference_{church_id}', '').strip()
+            if not row['amount']:
+                continue
+            try:
+                amount = Decimal(row['amount'])
+            except InvalidOperation:
+                row['error'] = 'Enter a valid amount.'
+                continue
+            if not amount.is_finite() or amount <= 0:
+                row['error'] = 'Amount must be greater than zero.'
+            elif not row['reference_number']:
+                row['error'] = 'Reference number is required.'
+            else:
+                transactions.append(Transaction(
+                    account=account,
+                    # bulk_create skips the pre_save receiver that sets this
+                    pastorate_id=account.owning_pastorate_id() if account else None,
+                    amount=amount,
+                    date=date,
+                    reference_number=row['reference_number'],
+                    description=form['description'],
+                    transaction_type='offering',
+                    primary_category=primary_category,
+                    secondary_category=secondary_category,
+                    church=row['church'],
+                    created_by=request.user,
+                ))
+        if any(row['error'] for row in rows):
+            errors.append('Correct the highlighted rows.')
+        elif not transactions:
+            errors.append('Enter at least one offering amount.')
+
+        if errors:
+            for error in errors:
+                messages.error(request, error)
+        else:
+            try:
+                with db_transaction.atomic():
+                    Transaction.objects.bulk_create(transactions)
+                    ledger.record_created(transactions)
+                logger.info('bulk offerings pastorate=%s account=%s rows=%s',
+                            pastorate.pk, account.pk, len(transactions))
+                messages.success(request, f'{len(transactions)} offerings created successfully.')
+                return redirect('accounts:offering_list', pastorate_id=pastorate_id)
+            except Exception as e:
+                messages.error(request, f'Error creating offerings: {str(e)}')
+
+    context = {
+        'pastorate': pastorate,
+        'accounts': accounts,
+        'primary_categories': primary_categories,
+        'secondary_categories': secondary_categories,
+        'form': form,
+        'rows': rows,
+    }
+    return render(request, 'accounts/transaction/offerings/bulk_add.html', context)
+
 @login_required
 def offering_detail(request, pastorate_id, pk):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
@@ -893,17 +709,12 @@ def offering_edit(request, pastorate_id, pk):
     )
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
     
     # Get categories
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='credit')
+    primary_categories = lookups.primary_categories('credit')
     # Get all secondary categories for the current primary category and other credit categories
-    secondary_categories = SecondaryCategory.objects.filter(
-        Q(primary_category=transaction.primary_category) |
-        Q(primary_category__transaction_type='credit')
-    ).select_related('primary_category').distinct()
+    secondary_categories = lookups.secondary_categories('credit', include=transaction.primary_category_id)
 
     if request.method == 'POST':
         try:
@@ -965,81 +776,18 @@ def offering_delete(request, pastorate_id, pk):
 
 @login_required
 def custom_debit_list(request, pastorate_id):
-    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
-    
-    # Get all custom debit transactions for this pastorate and its churches
-    debits = Transaction.objects.filter(
-        Q(account__pastorate=pastorate) | Q(account__church__pastorate=pastorate),
-        transaction_type='custom_debit'
-    ).select_related(
-        'account',
-        'created_by',
-        'primary_category',
-        'secondary_category'
-    ).order_by('-date')
-
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        debits = debits.filter(
-            Q(reference_number__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(primary_category__name__icontains=search_query) |
-            Q(secondary_category__name__icontains=search_query)
-        )
-
-    # Date filter
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    if start_date and end_date:
-        debits = debits.filter(date__range=[start_date, end_date])
-
-    # Account filter
-    account_id = request.GET.get('account')
-    if account_id:
-        debits = debits.filter(account_id=account_id)
-
-    # Category filters
-    primary_category_id = request.GET.get('primary_category')
-    secondary_category_id = request.GET.get('secondary_category')
-    if primary_category_id:
-        debits = debits.filter(primary_category_id=primary_category_id)
-    if secondary_category_id:
-        debits = debits.filter(secondary_category_id=secondary_category_id)
-
-    # Pagination
-    paginator = Paginator(debits, 10)  # Show 10 debits per page
-    page = request.GET.get('page')
-    debits = paginator.get_page(page)
+    return render_transaction_list(request, pastorate_id, 'custom_debit')
 
-    # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
-
-    context = {
-        'pastorate': pastorate,
-        'debits': debits,
-        'accounts': accounts,
-        'primary_categories': PrimaryCategory.objects.filter(transaction_type='debit'),
-        'secondary_categories': SecondaryCategory.objects.filter(primary_category__transaction_type='debit'),
-        'search_query': search_query,
-        'start_date': start_date,
-        'end_date': end_date,
-        'selected_account': account_id,
-        'selected_primary_category': primary_category_id,
-        'selected_secondary_category': secondary_category_id,
-    }
-    return render(request, 'accounts/transaction/custom/debit/list.html', context)
+@login_required
+def custom_debit_export(request, pastorate_id):
+    return export_transaction_list(request, pastorate_id, 'custom_debit')
 
 @login_required
 def custom_debit_add(request, pastorate_id):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
 
     if request.method == 'POST':
         try:
@@ -1077,8 +825,8 @@ def custom_debit_add(request, pastorate_id):
     context = {
         'pastorate': pastorate,
         'accounts': accounts,
-        'primary_categories': PrimaryCategory.objects.filter(transaction_type='debit'),
-        'secondary_categories': SecondaryCategory.objects.filter(primary_category__transaction_type='debit'),
+        'primary_categories': lookups.primary_categories('debit'),
+        'secondary_categories': lookups.secondary_categories('debit'),
         'today': timezone.now()
     }
     return render(request, 'accounts/transaction/custom/debit/add.html', context)
@@ -1117,9 +865,7 @@ def custom_debit_edit(request, pastorate_id, pk):
     )
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
 
     if request.method == 'POST':
         try:
@@ -1152,12 +898,9 @@ def custom_debit_edit(request, pastorate_id, pk):
             messages.error(request, f'Error updating custom debit: {str(e)}')
 
     # Get categories
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='debit')
+    primary_categories = lookups.primary_categories('debit')
     # Get all secondary categories for the current primary category and other debit categories
-    secondary_categories = SecondaryCategory.objects.filter(
-        Q(primary_category=transaction.primary_category) |
-        Q(primary_category__transaction_type='debit')
-    ).select_related('primary_category').distinct()
+    secondary_categories = lookups.secondary_categories('debit', include=transaction.primary_category_id)
 
     context = {
         'pastorate': pastorate,
@@ -1189,81 +932,18 @@ def custom_debit_delete(request, pastorate_id, pk):
 
 @login_required
 def custom_credit_list(request, pastorate_id):
-    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
-    
-    # Get all custom credit transactions for this pastorate and its churches
-    credits = Transaction.objects.filter(
-        Q(account__pastorate=pastorate) | Q(account__church__pastorate=pastorate),
-        transaction_type='custom_credit'
-    ).select_related(
-        'account',
-        'created_by',
-        'primary_category',
-        'secondary_category'
-    ).order_by('-date')
-
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        credits = credits.filter(
-            Q(reference_number__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(primary_category__name__icontains=search_query) |
-            Q(secondary_category__name__icontains=search_query)
-        )
-
-    # Date filter
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    if start_date and end_date:
-        credits = credits.filter(date__range=[start_date, end_date])
-
-    # Account filter
-    account_id = request.GET.get('account')
-    if account_id:
-        credits = credits.filter(account_id=account_id)
-
-    # Category filters
-    primary_category_id = request.GET.get('primary_category')
-    secondary_category_id = request.GET.get('secondary_category')
-    if primary_category_id:
-        credits = credits.filter(primary_category_id=primary_category_id)
-    if secondary_category_id:
-        credits = credits.filter(secondary_category_id=secondary_category_id)
-
-    # Pagination
-    paginator = Paginator(credits, 10)  # Show 10 credits per page
-    page = request.GET.get('page')
-    credits = paginator.get_page(page)
-
-    # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    return render_transaction_list(request, pastorate_id, 'custom_credit')
 
-    context = {
-        'pastorate': pastorate,
-        'credits': credits,
-        'accounts': accounts,
-        'primary_categories': PrimaryCategory.objects.filter(transaction_type='credit'),
-        'secondary_categories': SecondaryCategory.objects.filter(primary_category__transaction_type='credit'),
-        'search_query': search_query,
-        'start_date': start_date,
-        'end_date': end_date,
-        'selected_account': account_id,
-        'selected_primary_category': primary_category_id,
-        'selected_secondary_category': secondary_category_id,
-    }
-    return render(request, 'accounts/transaction/custom/credit/list.html', context)
+@login_required
+def custom_credit_export(request, pastorate_id):
+    return export_transaction_list(request, pastorate_id, 'custom_credit')
 
 @login_required
 def custom_credit_add(request, pastorate_id):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
 
     if request.method == 'POST':
         try:
@@ -1301,8 +981,8 @@ def custom_credit_add(request, pastorate_id):
     context = {
         'pastorate': pastorate,
         'accounts': accounts,
-        'primary_categories': PrimaryCategory.objects.filter(transaction_type='credit'),
-        'secondary_categories': SecondaryCategory.objects.filter(primary_category__transaction_type='credit'),
+        'primary_categories': lookups.primary_categories('credit'),
+        'secondary_categories': lookups.secondary_categories('credit'),
         'today': timezone.now()
     }
     return render(request, 'accounts/transaction/custom/credit/add.html', context)
@@ -1341,9 +1021,7 @@ def custom_credit_edit(request, pastorate_id, pk):
     )
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
 
     if request.method == 'POST':
         try:
@@ -1376,12 +1054,9 @@ def custom_credit_edit(request, pastorate_id, pk):
             messages.error(request, f'Error updating custom credit: {str(e)}')
 
     # Get categories
-    primary_categories = PrimaryCategory.objects.filter(transaction_type='credit')
+    primary_categories = lookups.primary_categories('credit')
     # Get all secondary categories for the current primary category and other credit categories
-    secondary_categories = SecondaryCategory.objects.filter(
-        Q(primary_category=transaction.primary_category) |
-        Q(primary_category__transaction_type='credit')
-    ).select_related('primary_category').distinct()
+    secondary_categories = lookups.secondary_categories('credit', include=transaction.primary_category_id)
 
     context = {
         'pastorate': pastorate,
@@ -1413,68 +1088,18 @@ def custom_credit_delete(request, pastorate_id, pk):
 
 @login_required
 def contra_list(request, pastorate_id):
-    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
-    
-    # Get only contra debit transactions for this pastorate and its churches
-    transactions = Transaction.objects.filter(
-        Q(account__pastorate=pastorate) | Q(account__church__pastorate=pastorate),
-        transaction_type='contra'  # Only get debit entries
-    ).select_related(
-        'account',
-        'to_account',
-        'created_by'
-    ).order_by('-date')
-
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        transactions = transactions.filter(
-            Q(reference_number__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+    return render_transaction_list(request, pastorate_id, 'contra')
 
-    # Date filter
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    if start_date and end_date:
-        transactions = transactions.filter(date__range=[start_date, end_date])
-
-    # Account filter
-    account_id = request.GET.get('account')
-    if account_id:
-        transactions = transactions.filter(
-            Q(account_id=account_id) | Q(to_account_id=account_id)
-        )
-
-    # Pagination
-    paginator = Paginator(transactions, 10)  # Show 10 transactions per page
-    page = request.GET.get('page')
-    transactions = paginator.get_page(page)
-
-    # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
-
-    context = {
-        'pastorate': pastorate,
-        'transactions': transactions,
-        'accounts': accounts,
-        'search_query': search_query,
-        'start_date': start_date,
-        'end_date': end_date,
-        'selected_account': account_id
-    }
-    return render(request, 'accounts/transaction/contra/list.html', context)
+@login_required
+def contra_export(request, pastorate_id):
+    return export_transaction_list(request, pastorate_id, 'contra')
 
 @login_required
 def contra_add(request, pastorate_id):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
 
     if request.method == 'POST':
         try:
@@ -1486,56 +1111,45 @@ def contra_add(request, pastorate_id):
             reference_number = request.POST.get('reference_number')
             description = request.POST.get('description')
 
-            print("\n=== Creating New Contra Entry ===")
-            print(f"From Account: {from_account.id} - {from_account.name}")
-            print(f"To Account: {to_account.id} - {to_account.name}")
-            print(f"Amount: {amount}")
-            print(f"Date: {date}")
-            print(f"Reference: {reference_number}")
-            print(f"Description: {description}")
-
-            # Create the contra transaction (debit entry)
-            debit_transaction = Transaction.objects.create(
-                account=from_account,
-                to_account=to_account,
-                amount=amount,
-                date=date,
-                reference_number=reference_number,
-                description=f"Contra Entry (Debit) - {description}",
-                transaction_type='contra',
-                created_by=request.user
-            )
-            print(f"\nCreated DEBIT entry:")
-            print(f"ID: {debit_transaction.id}")
-            print(f"Type: {debit_transaction.transaction_type}")
-            print(f"From: {debit_transaction.account.id} - {debit_transaction.account.name}")
-            print(f"To: {debit_transaction.to_account.id} - {debit_transaction.to_account.name}")
-            print(f"Reference: {debit_transaction.reference_number}")
-
-            # Create the corresponding credit entry
-            credit_transaction = Transaction.objects.create(
-                account=to_account,
-                from_account=from_account,
-                amount=amount,
-                date=date,
-                reference_number=reference_number,
-                description=f"Contra Entry (Credit) - {description}",
-                transaction_type='contra_credit',
-                created_by=request.user
-            )
-            print(f"\nCreated CREDIT entry:")
-            print(f"ID: {credit_transaction.id}")
-            print(f"Type: {credit_transaction.transaction_type}")
-            print(f"Account: {credit_transaction.account.id} - {credit_transaction.account.name}")
-            print(f"From: {credit_transaction.from_account.id} - {credit_transaction.from_account.name}")
-            print(f"Reference: {credit_transaction.reference_number}")
-            print("=== Contra Entry Creation Complete ===\n")
+            # Both legs commit together; each account balance is updated once
+            with ledger.deferred():
+                # Create the contra transaction (debit entry)
+                pair_id = uuid.uuid4()
+                debit_transaction = Transaction.objects.create(
+                    account=from_account,
+                    to_account=to_account,
+                    amount=amount,
+                    date=date,
+                    reference_number=reference_number,
+                    description=f"Contra Entry (Debit) - {description}",
+                    transaction_type='contra',
+                    pair_id=pair_id,
+                    created_by=request.user
+                )
+
+                # Create the corresponding credit entry
+                credit_transaction = Transaction.objects.create(
+                    account=to_account,
+                    from_account=from_account,
+                    amount=amount,
+                    date=date,
+                    reference_number=reference_number,
+                    description=f"Contra Entry (Credit) - {description}",
+                    transaction_type='contra_credit',
+                    pair_id=pair_id,
+                    created_by=request.user
+                )
+                logger.info(
+                    'contra created debit=%s credit=%s from_account=%s to_account=%s amount=%s reference=%s',
+                    debit_transaction.pk, credit_transaction.pk, from_account.pk, to_account.pk,
+                    amount, reference_number,
+                )
 
             messages.success(request, 'Contra entry created successfully.')
             return redirect('accounts:contra_list', pastorate_id=pastorate_id)
         except Exception as e:
             messages.error(request, f'Error creating contra entry: {str(e)}')
-            print(f"Error in contra creation: {str(e)}")  # Debug log
+            logger.exception('contra create failed pastorate=%s', pastorate_id)
 
     context = {
         'pastorate': pastorate,
@@ -1562,37 +1176,19 @@ def contra_detail(request, pastorate_id, pk):
     except Transaction.DoesNotExist:
         raise Http404("Transaction not found")
     
-    # If this is a credit entry, get the corresponding debit entry
+    other_entry = paired_entry(transaction, Transaction.objects.select_related(
+        'account',
+        'to_account',
+        'from_account',
+        'created_by'
+    ))
+    # If this is a credit entry, show it with its debit entry
     if transaction.transaction_type == 'contra_credit':
-        credit_entry = transaction
-        debit_entry = Transaction.objects.select_related(
-            'account',
-            'to_account',
-            'from_account'
-        ).filter(
-            transaction_type='contra',
-            account=transaction.from_account,
-            to_account=transaction.account,
-            date=transaction.date,
-            amount=transaction.amount
-        ).first()
-        if debit_entry:
-            transaction = debit_entry
-        else:
+        if other_entry is None:
             raise Http404("Corresponding debit entry not found")
-    # If this is a debit entry, get the corresponding credit entry
+        transaction, credit_entry = other_entry, transaction
     else:
-        credit_entry = Transaction.objects.select_related(
-            'account',
-            'to_account',
-            'from_account'
-        ).filter(
-            transaction_type='contra_credit',
-            from_account=transaction.account,
-            to_account=transaction.to_account,
-            date=transaction.date,
-            amount=transaction.amount
-        ).first()
+        credit_entry = other_entry
     
     context = {
         'pastorate': pastorate,
@@ -1615,22 +1211,14 @@ def contra_edit(request, pastorate_id, pk):
     )
     
     # Get the corresponding credit entry
-    credit_entry = Transaction.objects.select_related(
+    credit_entry = paired_entry(transaction, Transaction.objects.select_related(
         'account',
         'to_account',
         'from_account'
-    ).filter(
-        transaction_type='contra_credit',
-        from_account=transaction.account,
-        to_account=transaction.to_account,
-        date=transaction.date,
-        amount=transaction.amount
-    ).first()
+    ))
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
 
     if request.method == 'POST':
         try:
@@ -1642,24 +1230,25 @@ def contra_edit(request, pastorate_id, pk):
             reference_number = request.POST.get('reference_number')
             description = request.POST.get('description')
 
-            # Update the debit transaction
-            transaction.account = from_account
-            transaction.to_account = to_account
-            transaction.amount = amount
-            transaction.date = date
-            transaction.reference_number = reference_number
-            transaction.description = f"Contra Entry (Debit) - {description}"
-            transaction.save()
-
-            # Update the credit transaction
-            if credit_entry:
-                credit_entry.account = to_account
-                credit_entry.from_account = from_account
-                credit_entry.amount = amount
-                credit_entry.date = date
-                credit_entry.reference_number = reference_number
-                credit_entry.description = f"Contra Entry (Credit) - {description}"
-                credit_entry.save()
+            with ledger.deferred():
+                # Update the debit transaction
+                transaction.account = from_account
+                transaction.to_account = to_account
+                transaction.amount = amount
+                transaction.date = date
+                transaction.reference_number = reference_number
+                transaction.description = f"Contra Entry (Debit) - {description}"
+                transaction.save()
+
+                # Update the credit transaction
+                if credit_entry:
+                    credit_entry.account = to_account
+                    credit_entry.from_account = from_account
+                    credit_entry.amount = amount
+                    credit_entry.date = date
+                    credit_entry.reference_number = reference_number
+                    credit_entry.description = f"Contra Entry (Credit) - {description}"
+                    credit_entry.save()
 
             messages.success(request, 'Contra entry updated successfully.')
             return redirect('accounts:contra_list', pastorate_id=pastorate_id)
@@ -1679,68 +1268,24 @@ def contra_delete(request, pastorate_id, pk):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     transaction = get_object_or_404(Transaction, pk=pk, transaction_type='contra')
     
-    print(f"\n=== Deleting Contra Entry ===")
-    print(f"Found debit entry ID: {transaction.id}")
-    print(f"From Account: {transaction.account.id} - {transaction.account.name}")
-    print(f"To Account: {transaction.to_account.id} - {transaction.to_account.name}")
-    print(f"Amount: {transaction.amount}")
-    print(f"Date: {transaction.date}")
-    print(f"Reference: {transaction.reference_number}")
-    
-    # First try to find by reference number and amount
-    credit_entry = Transaction.objects.filter(
-        transaction_type='contra_credit',
-        reference_number=transaction.reference_number,
-        amount=transaction.amount
-    ).first()
-    
-    if credit_entry:
-        print(f"\nFound credit entry by reference and amount:")
-        print(f"ID: {credit_entry.id}")
-        print(f"From: {credit_entry.from_account.id} - {credit_entry.from_account.name}")
-        print(f"To: {credit_entry.account.id} - {credit_entry.account.name}")
-    else:
-        print("\nTrying to find by accounts and amount...")
-        # Try to find by accounts and amount
-        credit_entry = Transaction.objects.filter(
-            transaction_type='contra_credit',
-            from_account=transaction.account,
-            account=transaction.to_account,  # Note: credit entry's account is debit entry's to_account
-            amount=transaction.amount
-        ).first()
-        
-        if credit_entry:
-            print(f"Found credit entry by accounts and amount:")
-            print(f"ID: {credit_entry.id}")
-            print(f"From: {credit_entry.from_account.id} - {credit_entry.from_account.name}")
-            print(f"To: {credit_entry.account.id} - {credit_entry.account.name}")
-        else:
-            print("No matching credit entry found")
-            # Show all contra_credit entries for debugging
-            all_credits = Transaction.objects.filter(transaction_type='contra_credit')
-            print(f"\nAll contra_credit entries in system:")
-            for entry in all_credits:
-                print(f"ID: {entry.id}, From: {entry.from_account.id}, To: {entry.account.id}, Amount: {entry.amount}, Ref: {entry.reference_number}")
+    credit_entry = paired_entry(transaction)
+    if not credit_entry:
+        logger.warning('contra delete found no credit entry debit=%s reference=%s', transaction.pk, transaction.reference_number)
 
     if request.method == 'POST':
         try:
-            # Start by deleting credit entry if it exists
-            if credit_entry:
-                print(f"\nDeleting credit entry: {credit_entry.id}")
-                Transaction.objects.filter(id=credit_entry.id).delete()
-            else:
-                print("\nWarning: No credit entry found to delete")
-            
-            # Then delete the debit entry
-            print(f"Deleting debit entry: {transaction.id}")
-            Transaction.objects.filter(id=transaction.id).delete()
-            print("=== Deletion Complete ===\n")
+            with ledger.deferred():
+                # Both legs go in one statement
+                Transaction.objects.filter(
+                    pk__in=[transaction.pk] + ([credit_entry.pk] if credit_entry else [])
+                ).delete()
+            logger.info('contra deleted debit=%s credit=%s', transaction.pk, credit_entry.pk if credit_entry else None)
             
             messages.success(request, 'Contra entry deleted successfully.')
             return redirect('accounts:contra_list', pastorate_id=pastorate_id)
         except Exception as e:
             messages.error(request, f'Error deleting contra entry: {str(e)}')
-            print(f"Error in deletion: {str(e)}")
+            logger.exception('contra delete failed debit=%s', transaction.pk)
     
     context = {
         'pastorate': pastorate,
@@ -1751,88 +1296,24 @@ def contra_delete(request, pastorate_id, pk):
 
 @login_required
 def intra_list(request, pastorate_id):
-    pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
-    
-    # Get only intra debit transactions for this pastorate and its churches
-    transactions = Transaction.objects.filter(
-        Q(account__pastorate=pastorate) | Q(account__church__pastorate=pastorate),
-        transaction_type='intra'  # Only get debit entries
-    ).select_related(
-        'account',
-        'to_account',
-        'primary_category',
-        'secondary_category',
-        'created_by'
-    ).order_by('-date')
-
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        transactions = transactions.filter(
-            Q(reference_number__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-
-    # Date filter
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    if start_date and end_date:
-        transactions = transactions.filter(date__range=[start_date, end_date])
-
-    # Account filter
-    account_id = request.GET.get('account')
-    if account_id:
-        transactions = transactions.filter(
-            Q(account_id=account_id) | Q(to_account_id=account_id)
-        )
-
-    # Pagination
-    paginator = Paginator(transactions, 10)  # Show 10 transactions per page
-    page = request.GET.get('page')
-    transactions = paginator.get_page(page)
+    return render_transaction_list(request, pastorate_id, 'intra')
 
-    # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
-
-    context = {
-        'pastorate': pastorate,
-        'transactions': transactions,
-        'accounts': accounts,
-        'search_query': search_query,
-        'start_date': start_date,
-        'end_date': end_date,
-        'selected_account': account_id
-    }
-    return render(request, 'accounts/transaction/intra/list.html', context)
+@login_required
+def intra_export(request, pastorate_id):
+    return export_transaction_list(request, pastorate_id, 'intra')
 
 @login_required
 def intra_add(request, pastorate_id):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
 
     # Get all categories regardless of type
-    primary_categories = PrimaryCategory.objects.filter(
-        is_active=True
-    ).order_by('name')
-    
-    # Print for debugging
-    print(f"Found {primary_categories.count()} primary categories")
-    for cat in primary_categories:
-        print(f"Category: {cat.name} (Type: {cat.transaction_type})")
+    primary_categories = lookups.primary_categories(active_only=True)
 
     # Get all secondary categories
-    secondary_categories = SecondaryCategory.objects.filter(
-        is_active=True
-    ).select_related('primary_category').order_by('name')
-    
-    # Print for debugging
-    print(f"Found {secondary_categories.count()} secondary categories")
+    secondary_categories = lookups.secondary_categories(active_only=True)
 
     if request.method == 'POST':
         try:
@@ -1846,38 +1327,49 @@ def intra_add(request, pastorate_id):
             primary_category = get_object_or_404(PrimaryCategory, pk=request.POST.get('primary_category'))
             secondary_category = get_object_or_404(SecondaryCategory, pk=request.POST.get('secondary_category'))
 
-            # Create the intra transaction (debit entry)
-            debit_transaction = Transaction.objects.create(
-                account=from_account,
-                to_account=to_account,
-                amount=amount,
-                date=date,
-                reference_number=reference_number,
-                description=f"Intra Transfer (Debit) - {description}",
-                transaction_type='intra',
-                primary_category=primary_category,
-                secondary_category=secondary_category,
-                created_by=request.user
-            )
-
-            # Create the corresponding credit entry
-            credit_transaction = Transaction.objects.create(
-                account=to_account,
-                from_account=from_account,
-                amount=amount,
-                date=date,
-                reference_number=reference_number,
-                description=f"Intra Transfer (Credit) - {description}",
-                transaction_type='intra_credit',
-                primary_category=primary_category,
-                secondary_category=secondary_category,
-                created_by=request.user
-            )
+            # Both legs commit together; each account balance is updated once
+            with ledger.deferred():
+                # Create the intra transaction (debit entry)
+                pair_id = uuid.uuid4()
+                debit_transaction = Transaction.objects.create(
+                    account=from_account,
+                    to_account=to_account,
+                    amount=amount,
+                    date=date,
+                    reference_number=reference_number,
+                    description=f"Intra Transfer (Debit) - {description}",
+                    transaction_type='intra',
+                    pair_id=pair_id,
+                    primary_category=primary_category,
+                    secondary_category=secondary_category,
+                    created_by=request.user
+                )
+
+                # Create the corresponding credit entry
+                credit_transaction = Transaction.objects.create(
+                    account=to_account,
+                    from_account=from_account,
+                    amount=amount,
+                    date=date,
+                    reference_number=reference_number,
+                    description=f"Intra Transfer (Credit) - {description}",
+                    transaction_type='intra_credit',
+                    pair_id=pair_id,
+                    primary_category=primary_category,
+                    secondary_category=secondary_category,
+                    created_by=request.user
+                )
+                logger.info(
+                    'intra created debit=%s credit=%s from_account=%s to_account=%s amount=%s reference=%s',
+                    debit_transaction.pk, credit_transaction.pk, from_account.pk, to_account.pk,
+                    amount, reference_number,
+                )
 
             messages.success(request, 'Intra transfer created successfully.')
             return redirect('accounts:intra_list', pastorate_id=pastorate_id)
         except Exception as e:
             messages.error(request, f'Error creating intra transfer: {str(e)}')
+            logger.exception('intra create failed pastorate=%s', pastorate_id)
 
     context = {
         'pastorate': pastorate,
@@ -1886,11 +1378,6 @@ def intra_add(request, pastorate_id):
         'secondary_categories': secondary_categories,
         'today': timezone.now()
     }
-    
-    # Add debug info to context
-    context['debug_primary_count'] = primary_categories.count()
-    context['debug_secondary_count'] = secondary_categories.count()
-    
     return render(request, 'accounts/transaction/intra/add.html', context)
 
 @login_required
@@ -1913,41 +1400,21 @@ def intra_detail(request, pastorate_id, pk):
     except Transaction.DoesNotExist:
         raise Http404("Transaction not found")
     
-    # If this is a credit entry, get the corresponding debit entry
+    other_entry = paired_entry(transaction, Transaction.objects.select_related(
+        'account',
+        'to_account',
+        'from_account',
+        'primary_category',
+        'secondary_category',
+        'created_by'
+    ))
+    # If this is a credit entry, show it with its debit entry
     if transaction.transaction_type == 'intra_credit':
-        credit_entry = transaction
-        debit_entry = Transaction.objects.select_related(
-            'account',
-            'to_account',
-            'from_account',
-            'primary_category',
-            'secondary_category'
-        ).filter(
-            transaction_type='intra',
-            account=transaction.from_account,
-            to_account=transaction.account,
-            date=transaction.date,
-            amount=transaction.amount
-        ).first()
-        if debit_entry:
-            transaction = debit_entry
-        else:
+        if other_entry is None:
             raise Http404("Corresponding debit entry not found")
-    # If this is a debit entry, get the corresponding credit entry
+        transaction, credit_entry = other_entry, transaction
     else:
-        credit_entry = Transaction.objects.select_related(
-            'account',
-            'to_account',
-            'from_account',
-            'primary_category',
-            'secondary_category'
-        ).filter(
-            transaction_type='intra_credit',
-            from_account=transaction.account,
-            to_account=transaction.to_account,
-            date=transaction.date,
-            amount=transaction.amount
-        ).first()
+        credit_entry = other_entry
 
     context = {
         'pastorate': pastorate,
@@ -1972,36 +1439,22 @@ def intra_edit(request, pastorate_id, pk):
     )
     
     # Get the corresponding credit entry
-    credit_entry = Transaction.objects.select_related(
+    credit_entry = paired_entry(transaction, Transaction.objects.select_related(
         'account',
         'to_account',
         'from_account',
         'primary_category',
         'secondary_category'
-    ).filter(
-        transaction_type='intra_credit',
-        from_account=transaction.account,
-        to_account=transaction.to_account,
-        date=transaction.date,
-        amount=transaction.amount
-    ).first()
+    ))
     
     # Get all accounts from pastorate and its churches
-    accounts = Account.objects.filter(
-        Q(pastorate=pastorate) | Q(church__pastorate=pastorate)
-    ).select_related('church').order_by('name')
+    accounts = lookups.pastorate_accounts(pastorate)
 
     # Get contra categories
-    primary_categories = PrimaryCategory.objects.filter(
-        transaction_type='contra',
-        is_active=True
-    ).order_by('name')
+    primary_categories = lookups.primary_categories('contra', active_only=True)
 
     # Get all secondary categories for contra primary categories
-    secondary_categories = SecondaryCategory.objects.filter(
-        primary_category__transaction_type='contra',
-        is_active=True
-    ).select_related('primary_category').order_by('name')
+    secondary_categories = lookups.secondary_categories('contra', active_only=True)
 
     if request.method == 'POST':
         try:
@@ -2015,28 +1468,29 @@ def intra_edit(request, pastorate_id, pk):
             primary_category = get_object_or_404(PrimaryCategory, pk=request.POST.get('primary_category'))
             secondary_category = get_object_or_404(SecondaryCategory, pk=request.POST.get('secondary_category'))
 
-            # Update the debit transaction
-            transaction.account = from_account
-            transaction.to_account = to_account
-            transaction.amount = amount
-            transaction.date = date
-            transaction.reference_number = reference_number
-            transaction.description = f"Intra Transfer (Debit) - {description}"
-            transaction.primary_category = primary_category
-            transaction.secondary_category = secondary_category
-            transaction.save()
-
-            # Update the credit transaction
-            if credit_entry:
-                credit_entry.account = to_account
-                credit_entry.from_account = from_account
-                credit_entry.amount = amount
-                credit_entry.date = date
-                credit_entry.reference_number = reference_number
-                credit_entry.description = f"Intra Transfer (Credit) - {description}"
-                credit_entry.primary_category = primary_category
-                credit_entry.secondary_category = secondary_category
-                credit_entry.save()
+            with ledger.deferred():
+                # Update the debit transaction
+                transaction.account = from_account
+                transaction.to_account = to_account
+                transaction.amount = amount
+                transaction.date = date
+                transaction.reference_number = reference_number
+                transaction.description = f"Intra Transfer (Debit) - {description}"
+                transaction.primary_category = primary_category
+                transaction.secondary_category = secondary_category
+                transaction.save()
+
+                # Update the credit transaction
+                if credit_entry:
+                    credit_entry.account = to_account
+                    credit_entry.from_account = from_account
+                    credit_entry.amount = amount
+                    credit_entry.date = date
+                    credit_entry.reference_number = reference_number
+                    credit_entry.description = f"Intra Transfer (Credit) - {description}"
+                    credit_entry.primary_category = primary_category
+                    credit_entry.secondary_category = secondary_category
+                    credit_entry.save()
 
             messages.success(request, 'Intra transfer updated successfully.')
             return redirect('accounts:intra_list', pastorate_id=pastorate_id)
@@ -2058,68 +1512,24 @@ def intra_delete(request, pastorate_id, pk):
     pastorate = get_object_or_404(Pastorate, pk=pastorate_id)
     transaction = get_object_or_404(Transaction, pk=pk, transaction_type='intra')
     
-    print(f"\n=== Deleting Intra Entry ===")
-    print(f"Found debit entry ID: {transaction.id}")
-    print(f"From Account: {transaction.account.id} - {transaction.account.name}")
-    print(f"To Account: {transaction.to_account.id} - {transaction.to_account.name}")
-    print(f"Amount: {transaction.amount}")
-    print(f"Date: {transaction.date}")
-    print(f"Reference: {transaction.reference_number}")
-    
-    # First try to find by reference number and amount
-    credit_entry = Transaction.objects.filter(
-        transaction_type='intra_credit',
-        reference_number=transaction.reference_number,
-        amount=transaction.amount
-    ).first()
-    
-    if credit_entry:
-        print(f"\nFound credit entry by reference and amount:")
-        print(f"ID: {credit_entry.id}")
-        print(f"From: {credit_entry.from_account.id} - {credit_entry.from_account.name}")
-        print(f"To: {credit_entry.account.id} - {credit_entry.account.name}")
-    else:
-        print("\nTrying to find by accounts and amount...")
-        # Try to find by accounts and amount
-        credit_entry = Transaction.objects.filter(
-            transaction_type='intra_credit',
-            from_account=transaction.account,
-            account=transaction.to_account,  # Note: credit entry's account is debit entry's to_account
-            amount=transaction.amount
-        ).first()
-        
-        if credit_entry:
-            print(f"Found credit entry by accounts and amount:")
-            print(f"ID: {credit_entry.id}")
-            print(f"From: {credit_entry.from_account.id} - {credit_entry.from_account.name}")
-            print(f"To: {credit_entry.account.id} - {credit_entry.account.name}")
-        else:
-            print("No matching credit entry found")
-            # Show all intra_credit entries for debugging
-            all_credits = Transaction.objects.filter(transaction_type='intra_credit')
-            print(f"\nAll intra_credit entries in system:")
-            for entry in all_credits:
-                print(f"ID: {entry.id}, From: {entry.from_account.id}, To: {entry.account.id}, Amount: {entry.amount}, Ref: {entry.reference_number}")
+    credit_entry = paired_entry(transaction)
+    if not credit_entry:
+        logger.warning('intra delete found no credit entry debit=%s reference=%s', transaction.pk, transaction.reference_number)
 
     if request.method == 'POST':
         try:
-            # Start by deleting credit entry if it exists
-            if credit_entry:
-                print(f"\nDeleting credit entry: {credit_entry.id}")
-                Transaction.objects.filter(id=credit_entry.id).delete()
-            else:
-                print("\nWarning: No credit entry found to delete")
-            
-            # Then delete the debit entry
-            print(f"Deleting debit entry: {transaction.id}")
-            Transaction.objects.filter(id=transaction.id).delete()
-            print("=== Deletion Complete ===\n")
+            with ledger.deferred():
+                # Both legs go in one statement
+                Transaction.objects.filter(
+                    pk__in=[transaction.pk] + ([credit_entry.pk] if credit_entry else [])
+                ).delete()
+            logger.info('intra deleted debit=%s credit=%s', transaction.pk, credit_entry.pk if credit_entry else None)
             
             messages.success(request, 'Intra transfer deleted successfully.')
             return redirect('accounts:intra_list', pastorate_id=pastorate_id)
         except Exception as e:
             messages.error(request, f'Error deleting intra transfer: {str(e)}')
-            print(f"Error in deletion: {str(e)}")
+            logger.exception('intra delete failed debit=%s', transaction.pk)
     
     context = {
         'pastorate': pastorate,
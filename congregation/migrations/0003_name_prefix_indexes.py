@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:40
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('congregation', '0002_family_position_no'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='family',
+            index=models.Index(django.db.models.functions.comparison.Collate('family_head', 'NOCASE'), name='family_head_nocase'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'NOCASE'), name='member_name_nocase'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Collate
 from django.conf import settings
 from datetime import date
 
@@ -131,6 +132,10 @@ class Family(TimestampModel):
     class Meta:
         unique_together = ['family_id', 'area']
         verbose_name_plural = 'Families'
+        indexes = [
+            # Case-insensitive prefix lookups for the family typeahead
+            models.Index(Collate('family_head', 'NOCASE'), name='family_head_nocase'),
+        ]
 
 class Member(TimestampModel):
     GENDER_CHOICES = [
@@ -205,3 +210,9 @@ class Member(TimestampModel):
             member_number = cls.get_next_number(family)
         
         return f"{family.family_id}-{member_number:02d}"
+
+    class Meta:
+        indexes = [
+            # Case-insensitive prefix lookups for the member typeahead
+            models.Index(Collate('name', 'NOCASE'), name='member_name_nocase'),
+        ]
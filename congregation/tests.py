@@ -1,3 +1,105 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .models import Area, Church, Family, Fellowship, Member, Pastorate, Relation, Respect
+from .views import LOOKUP_PAGE_SIZE
+
+
+class LookupTests(TestCase):
+    """The family and member typeaheads: prefix matches within one pastorate, keyset paged"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='clerk')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Lookup', pastorate_short_name='LU', user=cls.user)
+        other = Pastorate.objects.create(pastorate_name='Elsewhere', pastorate_short_name='EL', user=cls.user)
+        cls.respect = Respect.objects.create(name='Mr')
+        relation = Relation.objects.create(name='Head')
+        areas = [cls.area(pastorate, code) for pastorate, code in ((cls.pastorate, 'LU1'), (other, 'EL1'))]
+
+        # Three families share each head name, so equal names straddle the page boundaries
+        heads = ['Joseph %02d' % (number // 3) for number in range(45)] + ['john', 'Joanna', 'Benjo']
+        cls.families = [cls.family(areas[0], number, head) for number, head in enumerate(heads)]
+        cls.family(areas[1], 0, 'Joseph 00')
+
+        cls.household = cls.families[-1]
+        for number in range(25):
+            Member.objects.create(family=cls.household, member_id=f'LU1-M{number:02d}', respect=cls.respect,
+                                  name='Mary %02d' % (number // 2), relation=relation, sex='F')
+        Member.objects.create(family=cls.families[0], member_id='LU1-X01', respect=cls.respect, name='mary ann',
+                              relation=relation, sex='F')
+
+    @classmethod
+    def area(cls, pastorate, code):
+        church = Church.objects.create(church_name=f'{code} Church', abode='-', short_name=code, pastorate=pastorate)
+        area = Area.objects.create(church=church, area_name=code, area_id=code)
+        Fellowship.objects.create(area=area, fellowship_name=code, fellowship_id=f'{code}-F')
+        return area
+
+    @classmethod
+    def family(cls, area, number, head):
+        return Family.objects.create(family_id=f'{area.area_id}-{number:03d}', area=area,
+                                     fellowship=Fellowship.objects.get(area=area), respect=cls.respect, initial='A',
+                                     family_head=head, mobile='-', email='family@example.com', address='-',
+                                     prayer_points='-')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def lookup(self, name, **params):
+        return self.client.get(reverse(f'congregation:{name}'), params)
+
+    def walk(self, name, **params):
+        """Every result across the pages, and the size of each page"""
+        results, sizes, cursor = [], [], None
+        while True:
+            data = self.lookup(name, **params, **({'cursor': cursor} if cursor else {})).json()
+            results += data['results']
+            sizes.append(len(data['results']))
+            if not data['has_next']:
+                self.assertIsNone(data['next_cursor'])
+                return results, sizes
+            cursor = data['next_cursor']
+
+    def test_families_match_name_prefix_in_the_pastorate(self):
+        data = self.lookup('api_families', pastorate=self.pastorate.pk, q='jo').json()
+        self.assertEqual(len(data['results']), LOOKUP_PAGE_SIZE)
+        results, _ = self.walk('api_families', pastorate=self.pastorate.pk, q='jo')
+        self.assertEqual(len(results), 47)
+        self.assertTrue({'Joanna', 'john'} <= {row['value'] for row in results})
+        self.assertNotIn('Benjo', {row['value'] for row in results})
+
+        results, _ = self.walk('api_families', pastorate=self.pastorate.pk, q='JOSEPH 0')
+        self.assertEqual(len(results), 30)
+        self.assertEqual({row['id'] for row in results}, {family.pk for family in self.families[:30]})
+        self.assertEqual(results[0]['label'], 'Mr A Joseph 00 (LU1 Church)')
+        self.assertEqual(self.lookup('api_families', pastorate=self.pastorate.pk, q='enjo').json()['results'], [])
+
+    def test_family_cursor_walks_every_page_once(self):
+        results, sizes = self.walk('api_families', pastorate=self.pastorate.pk, q='Joseph')
+        self.assertEqual(sizes, [20, 20, 5])
+        families = sorted(self.families[:45], key=lambda family: (family.family_head, family.pk))
+        self.assertEqual([row['id'] for row in results], [family.pk for family in families])
+
+    def test_members_by_prefix_and_family(self):
+        results, sizes = self.walk('api_members', pastorate=self.pastorate.pk, family=self.household.pk)
+        self.assertEqual(sizes, [20, 5])
+        members = Member.objects.filter(family=self.household).order_by('name', 'id')
+        self.assertEqual([row['id'] for row in results], list(members.values_list('pk', flat=True)))
+        self.assertEqual(results[0]['family'], 'Benjo')
+
+        results, sizes = self.walk('api_members', pastorate=self.pastorate.pk, q='MARY')
+        self.assertEqual(sizes, [20, 6])
+        self.assertEqual([row['value'] for row in results].count('mary ann'), 1)
+        self.assertEqual(self.lookup('api_members', pastorate=self.pastorate.pk, q='ary').json()['results'], [])
+
+    def test_non_numeric_ids_are_rejected(self):
+        for name in ('api_families', 'api_members'):
+            for pastorate in ('abc', '', '1.5'):
+                response = self.lookup(name, pastorate=pastorate, q='jo')
+                self.assertEqual(response.status_code, 400, (name, pastorate))
+                self.assertEqual(response.json(), {'error': 'Pastorate ID is required'})
+        response = self.lookup('api_members', pastorate=self.pastorate.pk, family='x1', q='ma')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Invalid family ID'})
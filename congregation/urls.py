@@ -20,6 +20,8 @@ urlpatterns = [
 
     # API endpoints
     path('api/churches/', views.get_churches_by_pastorate, name='api_churches'),
+    path('api/families/', views.lookup_families, name='api_families'),
+    path('api/members/', views.lookup_members, name='api_members'),
 
     # Area URLs
     path('church/<int:church_id>/area/', views.area_list, name='area_list'),
@@ -8,11 +8,16 @@ from django.db.models import Count, F, Q
 from datetime import date, datetime
 from django.core.paginator import Paginator
 from accounts.models import AccountType, PrimaryCategory, Account
+from accounts import ledger
+from accounts.pagination import paginate_keyset
 import csv
 import io
+import logging
 from django.urls import reverse
 from django.core.files.uploadedfile import UploadedFile
 
+logger = logging.getLogger('ecclesia.congregation')
+
 @login_required
 def pastorate_list(request):
     pastorates = Pastorate.objects.annotate(
@@ -69,8 +74,9 @@ def pastorate_delete(request, pk):
                 related_churches = Church.objects.filter(pastorate=pastorate)
                 related_accounts = Account.objects.filter(pastorate=pastorate)
                 
-                # Use transaction to ensure all deletions succeed or none do
-                with transaction.atomic():
+                # Use transaction to ensure all deletions succeed or none do;
+                # the balance deltas of all deleted rows are applied once at the end
+                with ledger.deferred():
                     # First delete all transactions
                     from accounts.models import Transaction
                     for church in related_churches:
@@ -1179,9 +1185,7 @@ def validate_restore(request):
         })
 
     except Exception as e:
-        import traceback
-        print('Error in validate_restore:', str(e))
-        print(traceback.format_exc())
+        logger.exception('validate_restore failed')
         return JsonResponse({
             'error': f'Error processing file: {str(e)}'
         }, status=400)
@@ -1444,3 +1448,79 @@ def get_churches_by_pastorate(request):
         return JsonResponse(list(churches), safe=False)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+# Typeahead lookups for the receipt forms: a case-insensitive prefix match on
+# an indexed name, scoped to one pastorate, one keyset page at a time.
+LOOKUP_PAGE_SIZE = 20
+
+def _lookup_id(request, name):
+    """Integer id from the query string; None if missing, ValueError if malformed"""
+    value = request.GET.get(name)
+    return int(value) if value else None
+
+def _lookup_response(page, results):
+    return JsonResponse({
+        'results': results,
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
+
+@login_required
+def lookup_families(request):
+    """API endpoint: families of a pastorate whose head's name starts with q"""
+    try:
+        pastorate_id = _lookup_id(request, 'pastorate')
+    except ValueError:
+        pastorate_id = None
+    query = request.GET.get('q', '').strip()
+    if not pastorate_id:
+        return JsonResponse({'error': 'Pastorate ID is required'}, status=400)
+    if not query:
+        return JsonResponse({'results': [], 'next_cursor': None, 'has_next': False})
+
+    families = Family.objects.filter(
+        area__church__pastorate_id=pastorate_id,
+        family_head__istartswith=query,
+    ).select_related('respect', 'area__church')
+    page = paginate_keyset(families, ['family_head', 'id'], request.GET.get('cursor'), per_page=LOOKUP_PAGE_SIZE)
+    return _lookup_response(page, [
+        {
+            'id': family.id,
+            'value': family.family_head,
+            'label': f'{family.respect.name} {family.initial} {family.family_head} ({family.area.church.church_name})',
+        }
+        for family in page
+    ])
+
+@login_required
+def lookup_members(request):
+    """API endpoint: members of a pastorate (or one family) whose name starts with q"""
+    try:
+        pastorate_id = _lookup_id(request, 'pastorate')
+    except ValueError:
+        pastorate_id = None
+    query = request.GET.get('q', '').strip()
+    if not pastorate_id:
+        return JsonResponse({'error': 'Pastorate ID is required'}, status=400)
+    try:
+        family_id = _lookup_id(request, 'family')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid family ID'}, status=400)
+    if not query and not family_id:
+        return JsonResponse({'results': [], 'next_cursor': None, 'has_next': False})
+
+    members = Member.objects.filter(family__area__church__pastorate_id=pastorate_id).select_related('respect', 'family')
+    if family_id:
+        members = members.filter(family_id=family_id)
+    if query:
+        members = members.filter(name__istartswith=query)
+    page = paginate_keyset(members, ['name', 'id'], request.GET.get('cursor'), per_page=LOOKUP_PAGE_SIZE)
+    return _lookup_response(page, [
+        {
+            'id': member.id,
+            'value': member.name,
+            'label': f'{member.respect.name} {member.initial} {member.name}'.strip(),
+            'family': member.family.family_head,
+        }
+        for member in page
+    ])
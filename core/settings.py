@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -85,6 +86,19 @@ DATABASES = {
 }
 
 
+# Cache
+# Holds the versioned dropdown lookups (accounts/lookups.py).  The local-memory
+# cache is per process: with several workers use a shared backend (Redis,
+# Memcached or DatabaseCache) so an edit is seen by all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecclesia',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -141,3 +155,37 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Custom user model
 AUTH_USER_MODEL = 'web.CustomUser'
+
+# Ledger balance maintenance: 'delta' applies only the signed amount change of
+# each saved/deleted transaction, 'recompute' re-aggregates the account history
+LEDGER_BALANCE_MODE = 'delta'
+
+# First month (1-12) of the fiscal year used by the period analytics,
+# e.g. 4 for an April-March year
+FISCAL_YEAR_START_MONTH = 1
+
+# Application logging.  The ecclesia.* loggers (ecclesia.ledger,
+# ecclesia.reports, ...) only emit warnings unless ECCLESIA_LOG_LEVEL is set,
+# e.g. ECCLESIA_LOG_LEVEL=DEBUG to trace balance updates and transfers.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        'ecclesia': {
+            'handlers': ['console'],
+            'level': os.environ.get('ECCLESIA_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
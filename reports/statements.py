@@ -0,0 +1,287 @@
+"""
+Financial statements behind the audit reports.
+
+Each statement is computed by a grouped query over the ledger and cached.
+The cache key holds the statement's scope and period plus the ledger
+version (a database counter every process sees, moved by each change to
+the transactions, accounts, categories or account types and by the repair
+commands) and the category and account type versions, so a cached
+statement is reused until the data behind it changes and never needs
+explicit invalidation.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, Count, DecimalField, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+from accounts import ledger, lookups
+from accounts.models import Transaction
+
+CACHE_PREFIX = 'reports:statements'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+CENT = Decimal('0.01')
+
+# Account types whose balances are money in hand, the scope of the cash flow statement
+CASH_ACCOUNT_TYPES = ('Cash Account', 'Bank Account')
+# Longest period of a cash flow statement, in months
+CASH_FLOW_MONTHS = 120
+
+
+def _amount(value):
+    return (value or Decimal('0')).quantize(CENT)
+
+
+def _sum_when(condition):
+    return Sum(Case(
+        When(condition, then='amount'),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    ))
+
+
+def cached_statement(name, scope, build):
+    """``build()`` cached under ``name``, the ``scope`` tuple and the current data versions"""
+    key = ':'.join(str(part) for part in (
+        CACHE_PREFIX, name, ledger.ledger_version(),
+        lookups.get_version(lookups.CATEGORIES), lookups.get_version(lookups.ACCOUNT_TYPES), *scope
+    ))
+    statement = cache.get(key)
+    if statement is None:
+        statement = build()
+        cache.set(key, statement, CACHE_TIMEOUT)
+    return statement
+
+
+def scope_account_ids(pastorate, church=None):
+    """Accounts of the pastorate and its churches, or of one church only"""
+    return [
+        account.pk for account in lookups.pastorate_accounts(pastorate)
+        if church is None or account.church_id == church.pk
+    ]
+
+
+def _sections(rows, field, other):
+    """Primary categories with their secondary lines, by name and uncategorised last"""
+    sections = {}
+    for row in rows:
+        if not row[f'{field}_count']:
+            continue
+        section = sections.setdefault(row['primary_category_id'], {
+            'name': row['primary_category__name'] or other,
+            'total': Decimal('0'),
+            'lines': [],
+        })
+        amount = _amount(row[field])
+        section['total'] += amount
+        section['lines'].append({'name': row['secondary_category__name'] or 'General', 'total': amount})
+    ordered = []
+    for key in sorted(sections, key=lambda key: (key is None, sections[key]['name'].lower())):
+        section = sections[key]
+        section['lines'].sort(key=lambda line: line['name'].lower())
+        ordered.append(section)
+    return ordered
+
+
+def income_statement(pastorate, church, start_date, end_date):
+    """
+    Income and expenses by primary and secondary category for the scope
+    between ``start_date`` and ``end_date``.  Transfers only move money
+    between accounts and are not part of it.
+    """
+    def build():
+        rows = Transaction.objects.filter(
+            account_id__in=scope_account_ids(pastorate, church),
+            date__range=[start_date, end_date],
+            transaction_type__in=ledger.REGULAR_CREDIT_TYPES + ledger.REGULAR_DEBIT_TYPES,
+        ).values(
+            'primary_category_id', 'primary_category__name', 'secondary_category_id', 'secondary_category__name',
+        ).annotate(
+            income=ledger.credit_sum(ledger.REGULAR_CREDIT_TYPES),
+            expenses=ledger.credit_sum(ledger.REGULAR_DEBIT_TYPES),
+            income_count=Count('pk', filter=Q(transaction_type__in=ledger.REGULAR_CREDIT_TYPES)),
+            expenses_count=Count('pk', filter=Q(transaction_type__in=ledger.REGULAR_DEBIT_TYPES)),
+        ).order_by()
+        income = _sections(rows, 'income', 'Other Income')
+        expenses = _sections(rows, 'expenses', 'Other Expenses')
+        total_income = sum((section['total'] for section in income), Decimal('0.00'))
+        total_expenses = sum((section['total'] for section in expenses), Decimal('0.00'))
+        return {
+            'income': income,
+            'expenses': expenses,
+            'total_income': total_income,
+            'total_expenses': total_expenses,
+            'net': total_income - total_expenses,
+        }
+
+    scope = (pastorate.pk, church.pk if church else 'all', start_date, end_date)
+    return cached_statement('income_statement', scope, build)
+
+
+def income_statement_sections(statement):
+    """The statement as ``(title, header, rows)`` tables for the PDF and XLSX exports"""
+    sections = []
+    for title, key, total in (('Income', 'income', 'total_income'), ('Expenses', 'expenses', 'total_expenses')):
+        rows = []
+        for section in statement[key]:
+            rows.append([section['name'], '', section['total']])
+            rows.extend(['', line['name'], line['total']] for line in section['lines'])
+        rows.append([f'Total {title}', '', statement[total]])
+        sections.append((title, ['Category', 'Subcategory', 'Amount'], rows))
+    sections.append(('Summary', ['', 'Amount'], [
+        ['Total Income', statement['total_income']],
+        ['Total Expenses', statement['total_expenses']],
+        ['Surplus' if statement['net'] >= 0 else 'Deficit', abs(statement['net'])],
+    ]))
+    return sections
+
+
+def balance_sheet(pastorate, church, as_of):
+    """
+    Balance of every account in the scope at the end of ``as_of``, grouped
+    by level (pastorate or church) and account type.  The balances come from
+    the monthly closing snapshots plus the part of the last month, two
+    queries for any number of accounts.
+    """
+    def build():
+        accounts = [
+            account for account in lookups.pastorate_accounts(pastorate)
+            if church is None or account.church_id == church.pk
+        ]
+        balances = ledger.balances_as_of([account.pk for account in accounts], as_of)
+        levels = {}
+        for account in accounts:
+            level = levels.setdefault(account.level, {
+                'name': 'Church Accounts' if account.level == 'church' else 'Pastorate Accounts',
+                'total': Decimal('0.00'),
+                'types': {},
+            })
+            account_type = level['types'].setdefault(account.account_type_id, {
+                'name': account.account_type.name,
+                'total': Decimal('0.00'),
+                'accounts': [],
+            })
+            balance = _amount(balances.get(account.pk))
+            account_type['accounts'].append({
+                'id': account.pk,
+                'name': account.name,
+                'number': account.account_number,
+                'church': account.church.church_name if account.church_id else '',
+                'balance': balance,
+            })
+            account_type['total'] += balance
+            level['total'] += balance
+
+        ordered = []
+        for key in sorted(levels, key=lambda key: key != 'pastorate'):
+            level = levels[key]
+            level['types'] = sorted(level['types'].values(), key=lambda account_type: account_type['name'].lower())
+            for account_type in level['types']:
+                account_type['accounts'].sort(key=lambda account: (account['church'].lower(), account['name'].lower()))
+            ordered.append(level)
+        return {
+            'levels': ordered,
+            'total': sum((level['total'] for level in ordered), Decimal('0.00')),
+            'account_count': len(accounts),
+        }
+
+    return cached_statement('balance_sheet', (pastorate.pk, church.pk if church else 'all', as_of), build)
+
+
+def balance_sheet_sections(statement):
+    """The balance sheet as ``(title, header, rows)`` tables for the PDF and XLSX exports"""
+    sections = []
+    for level in statement['levels']:
+        rows = []
+        for account_type in level['types']:
+            rows.append([account_type['name'], '', '', ''])
+            rows.extend(
+                [account['church'], account['name'], account['number'], account['balance']]
+                for account in account_type['accounts']
+            )
+            rows.append([f"Total {account_type['name']}", '', '', account_type['total']])
+        rows.append([f"Total {level['name']}", '', '', level['total']])
+        sections.append((level['name'], ['Church', 'Account', 'Account Number', 'Balance'], rows))
+    sections.append(('Summary', ['', 'Balance'], [['Total of All Accounts', statement['total']]]))
+    return sections
+
+
+def cash_flow(pastorate, church, start_date, end_date):
+    """
+    Money received and paid by the cash and bank accounts of the scope, per
+    month between ``start_date`` and ``end_date``, from one query grouped by
+    month.  Transfers between two of these accounts leave the cash in hand
+    unchanged: they are listed once, by their debit leg, and not counted as
+    inflows or outflows.  Transfers to or from any other account are.
+    """
+    def build():
+        accounts = [
+            account for account in lookups.pastorate_accounts(pastorate)
+            if (church is None or account.church_id == church.pk)
+            and account.account_type.name in CASH_ACCOUNT_TYPES
+        ]
+        account_ids = [account.pk for account in accounts]
+        transfer_in = Q(transaction_type__in=ledger.TRANSFER_CREDIT_TYPES)
+        transfer_out = Q(transaction_type__in=ledger.TRANSFER_DEBIT_TYPES)
+        rows = Transaction.objects.filter(
+            account_id__in=account_ids, date__range=[start_date, end_date]
+        ).annotate(month=TruncMonth('date')).values('month').annotate(
+            inflows=ledger.credit_sum(ledger.REGULAR_CREDIT_TYPES),
+            outflows=ledger.debit_sum(ledger.REGULAR_DEBIT_TYPES),
+            transfers_in=_sum_when(transfer_in & ~Q(from_account_id__in=account_ids)),
+            transfers_out=_sum_when(transfer_out & ~Q(to_account_id__in=account_ids)),
+            internal=_sum_when(transfer_out & Q(to_account_id__in=account_ids)),
+        ).order_by()
+        rows = {row['month']: row for row in rows}
+
+        opening = _amount(sum(ledger.balances_before(account_ids, start_date).values(), Decimal('0')))
+        fields = ('inflows', 'outflows', 'transfers_in', 'transfers_out', 'internal')
+        totals = dict.fromkeys(fields, Decimal('0.00'))
+        months = []
+        balance = opening
+        month = ledger.month_start(start_date)
+        while month <= end_date:
+            row = rows.get(month, {})
+            bucket = {'month': month, 'opening': balance}
+            for name in fields:
+                bucket[name] = _amount(row.get(name))
+                totals[name] += bucket[name]
+            bucket['net'] = bucket['inflows'] - bucket['outflows'] + bucket['transfers_in'] - bucket['transfers_out']
+            balance += bucket['net']
+            bucket['closing'] = balance
+            months.append(bucket)
+            month = ledger.add_months(month, 1)
+        return {
+            'accounts': [account.name for account in accounts],
+            'months': months,
+            'opening': opening,
+            'closing': balance,
+            'net': balance - opening,
+            **{f'total_{name}': total for name, total in totals.items()},
+        }
+
+    return cached_statement('cash_flow', (pastorate.pk, church.pk if church else 'all', start_date, end_date), build)
+
+
+def cash_flow_sections(statement):
+    """The cash flow statement as ``(title, header, rows)`` tables for the PDF and XLSX exports"""
+    rows = [
+        [f"{month['month']:%b %Y}", month['opening'], month['inflows'], month['outflows'],
+         month['transfers_in'], month['transfers_out'], month['closing'], month['internal']]
+        for month in statement['months']
+    ]
+    rows.append([
+        'Total', statement['opening'], statement['total_inflows'], statement['total_outflows'],
+        statement['total_transfers_in'], statement['total_transfers_out'], statement['closing'],
+        statement['total_internal'],
+    ])
+    return [
+        ('Cash Flow by Month', ['Month', 'Opening', 'Inflows', 'Outflows', 'Transfers In', 'Transfers Out',
+                                'Closing', 'Between Cash Accounts'], rows),
+        ('Summary', ['', 'Amount'], [
+            ['Opening Cash and Bank', statement['opening']],
+            ['Net Change', statement['net']],
+            ['Closing Cash and Bank', statement['closing']],
+        ]),
+    ]
@@ -1,3 +1,77 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from accounts import ledger
+from accounts.models import Account, AccountBalanceSnapshot, AccountType, Transaction
+from congregation.models import Pastorate
+from . import statements
+
+
+class CachedStatementTests(TestCase):
+    """Cached statements must follow every change behind them, including repairs run from another process"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(username='auditor')
+        cls.pastorate = Pastorate.objects.create(pastorate_name='Audit', pastorate_short_name='AU', user=user)
+        cls.cash = Account.objects.get(account_number='CASH-%03d' % cls.pastorate.pk)
+
+    def setUp(self):
+        cache.clear()
+        Transaction.objects.create(account=self.cash, transaction_type='receipt', amount=Decimal('80.00'),
+                                   date=datetime.date(2024, 5, 5))
+        self.as_of = datetime.date(2024, 12, 31)
+
+    def cash_balance(self):
+        statement = statements.balance_sheet(self.pastorate, None, self.as_of)
+        return next(account['balance'] for level in statement['levels'] for account_type in level['types']
+                    for account in account_type['accounts'] if account['id'] == self.cash.pk)
+
+    def test_version_is_shared(self):
+        version = ledger.ledger_version()
+        # Another process starts with an empty cache and must see the same version
+        cache.clear()
+        self.assertEqual(ledger.ledger_version(), version)
+
+    def test_transaction_change(self):
+        self.assertEqual(self.cash_balance(), Decimal('80.00'))
+        Transaction.objects.create(account=self.cash, transaction_type='bill', amount=Decimal('5.00'),
+                                   date=datetime.date(2024, 6, 1))
+        self.assertEqual(self.cash_balance(), Decimal('75.00'))
+
+    def test_repair_commands(self):
+        # Drift written behind the ledger's back is cached with the statement...
+        AccountBalanceSnapshot.objects.filter(account=self.cash).update(closing=Decimal('1.00'))
+        self.assertEqual(self.cash_balance(), Decimal('1.00'))
+        # ...and the repair drops it
+        call_command('rebuild_balance_snapshots', account=[self.cash.pk], stdout=StringIO())
+        self.assertEqual(self.cash_balance(), Decimal('80.00'))
+
+        version = ledger.ledger_version()
+        Account.objects.filter(pk=self.cash.pk).update(balance=Decimal('3.00'))
+        call_command('recalculate_balances', stdout=StringIO())
+        self.assertGreater(ledger.ledger_version(), version)
+
+    def test_account_type_rename(self):
+        statements.cash_flow(self.pastorate, None, datetime.date(2024, 1, 1), self.as_of)
+        cash_type = AccountType.objects.get(pk=self.cash.account_type_id)
+        cash_type.name = 'Petty Cash'
+        cash_type.save()
+        statement = statements.cash_flow(self.pastorate, None, datetime.date(2024, 1, 1), self.as_of)
+        self.assertNotIn(self.cash.name, statement['accounts'])
+
+    def test_deferred_batch(self):
+        version = ledger.ledger_version()
+        with ledger.deferred():
+            for day in (1, 2, 3):
+                Transaction.objects.create(account=self.cash, transaction_type='bill', amount=Decimal('1.00'),
+                                           date=datetime.date(2024, 7, day))
+            self.assertEqual(ledger.ledger_version(), version)
+        self.assertEqual(ledger.ledger_version(), version + 1)
+        self.assertEqual(self.cash_balance(), Decimal('77.00'))
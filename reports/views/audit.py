@@ -1,5 +1,64 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.utils import timezone
+from datetime import datetime
+import logging
+from congregation.models import Pastorate
+from accounts import ledger
+from accounts.export import export_filename, report_format, report_pdf_response, report_xlsx_response
+from .. import statements
+
+logger = logging.getLogger('ecclesia.reports')
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _statement_scope(request):
+    """The pastorates to choose from, the selected pastorate and optionally one of its churches"""
+    pastorates = list(Pastorate.objects.order_by('pastorate_name'))
+    pastorate_id = request.GET.get('pastorate')
+    if pastorate_id:
+        pastorate = next((p for p in pastorates if str(p.pk) == pastorate_id), None)
+    else:
+        pastorate = pastorates[0] if len(pastorates) == 1 else None
+    churches = list(pastorate.church_set.order_by('church_name')) if pastorate else []
+    church = next((c for c in churches if str(c.pk) == request.GET.get('church')), None)
+    return pastorates, pastorate, churches, church
+
+
+def _statement_period(request):
+    """Start and end date of the request, by default the fiscal year to date"""
+    today = timezone.localdate()
+    try:
+        start_date = _parse_date(request.GET.get('start_date'))
+        end_date = _parse_date(request.GET.get('end_date'))
+    except (TypeError, ValueError):
+        if request.GET.get('start_date') or request.GET.get('end_date'):
+            messages.error(request, 'Invalid date range provided')
+        return ledger.period_start(today, 'fiscal_year'), today
+    if start_date > end_date:
+        messages.error(request, 'The start date must not be after the end date')
+        start_date, end_date = end_date, start_date
+    return start_date, end_date
+
+
+def _scope_name(pastorate, church):
+    return f"{church.church_name}, {pastorate.pastorate_name}" if church else pastorate.pastorate_name
+
+
+def _statement_download(request, name, pastorate, church, subtitle, sections):
+    """PDF or XLSX download of a statement if the request asks for one"""
+    export = report_format(request)
+    if not export:
+        return None
+    title = f"{_scope_name(pastorate, church)} - {name}"
+    filename = export_filename(f"{pastorate.pastorate_short_name} {name}", export)
+    respond = report_pdf_response if export == 'pdf' else report_xlsx_response
+    return respond(filename, title, subtitle, sections)
+
 
 @login_required
 def audit(request):
@@ -12,32 +71,112 @@ def audit(request):
     }
     return render(request, 'reports/audit.html', context)
 
-# Placeholder view functions for the different audit reports
-# These will be implemented later with actual functionality
-
 @login_required
 def income_statement(request):
     """
     Generate an income statement report for a specific period.
     """
-    # This is a placeholder - implement actual report generation logic later
-    return render(request, 'reports/audit.html', {'error': 'This feature is not yet implemented.'})
+    pastorates, pastorate, churches, church = _statement_scope(request)
+    start_date, end_date = _statement_period(request)
+    statement = None
+    if pastorate:
+        statement = statements.income_statement(pastorate, church, start_date, end_date)
+        logger.debug('income statement pastorate=%s church=%s start=%s end=%s net=%s',
+                     pastorate.pk, church.pk if church else None, start_date, end_date, statement['net'])
+        download = _statement_download(
+            request, 'Income Statement', pastorate, church,
+            f"{start_date:%d/%m/%Y} to {end_date:%d/%m/%Y}", statements.income_statement_sections(statement),
+        )
+        if download:
+            return download
+
+    context = {
+        'title': 'Income Statement',
+        'subtitle': 'Income and expenses by category for a period',
+        'pastorates': pastorates,
+        'pastorate': pastorate,
+        'churches': churches,
+        'church': church,
+        'start_date': start_date,
+        'end_date': end_date,
+        'statement': statement,
+    }
+    return render(request, 'reports/income_statement.html', context)
 
 @login_required
 def balance_sheet(request):
     """
     Generate a balance sheet report as of a specific date.
     """
-    # This is a placeholder - implement actual report generation logic later
-    return render(request, 'reports/audit.html', {'error': 'This feature is not yet implemented.'})
+    pastorates, pastorate, churches, church = _statement_scope(request)
+    as_of = timezone.localdate()
+    if request.GET.get('as_of'):
+        try:
+            as_of = _parse_date(request.GET['as_of'])
+        except ValueError:
+            messages.error(request, 'Invalid date provided')
+    statement = None
+    if pastorate:
+        statement = statements.balance_sheet(pastorate, church, as_of)
+        logger.debug('balance sheet pastorate=%s church=%s as_of=%s accounts=%s total=%s',
+                     pastorate.pk, church.pk if church else None, as_of, statement['account_count'], statement['total'])
+        download = _statement_download(
+            request, 'Balance Sheet', pastorate, church,
+            f"As of {as_of:%d/%m/%Y}", statements.balance_sheet_sections(statement),
+        )
+        if download:
+            return download
+
+    context = {
+        'title': 'Balance Sheet',
+        'subtitle': 'Balances of all accounts as of a date',
+        'pastorates': pastorates,
+        'pastorate': pastorate,
+        'churches': churches,
+        'church': church,
+        'as_of_date': as_of,
+        'statement': statement,
+    }
+    return render(request, 'reports/balance_sheet.html', context)
 
 @login_required
 def cash_flow(request):
     """
     Generate a cash flow statement for a specific period.
     """
-    # This is a placeholder - implement actual report generation logic later
-    return render(request, 'reports/audit.html', {'error': 'This feature is not yet implemented.'})
+    pastorates, pastorate, churches, church = _statement_scope(request)
+    start_date, end_date = _statement_period(request)
+    earliest = ledger.add_months(ledger.month_start(end_date), 1 - statements.CASH_FLOW_MONTHS)
+    if start_date < earliest:
+        messages.warning(request, f'The cash flow statement covers at most {statements.CASH_FLOW_MONTHS // 12} years')
+        start_date = earliest
+    statement = None
+    if pastorate:
+        statement = statements.cash_flow(pastorate, church, start_date, end_date)
+        logger.debug('cash flow pastorate=%s church=%s start=%s end=%s net=%s',
+                     pastorate.pk, church.pk if church else None, start_date, end_date, statement['net'])
+        download = _statement_download(
+            request, 'Cash Flow Statement', pastorate, church,
+            f"{start_date:%d/%m/%Y} to {end_date:%d/%m/%Y}", statements.cash_flow_sections(statement),
+        )
+        if download:
+            return download
+
+    context = {
+        'title': 'Cash Flow Statement',
+        'subtitle': 'Money received and paid through cash and bank accounts by month',
+        'pastorates': pastorates,
+        'pastorate': pastorate,
+        'churches': churches,
+        'church': church,
+        'start_date': start_date,
+        'end_date': end_date,
+        'statement': statement,
+    }
+    return render(request, 'reports/cash_flow.html', context)
+
+# Placeholder view functions for the remaining audit reports
+# These will be implemented later with actual functionality
 
 @login_required
 def donation_summary(request):